@@ -1,11 +1,14 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from servicios import usuarios_repo, gestor_rutas
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
+from servicios import usuarios_repo, gestor_rutas, geo
 import os
 import json
 from datetime import datetime
 import re
+from itertools import islice
 import servicios.gestor_rutas as gr
-from werkzeug.security import generate_password_hash, check_password_hash
+from servicios.contrasenas import (
+    PoolSaturado, generar_hash, verificar as verificar_password, necesita_rehash, rehash_en_segundo_plano
+)
 from servicios.usuarios_repo import (
     get_viajes_por_pasajero,
     actualizar_usuario
@@ -13,6 +16,7 @@ from servicios.usuarios_repo import (
 from servicios.solicitudes_mejoradas import (
     encolar_solicitud, 
     listar_solicitudes, 
+    iterar_solicitudes,
     aceptar_solicitud_por_id,
     generar_solicitud_id
 )
@@ -47,9 +51,10 @@ FALLBACK_NODES = [
 from servicios.usuarios_repo import (
     PASAJEROS_FILE, CONDUCTORES_FILE,
     crear_directorio_data,
-    get_usuarios, set_usuarios, usuario_existe,
-    buscar_usuario_por_correo, buscar_usuario_por_id,  # (importado, pero ya no se usa en dashboard/perfil)
-    obtener_estadisticas, generar_id, guardar_viaje,
+    get_usuarios, set_usuarios, usuario_existe, crear_usuario,
+    buscar_usuario_por_correo, buscar_usuario_por_id, buscar_usuarios_por_ids,
+    buscar_conductor_por_placa, actualizar_password_hash,
+    obtener_estadisticas, guardar_viaje,
     listar_conductores_disponibles
 )
 
@@ -62,13 +67,9 @@ app.secret_key = 'tu_clave_secreta_aqui'  # en prod: usa variable de entorno
 # ---------------- Helper local: buscar por id DENTRO del tipo ----------------
 def get_user_by_id_and_tipo(user_id, tipo):
     try:
-        uid = int(user_id)
+        return buscar_usuario_por_id(user_id, tipo)  # índice por id (O(1))
     except Exception:
         return None
-    for u in get_usuarios(tipo):
-        if u.get("id") == uid:
-            return u
-    return None
 
 # ---------------- Decorador de auth ----------------
 def requiere_login(f):
@@ -147,7 +148,7 @@ def registro():
             flash("❌ Formato de placa inválido. Usa ABC-123.", "error")
             return render_template("registro.html")
 
-        if any(c.get("placa", "").upper() == placa for c in get_usuarios("conductor")):
+        if buscar_conductor_por_placa(placa):
             flash("❌ Esa placa ya está registrada.", "error")
             return render_template("registro.html")
 
@@ -156,16 +157,19 @@ def registro():
         flash(f"❌ Ya existe un {tipo} registrado con ese correo electrónico", "error")
         return render_template("registro.html")
 
-    # --- Crear y guardar (con password_hash) ---
-    usuarios = get_usuarios(tipo)
+    # --- Crear y guardar (con password_hash, calculado en el pool de hashing) ---
+    try:
+        password_hash = generar_hash(password)
+    except (PoolSaturado, TimeoutError):
+        flash("⏳ Hay muchos registros en este momento. Intenta de nuevo en unos segundos.", "warning")
+        return render_template("registro.html"), 503
     nuevo_usuario = {
-        "id": generar_id(usuarios),
         "nombre": nombre,
         "correo": correo,
         "telefono": telefono,
         "tipo": tipo,
         "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "password_hash": generate_password_hash(password, method="pbkdf2:sha256", salt_length=16),
+        "password_hash": password_hash,
     }
     if tipo == "conductor":
         nuevo_usuario.update({
@@ -177,12 +181,13 @@ def registro():
             "capacidad": 4, 
         })
 
-    usuarios.append(nuevo_usuario)
-    if set_usuarios(tipo, usuarios):
+    # El id se asigna con la colección bloqueada (no choca con otro registro simultáneo)
+    creado, error = crear_usuario(tipo, nuevo_usuario)
+    if creado:
         flash(f"✅ {tipo.capitalize()} registrado exitosamente", "success")
         return redirect(url_for("login"))
 
-    flash("❌ Error al guardar los datos. Inténtalo de nuevo.", "error")
+    flash(f"❌ {error}", "error")
     return render_template("registro.html")
 
 
@@ -215,10 +220,20 @@ def login():
         flash("❌ Tu cuenta no tiene contraseña establecida. Regístrate de nuevo.", "error")
         return render_template("login.html")
 
-    if not check_password_hash(pwd_hash, password):
+    try:
+        valida = verificar_password(pwd_hash, password)  # PBKDF2 fuera del hilo del request
+    except (PoolSaturado, TimeoutError):
+        flash("⏳ Hay muchos inicios de sesión en este momento. Intenta de nuevo en unos segundos.", "warning")
+        return render_template("login.html"), 503
+    if not valida:
         flash("❌ Contraseña incorrecta", "error")
         return render_template("login.html")
 
+    # Hash con una política de costo anterior: se recalcula sin demorar el login
+    if necesita_rehash(pwd_hash):
+        uid, tipo_usuario = usuario["id"], usuario["tipo"]
+        rehash_en_segundo_plano(password, lambda h: actualizar_password_hash(uid, tipo_usuario, h))
+
     # OK → crear sesión
     session.clear()
     session.update(
@@ -560,11 +575,17 @@ def listar_usuarios():
 def vaciar_archivo_json(path):
     try:
         print(f"Intentando vaciar: {path}")
-        if not os.path.exists(path):
+        from servicios.almacenamiento import usa_sqlite, escribir_coleccion
+        from servicios.solicitudes_mejoradas import _repositorio_de
+        repo = _repositorio_de(path)
+        if repo is None and not usa_sqlite(path) and not os.path.exists(path):
             print(f"⚠️ No existe el archivo: {path}")
             return False
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump([], f, indent=4, ensure_ascii=False)
+        # Pasa por el repositorio / capa de almacenamiento (vacía también bitácora / tabla SQLite)
+        if repo is not None:
+            repo.reemplazar([])
+        else:
+            escribir_coleccion(path, [])
         print(f"✔️ Vacío correctamente: {path}")
         return True
     except Exception as e:
@@ -596,6 +617,41 @@ def limpiar_datos():
     return redirect(url_for("listar_usuarios"))
 
 
+@app.get("/api/admin/cache")
+@requiere_admin
+def api_admin_cache():
+    """Aciertos/fallos de la caché de documentos JSON (capa de almacenamiento)"""
+    from servicios.almacenamiento import estadisticas_cache
+    return jsonify(estadisticas_cache()), 200
+
+
+@app.get("/api/admin/hash")
+@requiere_admin
+def api_admin_hash():
+    """Profundidad de la cola y tiempos del pool de hashing de contraseñas"""
+    from servicios.contrasenas import estadisticas_hash
+    return jsonify(estadisticas_hash()), 200
+
+
+@app.get("/api/admin/conductores")
+@requiere_admin
+def api_admin_conductores():
+    """Conductores con ubicación vigente en el registro de este proceso"""
+    from servicios.ubicaciones_conductores import registro_conductores
+    return jsonify(registro_conductores().estadisticas()), 200
+
+
+@app.post("/api/admin/archivar")
+@requiere_admin
+def api_admin_archivar():
+    """Mueve los viajes terminados a las particiones mensuales (data/archivo)"""
+    from servicios.particiones import archivar_terminados
+    from servicios.solicitudes_mejoradas import repositorio_solicitudes, repositorio_contraofertas
+    dias = request.args.get("dias", type=int)
+    resultado = archivar_terminados(repositorio_solicitudes(), repositorio_contraofertas(), dias)
+    return jsonify({"ok": True, **resultado}), 200
+
+
 # ---- Inyecta stats en todas las plantillas ----
 @app.context_processor
 def inject_stats():
@@ -678,7 +734,7 @@ def api_solicitar():
             distancia = 0.0
 
         if distancia <= 0.0 and origen and destino:
-            distancia = calcular_distancia_haversine(
+            distancia = geo.distancia(
                 origen["lat"], origen["lng"],
                 destino["lat"], destino["lng"]
             )
@@ -734,6 +790,12 @@ def api_mis_solicitudes():
             if s.get('pasajero_id') == pasajero_id 
             and s.get('estado') in estados_activos
         ]
+
+        # ✅ Posición en la cola al día (la guardada es la que tenía al crearse)
+        from servicios.solicitudes_mejoradas import posicion_actual
+        for s in mis_solicitudes:
+            if s.get('estado') == 'pendiente':
+                s['posicion_cola'] = posicion_actual(s.get('id'))
         
         return jsonify(mis_solicitudes), 200
         
@@ -742,24 +804,90 @@ def api_mis_solicitudes():
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/api/pasajero/solicitud/<int:solicitud_id>/posicion")
+@requiere_login
+def api_posicion_solicitud(solicitud_id):
+    """
+    Posición actual de una solicitud en la cola FIFO y cuántas tiene delante.
+    Responde en O(log n): pensado para consultarse cada pocos segundos.
+    """
+    if session.get('user_type') != 'pasajero':
+        return jsonify({"error": "Solo pasajeros"}), 403
+
+    try:
+        from servicios.solicitudes_mejoradas import posicion_en_cola
+        estado = posicion_en_cola(solicitud_id, session['user_id'])
+        if estado is None:
+            return jsonify({"error": "Solicitud no encontrada"}), 404
+        return jsonify(estado), 200
+    except Exception as e:
+        print(f"❌ Error en /api/pasajero/solicitud/{solicitud_id}/posicion: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/api/pasajero/solicitud/<int:solicitud_id>/conductores-cercanos")
+@requiere_login
+def api_conductores_cercanos_solicitud(solicitud_id):
+    """
+    Los n conductores disponibles más cercanos al origen de la solicitud
+    (registro de ubicaciones en memoria; n por defecto 5, radio_km opcional).
+    """
+    if session.get('user_type') != 'pasajero':
+        return jsonify({"error": "Solo pasajeros"}), 403
+    
+    n = request.args.get('n', 5, type=int)
+    radio_km = request.args.get('radio_km', type=float)
+    if not 1 <= n <= 50:
+        return jsonify({"error": "n debe estar entre 1 y 50"}), 400
+    
+    try:
+        from servicios.solicitudes_mejoradas import repositorio_solicitudes
+        from servicios.ubicaciones_conductores import registro_conductores
+        sol = repositorio_solicitudes().obtener(solicitud_id)
+        if not sol or str(sol.get('pasajero_id')) != str(session['user_id']):
+            return jsonify({"error": "Solicitud no encontrada"}), 404
+        origen = sol.get('origen') or {}
+        if 'lat' not in origen or 'lng' not in origen:
+            return jsonify([]), 200
+        cercanos = registro_conductores().mas_cercanos(
+            float(origen['lat']), float(origen['lng']), n=n, radio_km=radio_km
+        )
+        return jsonify(cercanos), 200
+    except Exception as e:
+        print(f"❌ Error en /api/pasajero/solicitud/{solicitud_id}/conductores-cercanos: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+LOTE_SOLICITUDES = 500  # solicitudes por búsqueda de pasajeros al enviar /api/solicitudes
+
+
+def _en_lotes(iterable, tamano):
+    it = iter(iterable)
+    while True:
+        lote = list(islice(it, tamano))
+        if not lote:
+            return
+        yield lote
+
 
 @app.get("/api/solicitudes")
 @requiere_login
 def api_listar_solicitudes():
-    """Devuelve todas las solicitudes pendientes para que los conductores las vean"""
+    """
+    Devuelve todas las solicitudes pendientes para que los conductores las vean.
+    El arreglo JSON se envía por partes mientras se recorre iterar_solicitudes(),
+    enriqueciendo de a LOTE_SOLICITUDES (una búsqueda de pasajeros por lote).
+    """
     if session.get('user_type') != 'conductor':
         return jsonify({"error": "Solo conductores"}), 403
     
-    try:
-        solicitudes = listar_solicitudes()
-        
-        # Enriquecer con información del pasajero
-        resultado = []
-        for sol in solicitudes:
+    def enriquecer(lote):
+        pasajeros = buscar_usuarios_por_ids({s.get('pasajero_id') for s in lote}, 'pasajero')
+        for sol in lote:
             pasajero_id = sol.get('pasajero_id')
-            pasajero = get_user_by_id_and_tipo(pasajero_id, 'pasajero')
+            pasajero = pasajeros.get(pasajero_id)
             
-            resultado.append({
+            yield {
                 'id': sol.get('solicitud_id') or sol.get('viaje_id') or sol.get('id'),
                 'pasajero_id': pasajero_id,
                 'pasajero_nombre': pasajero.get('nombre') if pasajero else 'Desconocido',
@@ -770,12 +898,35 @@ def api_listar_solicitudes():
                 'precio_sugerido': sol.get('precio_sugerido'),
                 'ruta': sol.get('ruta', []),
                 'fecha': sol.get('fecha', '')
-            })
-        
-        return jsonify(resultado), 200
+            }
+    
+    try:
+        # El primer lote se arma antes de responder: si falla, todavía se puede dar un 500
+        lotes = _en_lotes(iterar_solicitudes(), LOTE_SOLICITUDES)
+        primero = list(enriquecer(next(lotes, [])))
     except Exception as e:
         print(f"❌ Error en /api/solicitudes: {e}")
         return jsonify({"error": str(e)}), 500
+    
+    def generar():
+        yield "["
+        separador = ""
+        try:
+            for item in primero:
+                yield separador + app.json.dumps(item)
+                separador = ","
+            for lote in lotes:
+                for item in enriquecer(lote):
+                    yield separador + app.json.dumps(item)
+                    separador = ","
+        except Exception:
+            # Ya se envió el 200: sin el "]" el cliente recibe un JSON inválido
+            # en vez de una lista cortada que parece completa
+            app.logger.exception("Error a mitad de /api/solicitudes")
+            raise
+        yield "]"
+    
+    return Response(generar(), mimetype="application/json"), 200
 
 
 # Agregar estos endpoints a app.py
@@ -798,13 +949,18 @@ def api_solicitudes_cercanas_conductor():
         lng = float(request.args.get('lng', -77.0428))
         radio = float(request.args.get('radio', 10))  # km
         
+        # El sondeo trae la posición del conductor: queda en el registro de ubicaciones
+        if 'lat' in request.args and 'lng' in request.args:
+            from servicios.ubicaciones_conductores import registro_conductores
+            registro_conductores().registrar(session['user_id'], lat, lng)
+        
         from servicios.solicitudes_mejoradas import obtener_solicitudes_cercanas
         solicitudes = obtener_solicitudes_cercanas(lat, lng, radio)
         
         # Enriquecer con datos del pasajero
-        from servicios.usuarios_repo import buscar_usuario_por_id
+        pasajeros = buscar_usuarios_por_ids({s['pasajero_id'] for s in solicitudes}, 'pasajero')
         for sol in solicitudes:
-            pasajero = buscar_usuario_por_id(sol['pasajero_id'], 'pasajero')
+            pasajero = pasajeros.get(sol['pasajero_id'])
             if pasajero:
                 sol['pasajero_nombre'] = pasajero.get('nombre', 'Desconocido')
                 sol['pasajero_telefono'] = pasajero.get('telefono', '')
@@ -816,6 +972,31 @@ def api_solicitudes_cercanas_conductor():
         return jsonify({"error": str(e)}), 500
 
 
+@app.post("/api/conductor/ubicacion")
+@requiere_login
+def api_ubicacion_conductor():
+    """
+    El conductor reporta su posición (y opcionalmente si está disponible).
+    Vence a los config.UBICACION_TTL_S segundos si no se vuelve a reportar.
+    """
+    if session.get('user_type') != 'conductor':
+        return jsonify({"error": "Solo conductores"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        lat = float(data['lat'])
+        lng = float(data['lng'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "lat y lng son obligatorios y numéricos"}), 400
+    disponible = data.get('disponible')
+    
+    from servicios.ubicaciones_conductores import registro_conductores
+    registro = registro_conductores()
+    registro.registrar(session['user_id'], lat, lng,
+                       disponible=None if disponible is None else bool(disponible))
+    return jsonify({"ok": True, "ttl_s": registro.ttl_s}), 200
+
+
 @app.post("/api/conductor/aceptar-solicitud")
 @requiere_login
 def api_aceptar_solicitud():
@@ -920,9 +1101,9 @@ def api_mis_viajes_conductor():
                       and s.get('estado') in ['aceptada', 'en_curso']]
         
         # Enriquecer con datos del pasajero
-        from servicios.usuarios_repo import buscar_usuario_por_id
+        pasajeros = buscar_usuarios_por_ids({v['pasajero_id'] for v in mis_viajes}, 'pasajero')
         for viaje in mis_viajes:
-            pasajero = buscar_usuario_por_id(viaje['pasajero_id'], 'pasajero')
+            pasajero = pasajeros.get(viaje['pasajero_id'])
             if pasajero:
                 viaje['pasajero_nombre'] = pasajero.get('nombre', 'Desconocido')
                 viaje['pasajero_telefono'] = pasajero.get('telefono', '')
@@ -975,21 +1156,21 @@ def api_confirmar_viaje_directo():
         solicitud_id = data.get('solicitud_id')
         pasajero_id = session['user_id']
         
-        from servicios.solicitudes_mejoradas import _leer_json, SOLICITUDES_FILE, _guardar_json_atomic
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        
-        for sol in solicitudes:
-            if sol.get('id') == solicitud_id and sol.get('pasajero_id') == pasajero_id:
-                if sol.get('estado') == 'aceptada':
-                    sol['estado'] = 'confirmado'
-                    sol['fecha_confirmacion_pasajero'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
-                    
-                    return jsonify({
-                        "ok": True,
-                        "mensaje": "Viaje confirmado. El conductor puede iniciar el recorrido."
-                    }), 200
+        from servicios.solicitudes_mejoradas import repositorio_solicitudes
+        repo = repositorio_solicitudes()
+        sol = repo.obtener(solicitud_id)
+        
+        if sol and sol.get('pasajero_id') == pasajero_id:
+            if sol.get('estado') == 'aceptada':
+                sol['estado'] = 'confirmado'
+                sol['fecha_confirmacion_pasajero'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                
+                repo.actualizar_diferido(sol).result()
+                
+                return jsonify({
+                    "ok": True,
+                    "mensaje": "Viaje confirmado. El conductor puede iniciar el recorrido."
+                }), 200
         
         return jsonify({"error": "Viaje no encontrado o ya confirmado"}), 404
         
@@ -1095,25 +1276,28 @@ def api_cancelar_viaje_pasajero():
 @app.get("/api/solicitudes_cercanas")
 @requiere_login
 def solicitudes_cercanas():
-    """Devuelve solicitudes cercanas a la ubicación del conductor"""
+    """
+    Solicitudes más cercanas a un punto, ordenadas por distancia (km por carretera).
+
+    Parámetros: lat, lng, k (cuántas, opcional), radio_km (opcional; sin k ni
+    radio_km = 10) y estado (pendiente por defecto). Cada una trae 'distancia_km'.
+    """
     try:
         lat = float(request.args.get("lat", -12.0464))
         lng = float(request.args.get("lng", -77.0428))
+        k = request.args.get("k", type=int)
+        radio_km = request.args.get("radio_km", type=float)
+        estado = request.args.get("estado", "pendiente").strip().lower()
+    except ValueError:
+        return jsonify({"error": "lat y lng deben ser números"}), 400
+    if k is not None and k < 1:
+        return jsonify({"error": "k debe ser 1 o más"}), 400
+    if radio_km is not None and radio_km <= 0:
+        return jsonify({"error": "radio_km debe ser mayor que 0"}), 400
 
-        # Cargar solicitudes desde archivo JSON
-        from servicios.solicitudes_mejoradas import leer_solicitudes
-        solicitudes = leer_solicitudes()
-
-        # Filtro básico: devolver las más cercanas (simulado)
-        cercanas = []
-        for s in solicitudes:
-            o = s.get("origen", {})
-            if isinstance(o, dict) and "lat" in o and "lng" in o:
-                dist = ((lat - o["lat"])**2 + (lng - o["lng"])**2)**0.5
-                if dist < 0.1:  # radio de ~10 km
-                    cercanas.append(s)
-
-        return jsonify(cercanas or []), 200
+    try:
+        from servicios.solicitudes_mejoradas import solicitudes_mas_cercanas
+        return jsonify(solicitudes_mas_cercanas(lat, lng, k=k, radio_km=radio_km, estado=estado)), 200
     except Exception as e:
         print("Error en /api/solicitudes_cercanas:", e)
         return jsonify([]), 500
@@ -1189,8 +1373,9 @@ def api_ofertas_pendientes():
             and v.get('estado') == 'pendiente_confirmacion'
         ]
         
+        conductores = buscar_usuarios_por_ids({o.get('conductor_id') for o in ofertas}, 'conductor')
         for oferta in ofertas:
-            conductor = get_user_by_id_and_tipo(oferta.get('conductor_id'), 'conductor')
+            conductor = conductores.get(oferta.get('conductor_id'))
             if conductor:
                 oferta['conductor_nombre'] = conductor.get('nombre')
                 oferta['conductor_telefono'] = conductor.get('telefono')
@@ -1277,40 +1462,6 @@ def api_rechazar_oferta():
         return jsonify({"error": str(e)}), 500
 
 
-# ============================================
-# HELPER: CALCULAR DISTANCIA ENTRE COORDENADAS
-# ============================================
-
-# Factor de corrección para convertir distancia aérea a distancia real por carretera
-# En ciudades como Lima, las calles no son rectas, hay curvas, desvíos, etc.
-# Estudios indican que la distancia real es ~1.3 a 1.5 veces la distancia aérea
-FACTOR_CORRECCION_CARRETERA = 1.4  # 40% más que línea recta
-
-def calcular_distancia_haversine(lat1, lng1, lat2, lng2):
-    """
-    Calcula la distancia en km entre dos coordenadas.
-    
-    Usa Haversine para distancia aérea y aplica un factor de corrección
-    para estimar la distancia REAL por carretera (más precisa para Lima).
-    """
-    from math import radians, sin, cos, sqrt, atan2
-    
-    R = 6371  # Radio de la Tierra en km
-    
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lng2 - lng1)
-    
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    
-    distancia_aerea = R * c
-    
-    # Aplicar factor de corrección para distancia real por carretera
-    distancia_real = distancia_aerea * FACTOR_CORRECCION_CARRETERA
-    
-    return round(distancia_real, 2)
-
-
 # ============================================
 # ENDPOINT: CALCULAR DISTANCIA
 # ============================================
@@ -1331,7 +1482,7 @@ def api_calcular_distancia():
         lat2 = float(destino.get('lat', 0))
         lng2 = float(destino.get('lng', 0))
         
-        distancia = calcular_distancia_haversine(lat1, lng1, lat2, lng2)
+        distancia = geo.distancia(lat1, lng1, lat2, lng2)
         
         from servicios.solicitudes_mejoradas import calcular_precio
         precio = calcular_precio(distancia)
@@ -1406,7 +1557,7 @@ def buscar_viajes():
             # Intentamos calcular la distancia real con coordenadas
             if origen_pt and destino_pt and "lat" in origen_pt and "lat" in destino_pt:
                 print(f"📍 Usando cálculo GPS directo para: {origen_arg} -> {destino_arg}")
-                distancia = calcular_distancia_haversine(
+                distancia = geo.distancia(
                     origen_pt["lat"], origen_pt["lng"],
                     destino_pt["lat"], destino_pt["lng"]
                 )
@@ -1484,19 +1635,19 @@ def api_confirmar_llegada():
         viaje_id = data.get('viaje_id')
         pasajero_id = session['user_id']
         
-        from servicios.solicitudes_mejoradas import _leer_json, SOLICITUDES_FILE, _guardar_json_atomic
+        from servicios.solicitudes_mejoradas import repositorio_solicitudes
         from servicios.estados_viaje import GestorEstados
         
-        solicitudes = _leer_json(SOLICITUDES_FILE)
+        repo = repositorio_solicitudes()
+        viaje = repo.obtener(viaje_id)
         
-        for viaje in solicitudes:
-            if viaje.get('id') == viaje_id and viaje.get('pasajero_id') == pasajero_id:
-                if GestorEstados.actualizar_estado(
-                    viaje, 'completado', pasajero_id, 'Pasajero confirmó llegada'
-                ):
-                    viaje['fecha_fin'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
-                    return jsonify({"ok": True}), 200
+        if viaje and viaje.get('pasajero_id') == pasajero_id:
+            if GestorEstados.actualizar_estado(
+                viaje, 'completado', pasajero_id, 'Pasajero confirmó llegada'
+            ):
+                viaje['fecha_fin'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                repo.actualizar_diferido(viaje).result()
+                return jsonify({"ok": True}), 200
         
         return jsonify({"error": "Viaje no encontrado"}), 404
         
@@ -1708,21 +1859,26 @@ def api_conductor_mis_ofertas_pendientes():
     try:
         conductor_id = session['user_id']
 
-        from servicios.solicitudes_mejoradas import _leer_json, CONTRAOFERTAS_FILE, SOLICITUDES_FILE, _guardar_json
+        from servicios.solicitudes_mejoradas import _leer_json, CONTRAOFERTAS_FILE, SOLICITUDES_FILE
+        from servicios.solicitudes_mejoradas import repositorio_contraofertas
         contraofertas = _leer_json(CONTRAOFERTAS_FILE)
         solicitudes = _leer_json(SOLICITUDES_FILE)
 
         sol_by_id = {s.get("id"): s for s in solicitudes}
 
-        from servicios.usuarios_repo import buscar_usuario_por_id
-
         # 1. Contraofertas pendientes
         mis_pendientes = [
             c for c in contraofertas
             if c.get("conductor_id") == conductor_id and c.get("estado") == "pendiente"
         ]
+        pasajeros = buscar_usuarios_por_ids(
+            {sol_by_id[c.get("solicitud_id")].get("pasajero_id")
+             for c in mis_pendientes if c.get("solicitud_id") in sol_by_id},
+            "pasajero"
+        )
 
         pendientes = []
+        modificadas = []
         for c in mis_pendientes:
             item = dict(c)
             sol = sol_by_id.get(c.get("solicitud_id"))
@@ -1731,9 +1887,10 @@ def api_conductor_mis_ofertas_pendientes():
                 if sol.get("estado") != "pendiente":
                     c["estado"] = "rechazada"
                     c["motivo"] = "El pasajero eligió a otro conductor"
+                    modificadas.append(c)
                     continue  # No la incluimos en pendientes
                 item["solicitud"] = sol
-                pasajero = buscar_usuario_por_id(sol.get("pasajero_id"), "pasajero")
+                pasajero = pasajeros.get(sol.get("pasajero_id"))
                 if pasajero:
                     item["pasajero_nombre"] = pasajero.get("nombre", "Pasajero")
                     item["pasajero_telefono"] = pasajero.get("telefono", "N/A")
@@ -1764,8 +1921,10 @@ def api_conductor_mis_ofertas_pendientes():
             and s.get("estado") in ["confirmado", "en_curso"]
         ]
 
-        # Guardar cambios (contraofertas actualizadas)
-        _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
+        # Guardar cambios (solo las contraofertas actualizadas). Son marcas que
+        # se repiten en cada sondeo: se agrupan en vez de escribir por request
+        if modificadas:
+            repositorio_contraofertas().actualizar_diferido(*modificadas)
 
         return jsonify({
             "pendientes": pendientes,
@@ -1790,14 +1949,14 @@ def api_marcar_rechazo_visto():
         contraoferta_id = data.get('contraoferta_id')
         conductor_id = session['user_id']
         
-        from servicios.solicitudes_mejoradas import _leer_json, CONTRAOFERTAS_FILE, _guardar_json
-        contraofertas = _leer_json(CONTRAOFERTAS_FILE)
+        from servicios.solicitudes_mejoradas import repositorio_contraofertas
+        repo = repositorio_contraofertas()
+        c = repo.obtener(contraoferta_id)
         
-        for c in contraofertas:
-            if c.get('id') == contraoferta_id and c.get('conductor_id') == conductor_id:
-                c['vista_por_conductor'] = True
-                _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
-                return jsonify({"ok": True}), 200
+        if c and c.get('conductor_id') == conductor_id:
+            c['vista_por_conductor'] = True
+            repo.actualizar_diferido(c)
+            return jsonify({"ok": True}), 200
         
         return jsonify({"error": "No encontrada"}), 404
         
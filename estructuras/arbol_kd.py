@@ -0,0 +1,127 @@
+import heapq
+import itertools
+
+class ArbolKD:
+    """
+    Árbol k-d con claves sobre puntos de cualquier dimensión (tuplas).
+
+    Se arma por lotes: los puntos se ordenan en un arreglo donde cada rango
+    [lo, hi) tiene su mediana (por el eje de su nivel) en el medio, sin nodos
+    sueltos. Entre reconstrucciones, insertar va a un búfer que se revisa
+    entero en cada consulta y remover marca la posición como borrada; cuando
+    esos cambios superan max(64, vivos / 4) la siguiente consulta rehace el
+    árbol (O(n log² n), amortizado O(log² n) por cambio).
+
+    vecinos(punto, k, radio) -> [(distancia, clave, dato)] por distancia
+    euclídea creciente: los k más cercanos, todos los que están a <= radio,
+    o los k más cercanos dentro del radio.
+    """
+    def __init__(self, elementos=()):
+        self._buffer = {}        # clave -> (punto, dato), todavía fuera del árbol
+        self._reconstruir(list(elementos))
+
+    def __len__(self): return len(self._indice) + len(self._buffer)
+    def __contains__(self, clave): return clave in self._indice or clave in self._buffer
+
+    # ---------------- Cambios ----------------
+
+    def insertar(self, clave, punto, dato=None):
+        """Agrega o mueve un punto (si la clave ya estaba en el mismo punto solo cambia el dato)"""
+        i = self._indice.get(clave)
+        if i is not None and self._puntos[i] == tuple(punto):
+            self._datos[i] = dato
+            return
+        self.remover(clave)
+        self._buffer[clave] = (tuple(punto), dato)
+
+    def remover(self, clave):
+        if self._buffer.pop(clave, None) is not None:
+            return True
+        i = self._indice.pop(clave, None)
+        if i is None:
+            return False
+        self._borrados.add(i)
+        self._datos[i] = None
+        return True
+
+    def _reconstruir(self, elementos=None):
+        """Rehace el árbol con los vivos y el búfer (o con `elementos`: (clave, punto, dato))"""
+        if elementos is None:
+            elementos = [(self._claves[i], self._puntos[i], self._datos[i])
+                         for i in self._indice.values()]
+            elementos.extend((clave, p, dato) for clave, (p, dato) in self._buffer.items())
+        elementos = [(clave, tuple(p), dato) for clave, p, dato in elementos]
+        self._dim = len(elementos[0][1]) if elementos else 0
+        self._ordenar(elementos, 0, len(elementos), 0)
+        self._claves = [e[0] for e in elementos]
+        self._puntos = [e[1] for e in elementos]
+        self._datos = [e[2] for e in elementos]
+        self._indice = {clave: i for i, clave in enumerate(self._claves)}
+        self._borrados = set()
+        self._buffer = {}
+
+    def _ordenar(self, elementos, lo, hi, eje):
+        if hi - lo <= 1:
+            return
+        elementos[lo:hi] = sorted(elementos[lo:hi], key=lambda e: e[1][eje])
+        medio = (lo + hi) // 2
+        sig = (eje + 1) % self._dim
+        self._ordenar(elementos, lo, medio, sig)
+        self._ordenar(elementos, medio + 1, hi, sig)
+
+    # ---------------- Consultas ----------------
+
+    def vecinos(self, punto, k=None, radio=None):
+        if len(self._buffer) + len(self._borrados) > max(64, len(self._indice) // 4):
+            self._reconstruir()
+        punto = tuple(punto)
+        limite = radio * radio if radio is not None else float("inf")
+        # Montículo máximo (distancia negada) con los mejores hasta ahora
+        mejores = []
+        orden = itertools.count()  # desempate: no comparar claves ni datos
+
+        def considerar(d2, clave, dato):
+            nonlocal limite
+            if d2 > limite:
+                return
+            entrada = (-d2, next(orden), clave, dato)
+            if k is None:
+                mejores.append(entrada)
+                return
+            if len(mejores) < k:
+                heapq.heappush(mejores, entrada)
+            else:
+                heapq.heapreplace(mejores, entrada)
+            if len(mejores) == k:
+                limite = -mejores[0][0]
+
+        if k != 0:
+            for clave, (p, dato) in self._buffer.items():
+                considerar(self._distancia2(punto, p), clave, dato)
+
+            def buscar(lo, hi, eje):
+                if lo >= hi:
+                    return
+                medio = (lo + hi) // 2
+                p = self._puntos[medio]
+                if medio not in self._borrados:
+                    considerar(self._distancia2(punto, p), self._claves[medio], self._datos[medio])
+                diferencia = punto[eje] - p[eje]
+                sig = (eje + 1) % self._dim
+                if diferencia < 0:
+                    buscar(lo, medio, sig)
+                    if diferencia * diferencia <= limite:
+                        buscar(medio + 1, hi, sig)
+                else:
+                    buscar(medio + 1, hi, sig)
+                    if diferencia * diferencia <= limite:
+                        buscar(lo, medio, sig)
+
+            buscar(0, len(self._puntos), 0)
+
+        mejores.sort(key=lambda e: (-e[0], e[1]))
+        return [((-d2) ** 0.5, clave, dato) for d2, _, clave, dato in mejores]
+
+    @staticmethod
+    def _distancia2(a, b):
+        return sum((x - y) * (x - y) for x, y in zip(a, b))
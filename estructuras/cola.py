@@ -1,36 +1,135 @@
+from estructuras.fenwick import ArbolFenwick
+
 class NodoCola:
-    __slots__ = ("dato", "sig")
-    def __init__(self, dato):
+    __slots__ = ("dato", "sig", "ant", "clave", "turno")
+    def __init__(self, dato, clave=None):
         self.dato = dato
         self.sig = None
+        self.ant = None
+        self.clave = clave
+        self.turno = 0
 
 class Cola:
-    def __init__(self):
+    """
+    Cola FIFO con nodos doblemente enlazados y un índice clave → nodo.
+
+    `clave(dato)` da el identificador de cada elemento (None = sin índice).
+    Con él, remover(clave) y obtener(clave) son O(1) y recorrer() permite
+    mirar la cola en orden sin desencolar y volver a encolar todo.
+    Una clave aparece una sola vez: encolar otra vez la misma clave
+    actualiza el dato sin que pierda su turno.
+
+    Posiciones: cada nodo recibe un número de turno creciente al encolarse y
+    un árbol de Fenwick marca con 1 los turnos que siguen en la cola, así
+    posicion(clave) = cuántos turnos vivos hay hasta el suyo, en O(log n),
+    aunque salgan elementos de cualquier lugar. Cuando los turnos usados
+    llenan el árbol se renumeran los vivos (O(n), amortizado O(1)).
+    """
+    def __init__(self, clave=None):
         self.frente = None
         self.final = None
         self._len = 0
+        self._clave = clave
+        self._nodos = {}
+        self._turnos = ArbolFenwick(64)
+        self._siguiente_turno = 1
 
     def __len__(self): return self._len
     def esta_vacia(self): return self.frente is None
 
+    def _clave_de(self, dato):
+        if self._clave is None:
+            return None
+        c = self._clave(dato)
+        return str(c) if c is not None else None
+
     def encolar(self, dato):
-        n = NodoCola(dato)
+        clave = self._clave_de(dato)
+        if clave is not None and clave in self._nodos:
+            self._nodos[clave].dato = dato
+            return
+        n = NodoCola(dato, clave)
+        if self._siguiente_turno > len(self._turnos):
+            self._renumerar()
+        n.turno = self._siguiente_turno
+        self._siguiente_turno += 1
+        self._turnos.sumar(n.turno, 1)
         if not self.final:
             self.frente = self.final = n
         else:
+            n.ant = self.final
             self.final.sig = n
             self.final = n
+        if clave is not None:
+            self._nodos[clave] = n
         self._len += 1
 
+    def _desenlazar(self, n):
+        if n.ant: n.ant.sig = n.sig
+        else:     self.frente = n.sig
+        if n.sig: n.sig.ant = n.ant
+        else:     self.final = n.ant
+        # n.sig se conserva: un recorrido parado en este nodo puede seguir
+        n.ant = None
+        if n.clave is not None:
+            self._nodos.pop(n.clave, None)
+        self._turnos.sumar(n.turno, -1)
+        self._len -= 1
+
+    def _renumerar(self):
+        """Turnos 1..len para los vivos y un árbol con lugar para otros tantos"""
+        capacidad = max(64, 2 * (self._len + 1))
+        p, turno = self.frente, 0
+        while p:
+            turno += 1
+            p.turno = turno
+            p = p.sig
+        self._turnos = ArbolFenwick(capacidad, [1] * turno)
+        self._siguiente_turno = turno + 1
+
     def desencolar(self):
         if not self.frente:
             return None
         n = self.frente
-        self.frente = n.sig
-        if not self.frente:
-            self.final = None
-        self._len -= 1
+        self._desenlazar(n)
         return n.dato
 
     def ver_frente(self):
         return self.frente.dato if self.frente else None
+
+    # ---------------- Acceso por clave ----------------
+
+    def remover(self, clave):
+        """Saca el elemento con esa clave (esté donde esté) y lo devuelve; None si no está"""
+        n = self._nodos.get(str(clave)) if clave is not None else None
+        if n is None:
+            return None
+        self._desenlazar(n)
+        return n.dato
+
+    def obtener(self, clave):
+        n = self._nodos.get(str(clave)) if clave is not None else None
+        return n.dato if n else None
+
+    def __contains__(self, clave):
+        return clave is not None and str(clave) in self._nodos
+
+    def posicion(self, clave):
+        """Posición actual (1 = frente) del elemento con esa clave, en O(log n); None si no está"""
+        n = self._nodos.get(str(clave)) if clave is not None else None
+        return self._turnos.prefijo(n.turno) if n else None
+
+    # ---------------- Lectura sin modificar ----------------
+
+    def recorrer(self):
+        """Datos del frente al final, sin sacarlos de la cola"""
+        p = self.frente
+        while p:
+            yield p.dato
+            p = p.sig
+
+    __iter__ = recorrer
+
+    def instantanea(self):
+        """Lista con el contenido actual en orden FIFO (copia de la secuencia, no de los datos)"""
+        return list(self.recorrer())
@@ -0,0 +1,100 @@
+import heapq
+from operator import attrgetter
+
+from estructuras.arbol_kd import ArbolKD
+from estructuras.cola import Cola
+
+_clave_nodo = attrgetter("clave")
+_turno_nodo = attrgetter("turno")
+
+class ColaPorZonas(Cola):
+    """
+    Cola FIFO (la de estructuras/cola.py, con clave obligatoria) que además
+    reparte sus elementos en una sub-cola por zona.
+
+    `zona(dato)` da la zona de cada elemento (None = solo en la cola global).
+    Cada sub-cola guarda los mismos nodos de la cola global en el mismo orden
+    relativo, así que recorrer_zonas(zonas) visita solo esas sub-colas y las
+    mezcla por el turno de cada nodo: mismo orden FIFO que recorrer()
+    filtrando, sin pasar por el resto.
+    Encolar, remover y desencolar mantienen las sub-colas en O(1) extra.
+
+    Con `punto(dato)` (coordenadas o None) los nodos también van a un árbol
+    k-d (estructuras/arbol_kd.py) para cercanos(): k más cercanos y/o radio.
+    """
+    def __init__(self, clave, zona, punto=None):
+        super().__init__(clave)
+        self._zona = zona
+        self._zonas = {}          # zona -> Cola
+        self._zona_de_clave = {}  # clave -> zona
+        self._punto = punto
+        self._arbol = ArbolKD() if punto is not None else None
+
+    def encolar(self, dato):
+        super().encolar(dato)
+        clave = self._clave_de(dato)
+        if clave is None:
+            return
+        if self._arbol is not None:
+            punto = self._punto(dato)
+            if punto is None:
+                self._arbol.remover(clave)
+            else:
+                self._arbol.insertar(clave, punto, self._nodos[clave])
+        zona = self._zona(dato)
+        anterior = self._zona_de_clave.get(clave)
+        if anterior is not None and anterior != zona:
+            # Cambió de zona (no pasa con pendientes): va al final de la nueva
+            self._quitar_de_zona(clave, anterior)
+            del self._zona_de_clave[clave]
+        if zona is None:
+            return
+        sub = self._zonas.get(zona)
+        if sub is None:
+            sub = self._zonas[zona] = Cola(clave=_clave_nodo)
+        sub.encolar(self._nodos[clave])
+        self._zona_de_clave[clave] = zona
+
+    def _desenlazar(self, n):
+        super()._desenlazar(n)
+        if self._arbol is not None and n.clave is not None:
+            self._arbol.remover(n.clave)
+        zona = self._zona_de_clave.pop(n.clave, None) if n.clave is not None else None
+        if zona is not None:
+            self._quitar_de_zona(n.clave, zona)
+
+    def _quitar_de_zona(self, clave, zona):
+        sub = self._zonas.get(zona)
+        if sub is not None:
+            sub.remover(clave)
+            if sub.esta_vacia():
+                del self._zonas[zona]
+
+    # ---------------- Lectura por zonas ----------------
+
+    def zonas(self):
+        """Zonas con al menos un elemento y cuántos tiene cada una"""
+        return {zona: len(sub) for zona, sub in self._zonas.items()}
+
+    def zona_de(self, clave):
+        return self._zona_de_clave.get(str(clave)) if clave is not None else None
+
+    def recorrer_zonas(self, zonas):
+        """
+        Datos de las zonas pedidas en orden FIFO global, sin sacarlos.
+        `zonas` necesita `in` y len(): si pide más zonas de las que tienen
+        elementos se recorren las ocupadas y se pregunta por cada una.
+        """
+        if len(zonas) > len(self._zonas):
+            subs = [sub for zona, sub in self._zonas.items() if zona in zonas]
+        else:
+            subs = [self._zonas[zona] for zona in zonas if zona in self._zonas]
+        if len(subs) == 1:
+            nodos = subs[0].recorrer()
+        else:
+            nodos = heapq.merge(*(sub.recorrer() for sub in subs), key=_turno_nodo)
+        return (n.dato for n in nodos)
+
+    def cercanos(self, punto, k=None, radio=None):
+        """[(distancia, dato)] por distancia creciente (requiere `punto` al crear la cola)"""
+        return [(d, n.dato) for d, _, n in self._arbol.vecinos(punto, k, radio)]
@@ -0,0 +1,35 @@
+class ArbolFenwick:
+    """
+    Árbol de Fenwick (Binary Indexed Tree) sobre las posiciones 1..n.
+    sumar(i, delta) y prefijo(i) = valores[1] + ... + valores[i] en O(log n).
+    """
+    def __init__(self, n, valores=None):
+        self.n = n
+        self._arbol = [0] * (n + 1)
+        if valores:
+            # Construcción en O(n): cada nodo pasa su total a su padre
+            for i, v in enumerate(valores[:n], start=1):
+                self._arbol[i] = v
+            for i in range(1, n + 1):
+                padre = i + (i & -i)
+                if padre <= n:
+                    self._arbol[padre] += self._arbol[i]
+
+    def __len__(self): return self.n
+
+    def sumar(self, i, delta):
+        while i <= self.n:
+            self._arbol[i] += delta
+            i += i & -i
+
+    def prefijo(self, i):
+        total = 0
+        i = min(i, self.n)
+        while i > 0:
+            total += self._arbol[i]
+            i -= i & -i
+        return total
+
+    def rango(self, i, j):
+        """valores[i] + ... + valores[j]"""
+        return self.prefijo(j) - self.prefijo(i - 1)
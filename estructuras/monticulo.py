@@ -0,0 +1,70 @@
+import heapq
+import itertools
+
+_REMOVIDO = object()
+
+class Monticulo:
+    """
+    Montículo mínimo (cola de prioridad) con claves.
+    insertar / extraer_minimo en O(log n), ver_minimo en O(1) amortizado.
+    remover(clave) marca la entrada y se descarta cuando llega a la cima
+    (borrado perezoso). A igual prioridad sale primero la que entró antes.
+    """
+    def __init__(self, elementos=()):
+        # Entradas [prioridad, orden, clave, dato]; `orden` desempata sin comparar claves
+        self._orden = itertools.count()
+        self._entradas = {}
+        self._heap = []
+        for prioridad, clave, dato in elementos:
+            e = [prioridad, next(self._orden), clave, dato]
+            self._entradas[clave] = e
+            self._heap.append(e)
+        heapq.heapify(self._heap)  # construir desde una lista: O(n)
+
+    def __len__(self): return len(self._entradas)
+    def esta_vacio(self): return not self._entradas
+    def __contains__(self, clave): return clave in self._entradas
+
+    def insertar(self, prioridad, clave, dato=None):
+        """Agrega (o reprograma, si la clave ya estaba) un elemento"""
+        self.remover(clave)
+        e = [prioridad, next(self._orden), clave, dato]
+        self._entradas[clave] = e
+        heapq.heappush(self._heap, e)
+
+    def prioridad(self, clave):
+        e = self._entradas.get(clave)
+        return e[0] if e else None
+
+    def remover(self, clave):
+        e = self._entradas.pop(clave, None)
+        if e is None:
+            return None
+        dato = e[3]
+        e[2] = _REMOVIDO
+        e[3] = None
+        return dato
+
+    def _limpiar_cima(self):
+        while self._heap and self._heap[0][2] is _REMOVIDO:
+            heapq.heappop(self._heap)
+
+    def ver_minimo(self):
+        """(prioridad, clave, dato) del menor, sin sacarlo; None si está vacío"""
+        self._limpiar_cima()
+        if not self._heap:
+            return None
+        prioridad, _, clave, dato = self._heap[0]
+        return prioridad, clave, dato
+
+    def extraer_minimo(self):
+        self._limpiar_cima()
+        if not self._heap:
+            return None
+        prioridad, _, clave, dato = heapq.heappop(self._heap)
+        del self._entradas[clave]
+        return prioridad, clave, dato
+
+    def elementos(self):
+        """(prioridad, clave, dato) de todos, en orden de salida"""
+        return [(e[0], e[2], e[3]) for e in sorted(self._entradas.values())]
@@ -0,0 +1,38 @@
+# scripts/archivar_viajes.py
+"""
+Mueve las solicitudes terminadas (y sus contraofertas) a las particiones
+mensuales de data/archivo/ (ver servicios/particiones.py).
+
+    python scripts/archivar_viajes.py            # retención de config (TRANSPORT_ARCHIVO_DIAS)
+    python scripts/archivar_viajes.py --dias 0   # archivar todo lo terminado
+"""
+import argparse
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios import config
+from servicios.particiones import archivar_terminados
+from servicios.solicitudes_mejoradas import repositorio_solicitudes, repositorio_contraofertas
+from servicios.usuarios_repo import obtener_estadisticas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archivar viajes terminados")
+    parser.add_argument("--dias", type=int, default=config.ARCHIVO_DIAS_RETENCION,
+                        help="días que un viaje terminado se queda en el archivo caliente")
+    args = parser.parse_args()
+
+    antes = obtener_estadisticas()["viajes_por_estado"]
+    resultado = archivar_terminados(repositorio_solicitudes(), repositorio_contraofertas(), args.dias)
+    print(f"Solicitudes archivadas: {resultado['solicitudes']}")
+    print(f"Contraofertas archivadas: {resultado['contraofertas']}")
+    print(f"Particiones: {', '.join(resultado['meses']) or '-'} en {config.ARCHIVO_DIR}")
+
+    # Archivar mueve viajes, no los borra: las estadísticas no deben cambiar
+    despues = obtener_estadisticas()["viajes_por_estado"]
+    if despues != antes:
+        print(f"❌ Viajes por estado cambiaron al archivar: {antes} -> {despues}")
+        sys.exit(1)
+    print(f"Viajes por estado sin cambios: {despues}")
@@ -0,0 +1,87 @@
+# scripts/benchmark_ciclo_viaje.py
+"""
+Mide el ciclo de vida completo de un viaje (solicitar → ofertar → aceptar →
+iniciar → finalizar) con la lógica real de solicitudes_mejoradas, inyectando
+repositorios en memoria (sin E/S) o de archivos en una carpeta temporal.
+
+    python scripts/benchmark_ciclo_viaje.py                 # memoria, 2000 viajes
+    python scripts/benchmark_ciclo_viaje.py -n 500 --archivo
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios import solicitudes_mejoradas as sm
+from servicios.historial import obtener_historial_pasajero
+from servicios.repositorios import RepositorioArchivo, RepositorioMemoria
+
+ORIGEN = {"nombre": "UNMSM", "lat": -12.0560, "lng": -77.0844}
+DESTINO = {"nombre": "Miraflores", "lat": -12.1211, "lng": -77.0297}
+
+
+def ciclo(n: int, semilla: int = 7):
+    rnd = random.Random(semilla)
+    tiempos = {"solicitar": 0.0, "ofertar": 0.0, "aceptar": 0.0, "iniciar": 0.0, "finalizar": 0.0}
+
+    def medir(paso, func, *args):
+        t0 = time.perf_counter()
+        r = func(*args)
+        tiempos[paso] += time.perf_counter() - t0
+        return r
+
+    for i in range(n):
+        pasajero_id = rnd.randint(1, 200)
+        conductor_id = rnd.randint(1, 50)
+        sol = medir("solicitar", sm.crear_solicitud_pasajero, pasajero_id, ORIGEN, DESTINO, rnd.uniform(2, 20))
+        oferta = medir("ofertar", sm.crear_contraoferta, conductor_id, sol["id"], sol["precio_estandar"])
+        medir("aceptar", sm.pasajero_acepta_contraoferta, pasajero_id, oferta["id"])
+        medir("iniciar", sm.iniciar_viaje_conductor, conductor_id, sol["id"])
+        medir("finalizar", sm.finalizar_viaje_conductor, conductor_id, sol["id"])
+
+    t0 = time.perf_counter()
+    for pasajero_id in range(1, 201):
+        obtener_historial_pasajero(pasajero_id)
+    tiempos["historial (200)"] = time.perf_counter() - t0
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del ciclo de vida de viajes")
+    parser.add_argument("-n", type=int, default=2000, help="cantidad de viajes")
+    parser.add_argument("--archivo", action="store_true", help="usar archivos en una carpeta temporal")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        if args.archivo:
+            sm.configurar_repositorios(
+                solicitudes=RepositorioArchivo(Path(carpeta) / "solicitudes.json"),
+                contraofertas=RepositorioArchivo(Path(carpeta) / "contraofertas.json"),
+            )
+        else:
+            sm.configurar_repositorios(
+                solicitudes=RepositorioMemoria("solicitudes"),
+                contraofertas=RepositorioMemoria("contraofertas"),
+            )
+
+        # La lógica imprime cada paso; se descarta para no medir la consola
+        with contextlib.redirect_stdout(io.StringIO()):
+            tiempos = ciclo(args.n)
+
+    modo = "archivos" if args.archivo else "memoria"
+    print(f"🚖 {args.n:,} viajes completos con repositorios en {modo}")
+    for paso, total in tiempos.items():
+        print(f"  {paso:<16}{total:>9.3f} s")
+    total = sum(v for k, v in tiempos.items() if not k.startswith("historial"))
+    print(f"  {'ciclos/s':<16}{args.n / total:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# scripts/benchmark_codecs.py
+"""
+Compara los códecs de servicios/serializacion.py sobre un conjunto sintético
+de solicitudes (mismo formato que crear_solicitud_pasajero).
+
+    python scripts/benchmark_codecs.py            # 100 000 solicitudes
+    python scripts/benchmark_codecs.py -n 20000 -r 5
+
+Reporta tamaño en disco, tiempo de codificar + escribir y de leer + decodificar
+(mejor de R repeticiones).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios.serializacion import CODECS, codecs_disponibles, codificar, leer_archivo
+
+LUGARES = [
+    ("Plaza San Miguel", -12.0776, -77.0826), ("Miraflores", -12.1211, -77.0297),
+    ("Barranco", -12.1493, -77.0211), ("San Isidro", -12.0977, -77.0365),
+    ("UNMSM", -12.0560, -77.0844), ("Jockey Plaza", -12.0857, -76.9770),
+    ("Callao", -12.0566, -77.1181), ("Surco", -12.1450, -76.9910),
+]
+ESTADOS = ["pendiente", "confirmado", "en_curso", "completado", "cancelado_pasajero", "cancelado_conductor"]
+HORAS = ["ahora", "30_min", "60_min"]
+
+
+def _punto(rnd):
+    nombre, lat, lng = rnd.choice(LUGARES)
+    return {"nombre": nombre, "lat": round(lat + rnd.uniform(-0.01, 0.01), 6),
+            "lng": round(lng + rnd.uniform(-0.01, 0.01), 6)}
+
+
+def generar_solicitudes(n: int, semilla: int = 42):
+    rnd = random.Random(semilla)
+    inicio = datetime(2025, 1, 1)
+    solicitudes = []
+    for i in range(1, n + 1):
+        creada = inicio + timedelta(seconds=i * 37)
+        estado = rnd.choice(ESTADOS)
+        distancia = round(rnd.uniform(1, 25), 2)
+        con_conductor = estado in ("confirmado", "en_curso", "completado")
+        solicitudes.append({
+            "id": i,
+            "pasajero_id": rnd.randint(1, 5000),
+            "origen": _punto(rnd),
+            "destino": _punto(rnd),
+            "distancia": distancia,
+            "precio_estandar": round(5 + distancia * 1.2, 2),
+            "estado": estado,
+            "conductor_id": rnd.randint(1, 800) if con_conductor else None,
+            "precio_acordado": round(5 + distancia * 1.1, 1) if con_conductor else None,
+            "fecha_creacion": creada.strftime("%Y-%m-%d %H:%M:%S"),
+            "fecha_partida_estimada": creada.strftime("%Y-%m-%d %H:%M:%S"),
+            "hora_seleccionada": rnd.choice(HORAS),
+            "fecha_actualizacion": None,
+            "posicion_cola": rnd.randint(1, 50),
+            "version": rnd.randint(1, 6),
+        })
+    return solicitudes
+
+
+def medir(codec: str, datos, carpeta: str, repeticiones: int):
+    ruta = os.path.join(carpeta, f"solicitudes_{codec}.json")
+    mejor_cod = mejor_dec = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        contenido = codificar(datos, codec)
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        mejor_cod = min(mejor_cod, time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        leidos = leer_archivo(ruta)
+        mejor_dec = min(mejor_dec, time.perf_counter() - t0)
+    if leidos != datos:
+        print(f"⚠️ {codec}: los datos leídos no coinciden con los originales")
+    return os.path.getsize(ruta), mejor_cod, mejor_dec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de códecs de /data")
+    parser.add_argument("-n", type=int, default=100_000, help="cantidad de solicitudes")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📦 Generando {args.n:,} solicitudes sintéticas...")
+    datos = generar_solicitudes(args.n)
+    disponibles = codecs_disponibles()
+
+    print(f"\n{'códec':<14}{'tamaño (MB)':>12}{'vs legible':>12}{'codificar (s)':>15}{'decodificar (s)':>17}")
+    base = None
+    with tempfile.TemporaryDirectory() as carpeta:
+        for codec in ["json_legible"] + [c for c in CODECS if c != "json_legible"]:
+            if not disponibles[codec]:
+                print(f"{codec:<14}{'(no instalado)':>12}")
+                continue
+            tam, cod, dec = medir(codec, datos, carpeta, args.repeticiones)
+            base = base or tam
+            print(f"{codec:<14}{tam / 1e6:>12.2f}{tam / base:>11.0%} {cod:>15.3f}{dec:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
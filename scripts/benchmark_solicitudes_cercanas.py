@@ -0,0 +1,111 @@
+# scripts/benchmark_solicitudes_cercanas.py
+"""
+Mide la búsqueda de solicitudes cercanas (sondeo de conductores) con la cola
+repartida por zonas (servicios/zonas.py) contra el recorrido de la cola
+completa. Usa la lógica real de solicitudes_mejoradas con repositorios en
+memoria: se cargan N pendientes con origen al azar sobre Lima y cada
+conductor, en un punto al azar, pide las de su radio.
+
+    python scripts/benchmark_solicitudes_cercanas.py                  # 50k pendientes, 5k conductores
+    python scripts/benchmark_solicitudes_cercanas.py --radio 10 --base 100
+
+El recorrido completo es lento: se mide sobre los primeros --base conductores
+(y se comprueba que ambos devuelven las mismas solicitudes en el mismo orden).
+"""
+import argparse
+import contextlib
+import io
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios import solicitudes_mejoradas as sm
+from servicios.repositorios import RepositorioMemoria
+
+# Rectángulo aproximado de Lima Metropolitana (lat, lng)
+LIMA = ((-12.25, -11.85), (-77.15, -76.85))
+DESTINO = {"nombre": "Miraflores", "lat": -12.1211, "lng": -77.0297}
+
+
+def punto(rnd):
+    return rnd.uniform(*LIMA[0]), rnd.uniform(*LIMA[1])
+
+
+def cargar(n: int, rnd) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        lat, lng = punto(rnd)
+        origen = {"nombre": f"Punto {i}", "lat": lat, "lng": lng}
+        sm.crear_solicitud_pasajero(i % 5000 + 1, origen, DESTINO, rnd.uniform(2, 20))
+    return time.perf_counter() - t0
+
+
+def cercanas_recorrido_completo(lat, lng, radio_km):
+    """Lo que hacía obtener_solicitudes_cercanas antes: toda la cola + haversine a cada una"""
+    r = 6371
+    resultado = []
+    for sol in sm.obtener_solicitudes_activas():
+        o = sol["origen"]
+        dlat = math.radians(o["lat"] - lat)
+        dlng = math.radians(o["lng"] - lng)
+        a = (math.sin(dlat / 2) ** 2
+             + math.cos(math.radians(lat)) * math.cos(math.radians(o["lat"])) * math.sin(dlng / 2) ** 2)
+        if round(r * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)) * 1.4, 2) <= radio_km:
+            resultado.append(sol)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de solicitudes cercanas por zonas")
+    parser.add_argument("-n", type=int, default=50000, help="solicitudes pendientes")
+    parser.add_argument("-c", "--conductores", type=int, default=5000, help="conductores que consultan")
+    parser.add_argument("--radio", type=float, default=3, help="radio de búsqueda en km")
+    parser.add_argument("--base", type=int, default=200,
+                        help="conductores medidos con el recorrido completo (0 = ninguno)")
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    sm.configurar_repositorios(
+        solicitudes=RepositorioMemoria("solicitudes"),
+        contraofertas=RepositorioMemoria("contraofertas"),
+    )
+    conductores = [punto(rnd) for _ in range(args.conductores)]
+
+    # La lógica imprime cada paso; se descarta para no medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_carga = cargar(args.n, rnd)
+
+        encontradas = 0
+        t0 = time.perf_counter()
+        for lat, lng in conductores:
+            encontradas += len(sm.obtener_solicitudes_cercanas(lat, lng, args.radio))
+        t_zonas = time.perf_counter() - t0
+
+        base = conductores[:args.base]
+        t0 = time.perf_counter()
+        completas = [cercanas_recorrido_completo(lat, lng, args.radio) for lat, lng in base]
+        t_completo = time.perf_counter() - t0
+        iguales = all(
+            [s["id"] for s in sm.obtener_solicitudes_cercanas(lat, lng, args.radio)] == [s["id"] for s in c]
+            for (lat, lng), c in zip(base, completas)
+        )
+
+    zonas = sm.cola_solicitudes.zonas()
+    print(f"🚖 {args.n:,} pendientes en {len(zonas):,} zonas; {args.conductores:,} conductores, radio {args.radio} km")
+    print(f"  {'carga':<22}{t_carga:>9.3f} s")
+    print(f"  {'por zonas':<22}{t_zonas:>9.3f} s  ({t_zonas / args.conductores * 1000:.2f} ms/consulta, "
+          f"{encontradas / args.conductores:.0f} solicitudes de promedio)")
+    if base:
+        por_consulta = t_completo / len(base)
+        print(f"  {'recorrido completo':<22}{t_completo:>9.3f} s  ({por_consulta * 1000:.2f} ms/consulta "
+              f"sobre {len(base)}; ~{por_consulta * args.conductores:.1f} s para todos)")
+        print(f"  {'mismo resultado':<22}{'sí' if iguales else 'NO':>9}")
+
+
+if __name__ == "__main__":
+    main()
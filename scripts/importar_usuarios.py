@@ -0,0 +1,287 @@
+# scripts/importar_usuarios.py
+"""
+Importación masiva de pasajeros y conductores desde CSV, JSONL o JSON.
+
+    python scripts/importar_usuarios.py conductores.csv --tipo conductor
+    python scripts/importar_usuarios.py usuarios.jsonl --procesos 8
+    python scripts/importar_usuarios.py usuarios.json --lote 2000
+    python scripts/importar_usuarios.py nuevos.csv --tipo pasajero --password-defecto Temporal123 --simular
+
+- El archivo se lee fila por fila: csv.DictReader, una línea por vez (.jsonl /
+  .ndjson) o un elemento por vez de un arreglo JSON (.json, con
+  servicios/lectura_incremental.py).
+- Cada fila se valida con las mismas reglas que /registro y se descarta si su
+  correo (o placa) ya existe: contra los índices de usuarios y contra las
+  filas anteriores del mismo archivo.
+- Las filas válidas se procesan en lotes de --lote: los hashes de contraseña
+  (lo caro: PBKDF2) se calculan en un pool de procesos, con la política de
+  config.HASH_METODO, y cada colección se escribe una vez por lote
+  (usuarios_repo.crear_usuarios → almacenamiento.insertar_registros). Así
+  la memoria no crece con el archivo: contraseñas y hashes de un lote a la vez.
+
+Columnas: nombre, apellido (opcional), correo, telefono, password, tipo
+(si no se pasa --tipo) y, para conductores, licencia, placa, modelo, color.
+Al final informa filas leídas, importadas, rechazadas (con el motivo) y filas/s.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from werkzeug.security import generate_password_hash
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios.contrasenas import SALT_LONGITUD, metodo_actual
+from servicios.lectura_incremental import iterar_archivo
+from servicios.usuarios_repo import (
+    buscar_conductor_por_placa, buscar_usuario_por_correo, crear_usuarios, normalizar_correo
+)
+
+TIPOS = ("pasajero", "conductor")
+COLECCION = {"pasajero": "pasajeros", "conductor": "conductores"}
+PLACA = re.compile(r"[A-Z]{3}-\d{3}")
+LOTE = 5000
+FORMATOS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "json"}
+
+
+# ============================================
+# LECTURA (streaming)
+# ============================================
+
+def _filas_csv(ruta: Path) -> Iterator[Dict[str, Any]]:
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def _filas_jsonl(ruta: Path) -> Iterator[Dict[str, Any]]:
+    with open(ruta, encoding="utf-8-sig") as f:
+        for linea in f:
+            if linea.strip():
+                try:
+                    fila = json.loads(linea)
+                except json.JSONDecodeError:
+                    fila = None
+                yield fila if isinstance(fila, dict) else {"_invalida": True}
+
+
+def _filas_json(ruta: Path) -> Iterator[Dict[str, Any]]:
+    """Elementos de un arreglo JSON, de a uno (un error de sintaxis corta la lectura)"""
+    for fila in iterar_archivo(ruta):
+        yield fila if isinstance(fila, dict) else {"_invalida": True}
+
+
+def leer_filas(ruta: Path, formato: str) -> Iterator[Dict[str, Any]]:
+    lectores = {"csv": _filas_csv, "jsonl": _filas_jsonl, "json": _filas_json}
+    return lectores[formato](ruta)
+
+
+# ============================================
+# VALIDACIÓN (mismas reglas que /registro)
+# ============================================
+
+def _texto(fila: Dict[str, Any], campo: str) -> str:
+    return str(fila.get(campo) or "").strip()
+
+
+def validar(fila: Dict[str, Any], tipo_defecto: Optional[str],
+            password_defecto: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str, str]:
+    """(usuario sin hash, password, "") o (None, "", motivo)"""
+    if fila.get("_invalida"):
+        return None, "", "registro JSON inválido"
+
+    nombre = _texto(fila, "nombre")
+    apellido = _texto(fila, "apellido")
+    if apellido:
+        nombre = f"{nombre} {apellido}".strip()
+    correo = normalizar_correo(_texto(fila, "correo"))
+    telefono = _texto(fila, "telefono")
+    tipo = tipo_defecto or _texto(fila, "tipo")
+    password = _texto(fila, "password") or (password_defecto or "")
+
+    faltantes = [c for c, v in (("nombre", nombre), ("correo", correo), ("telefono", telefono),
+                                ("contraseña", password)) if not v]
+    if tipo not in TIPOS:
+        faltantes.append("tipo de usuario")
+    if faltantes:
+        return None, "", f"faltan campos: {', '.join(faltantes)}"
+    if len(password) < 6:
+        return None, "", "la contraseña debe tener al menos 6 caracteres"
+
+    usuario = {"nombre": nombre, "correo": correo, "telefono": telefono, "tipo": tipo}
+    if tipo == "conductor":
+        datos = {
+            "licencia": _texto(fila, "licencia").upper(),
+            "placa": _texto(fila, "placa").upper(),
+            "modelo": _texto(fila, "modelo").title(),
+            "color": _texto(fila, "color").title(),
+        }
+        faltantes = [c for c, v in datos.items() if not v]
+        if faltantes:
+            return None, "", f"faltan campos: {', '.join(faltantes)}"
+        if not PLACA.fullmatch(datos["placa"]):
+            return None, "", "formato de placa inválido (ABC-123)"
+        usuario.update(datos)
+        usuario["capacidad"] = 4
+    return usuario, password, ""
+
+
+# ============================================
+# HASH EN PROCESOS
+# ============================================
+
+def _hashear(args: Tuple[str, str]) -> str:
+    password, metodo = args
+    return generate_password_hash(password, method=metodo, salt_length=SALT_LONGITUD)
+
+
+def hashear_todos(passwords: List[str], pool: Optional[ProcessPoolExecutor], procesos: int) -> List[str]:
+    """Hashes de un lote (en `pool` si hay uno: se reusa entre lotes)"""
+    metodo = metodo_actual()
+    trabajos = [(p, metodo) for p in passwords]
+    if pool is None or len(trabajos) < 2:
+        return [_hashear(t) for t in trabajos]
+    bloque = max(1, len(trabajos) // (procesos * 4))
+    return list(pool.map(_hashear, trabajos, chunksize=bloque))
+
+
+# ============================================
+# IMPORTACIÓN
+# ============================================
+
+def _guardar_lote(validas: List[Tuple[int, Dict[str, Any], str]], pool: Optional[ProcessPoolExecutor],
+                  procesos: int, simular: bool, importadas: Dict[str, int],
+                  rechazadas: List[Tuple[int, str]]) -> Tuple[float, float]:
+    """Hashea y escribe un lote de filas válidas; devuelve (segundos de hash, segundos de escritura)"""
+    inicio = time.perf_counter()
+    hashes = hashear_todos([p for _, _, p in validas], pool, procesos)
+    fin_hash = time.perf_counter()
+
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    por_tipo: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for (numero, usuario, _), pwd_hash in zip(validas, hashes):
+        usuario.update({"fecha_registro": fecha, "password_hash": pwd_hash})
+        por_tipo.setdefault(usuario["tipo"], []).append((numero, usuario))
+
+    for t, lote in por_tipo.items():
+        if simular:
+            importadas[t] = importadas.get(t, 0) + len(lote)
+            continue
+        # Una escritura por colección y lote; lo que otro proceso registró
+        # mientras tanto se vuelve a detectar con la colección bloqueada
+        creados, tarde = crear_usuarios(t, [u for _, u in lote])
+        importadas[t] = importadas.get(t, 0) + len(creados)
+        numeros = {id(u): n for n, u in lote}
+        rechazadas.extend((numeros.get(id(u), 0), motivo.rstrip(".").lower()) for u, motivo in tarde)
+    return fin_hash - inicio, time.perf_counter() - fin_hash
+
+
+def importar(ruta: Path, formato: str, tipo: Optional[str], procesos: int,
+             password_defecto: Optional[str], simular: bool, lote: int = LOTE) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    leidas = 0
+    rechazadas: List[Tuple[int, str]] = []
+    importadas: Dict[str, int] = {}
+    validas: List[Tuple[int, Dict[str, Any], str]] = []
+    vistos = set()   # (tipo, "correo"/"placa", valor) ya aceptados en este archivo
+    t_hash = t_escritura = 0.0
+
+    pool = ProcessPoolExecutor(max_workers=procesos) if procesos > 1 else None
+    try:
+        for numero, fila in enumerate(leer_filas(ruta, formato), start=1):
+            leidas += 1
+            usuario, password, motivo = validar(fila, tipo, password_defecto)
+            if usuario is None:
+                rechazadas.append((numero, motivo))
+                continue
+            t = usuario["tipo"]
+            clave_correo = (t, "correo", usuario["correo"])
+            clave_placa = (t, "placa", usuario.get("placa"))
+            if clave_correo in vistos:
+                rechazadas.append((numero, "correo repetido en el archivo"))
+            elif usuario.get("placa") and clave_placa in vistos:
+                rechazadas.append((numero, "placa repetida en el archivo"))
+            elif buscar_usuario_por_correo(usuario["correo"], t):
+                rechazadas.append((numero, f"ya existe un {t} con ese correo"))
+            elif t == "conductor" and buscar_conductor_por_placa(usuario["placa"]):
+                rechazadas.append((numero, "esa placa ya está registrada"))
+            else:
+                vistos.add(clave_correo)
+                if usuario.get("placa"):
+                    vistos.add(clave_placa)
+                validas.append((numero, usuario, password))
+                if len(validas) >= lote:
+                    h, e = _guardar_lote(validas, pool, procesos, simular, importadas, rechazadas)
+                    t_hash, t_escritura, validas = t_hash + h, t_escritura + e, []
+        if validas:
+            h, e = _guardar_lote(validas, pool, procesos, simular, importadas, rechazadas)
+            t_hash, t_escritura = t_hash + h, t_escritura + e
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    fin = time.perf_counter()
+
+    total = fin - inicio
+    return {
+        "leidas": leidas,
+        "importadas": importadas,
+        "rechazadas": sorted(rechazadas),
+        "segundos": {
+            "lectura": total - t_hash - t_escritura,
+            "hash": t_hash,
+            "escritura": t_escritura,
+            "total": total,
+        },
+        "filas_por_segundo": leidas / total if total > 0 else 0.0,
+    }
+
+
+def _formato(ruta: Path, indicado: Optional[str]) -> str:
+    if indicado:
+        return indicado
+    return FORMATOS.get(ruta.suffix.lower(), "csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importar pasajeros/conductores desde CSV, JSONL o JSON")
+    parser.add_argument("archivo", type=Path)
+    parser.add_argument("--formato", choices=("csv", "jsonl", "json"),
+                        help="por defecto según la extensión del archivo")
+    parser.add_argument("--tipo", choices=TIPOS, help="tipo de todas las filas (si no, columna 'tipo')")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="procesos para calcular los hashes")
+    parser.add_argument("--lote", type=int, default=LOTE,
+                        help="filas válidas que se hashean y escriben juntas")
+    parser.add_argument("--password-defecto", help="contraseña para las filas que no traen una")
+    parser.add_argument("--simular", action="store_true", help="validar y hashear sin escribir nada")
+    parser.add_argument("--max-rechazos", type=int, default=20, help="rechazos a listar en detalle")
+    args = parser.parse_args()
+
+    if not args.archivo.exists():
+        sys.exit(f"❌ No existe {args.archivo}")
+
+    try:
+        r = importar(args.archivo, _formato(args.archivo, args.formato), args.tipo,
+                     args.procesos, args.password_defecto, args.simular, max(1, args.lote))
+    except json.JSONDecodeError as e:
+        sys.exit(f"❌ {args.archivo} no es un JSON válido: {e}")
+    s = r["segundos"]
+    print(f"📥 Filas leídas: {r['leidas']}")
+    for t, n in sorted(r["importadas"].items()):
+        print(f"✅ {COLECCION[t]} {'válidos (simulación)' if args.simular else 'importados'}: {n}")
+    print(f"❌ Rechazadas: {len(r['rechazadas'])}")
+    for numero, motivo in r["rechazadas"][:args.max_rechazos]:
+        print(f"   fila {numero}: {motivo}")
+    if len(r["rechazadas"]) > args.max_rechazos:
+        print(f"   ... y {len(r['rechazadas']) - args.max_rechazos} más")
+    print(f"⏱️ lectura {s['lectura']:.2f}s · hash {s['hash']:.2f}s ({args.procesos} procesos) · "
+          f"escritura {s['escritura']:.2f}s · total {s['total']:.2f}s")
+    print(f"🚀 {r['filas_por_segundo']:.0f} filas/s")
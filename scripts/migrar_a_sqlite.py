@@ -0,0 +1,28 @@
+# scripts/migrar_a_sqlite.py
+"""
+Migración única de data/*.json a la base SQLite (config.SQLITE_PATH).
+Después de ejecutarla, arrancar la app con TRANSPORT_STORAGE=sqlite.
+"""
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from servicios import config
+from servicios.almacenamiento_sqlite import RegistrosSinId, migrar_desde_json
+
+if __name__ == "__main__":
+    data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else config.DATA_DIR
+    try:
+        resultado = migrar_desde_json(data_dir)
+    except RegistrosSinId as e:
+        print(f"❌ No se migró nada: {e}")
+        for nombre, registros in sorted(e.rechazados.items()):
+            for r in registros:
+                print(f"   {nombre}.json: {r!r:.120}")
+        print("Corrige esos ids (deben ser enteros) y vuelve a ejecutar la migración.")
+        sys.exit(1)
+    for nombre, total in resultado.items():
+        print(f"Migrado: {nombre}.json -> {total} registros")
+    print(f"Base SQLite: {config.SQLITE_PATH}")
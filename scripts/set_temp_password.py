@@ -1,27 +1,28 @@
 # scripts/set_temp_password.py
-import json
+import sys
 from pathlib import Path
 from werkzeug.security import generate_password_hash
 
 BASE = Path(__file__).resolve().parents[1]
-DATA = BASE / "data"
+sys.path.insert(0, str(BASE))
 
-def set_temp(file_name, temp="Temporal123"):
-    p = DATA / file_name
-    data = json.loads(p.read_text(encoding="utf-8")) if p.exists() else []
-    changed = False
-    for u in data:
+# Por usuarios_repo: bloqueo, versión por registro, índice de usuarios y el
+# formato configurado (JSON, binario o SQLite) de cada colección
+from servicios.usuarios_repo import actualizar_password_hash, archivo_por_tipo, get_usuarios
+
+def set_temp(tipo, temp="Temporal123"):
+    cambiados = 0
+    for u in get_usuarios(tipo):
         if not u.get("password_hash"):
-            u["password_hash"] = generate_password_hash(
-                temp, method="pbkdf2:sha256", salt_length=16
-            )
-            changed = True
-    if changed:
-        p.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-        print(f"Actualizado: {file_name} -> contraseña temporal '{temp}'")
+            nuevo_hash = generate_password_hash(temp, method="pbkdf2:sha256", salt_length=16)
+            if actualizar_password_hash(u["id"], tipo, nuevo_hash):
+                cambiados += 1
+    nombre = archivo_por_tipo(tipo).name
+    if cambiados:
+        print(f"Actualizado: {nombre} ({cambiados}) -> contraseña temporal '{temp}'")
     else:
-        print(f"Sin cambios: {file_name}")
+        print(f"Sin cambios: {nombre}")
 
 if __name__ == "__main__":
-    set_temp("pasajeros.json")
-    set_temp("conductores.json")
+    set_temp("pasajero")
+    set_temp("conductor")
@@ -0,0 +1,512 @@
+# servicios/almacenamiento.py
+"""
+Capa de almacenamiento compartida para los archivos de /data.
+
+CACHÉ DE DOCUMENTOS: cada archivo JSON se parsea una sola vez mientras no
+cambie en disco. La validez se comprueba con la firma (mtime, tamaño, inodo)
+del archivo, así que cualquier escritura (incluido el reemplazo atómico
+tmp → original, que cambia el inodo) obliga a volver a leerlo.
+
+COLECCIONES: funciones por colección y por registro (leer, buscar, insertar,
+actualizar) que funcionan igual con archivos JSON o con SQLite, según
+config.STORAGE_BACKEND. El nombre de la colección es el nombre del archivo
+sin extensión (data/solicitudes.json → "solicitudes").
+
+FORMATO: los archivos se escriben con el códec configurado por colección
+(JSON compacto por defecto, o binario) y al leer el formato se detecta solo
+(ver servicios/serializacion.py).
+
+Las colecciones de config.BITACORA_COLECCIONES (en modo JSON) guardan los
+cambios como parches en una bitácora append-only (ver servicios/bitacora.py).
+
+ESCRITURA AGRUPADA: actualizar_registros_diferido / escribir_coleccion_diferido
+acumulan los cambios de una colección durante config.GRUPO_VENTANA_MS y los
+escriben juntos (ver servicios/escritura_agrupada.py). Las lecturas de este
+módulo ven lo pendiente superpuesto y las escrituras normales lo vuelcan antes.
+
+CONTADORES: las escrituras de pasajeros, conductores y solicitudes ajustan
+los contadores de la plataforma (ver servicios/contadores.py).
+
+Toda escritura se hace con el bloqueo entre procesos de la colección y
+verificando la versión de los registros (ver servicios/concurrencia.py): si
+otro proceso modificó un registro después de leerlo se lanza ConflictoVersion.
+"""
+import json
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from servicios import config
+from servicios import almacenamiento_sqlite
+from servicios.almacenamiento_sqlite import CAMPOS_INDEXADOS, normalizar_campo
+from servicios.serializacion import codec_para, codificar, leer_archivo
+from servicios import secuencias
+from servicios import contadores
+from servicios.lectura_incremental import iterar_archivo
+from servicios.escritura_agrupada import (
+    buffer_para, buffer_pendiente, volcar_pendientes, estadisticas_escritura_agrupada
+)
+from servicios.concurrencia import (
+    ConflictoVersion, bloqueo_archivo, verificar_y_subir_version, preparar_reemplazo
+)
+
+
+Firma = Tuple[int, int, int]
+
+
+def _firma_archivo(ruta: str) -> Firma:
+    st = os.stat(ruta)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _parsear_archivo(ruta: str) -> Any:
+    """Lee y decodifica un archivo (JSON o binario); un archivo vacío equivale a []"""
+    return leer_archivo(ruta)
+
+
+def _copiar_documento(documento: Any) -> Any:
+    """
+    Copia superficial por registro: quien llama puede modificar/añadir
+    campos de primer nivel sin ensuciar la versión en caché.
+    """
+    if isinstance(documento, list):
+        return [dict(r) if isinstance(r, dict) else r for r in documento]
+    if isinstance(documento, dict):
+        return dict(documento)
+    return documento
+
+
+class CacheDocumentos:
+    """Caché {ruta: (firma, documento)} con contadores de aciertos/fallos"""
+
+    def __init__(self):
+        self._entradas: Dict[str, Tuple[Firma, Any]] = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, ruta, cargar: Callable[[str], Any] = _parsear_archivo) -> Any:
+        """
+        Devuelve el documento parseado de `ruta`. Si la firma del archivo no
+        cambió desde la última lectura, no se vuelve a parsear.
+        Propaga FileNotFoundError / json.JSONDecodeError al llamador.
+        """
+        clave = str(ruta)
+        try:
+            firma = _firma_archivo(clave)
+        except FileNotFoundError:
+            self.invalidar(clave)
+            raise
+
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == firma:
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+
+        documento = cargar(clave)
+
+        # Solo se guarda si el archivo no cambió mientras se leía
+        try:
+            if _firma_archivo(clave) == firma:
+                with self._lock:
+                    self._entradas[clave] = (firma, documento)
+        except FileNotFoundError:
+            self.invalidar(clave)
+        return documento
+
+    def invalidar(self, ruta=None):
+        """Descarta una ruta (o toda la caché si no se indica ninguna)"""
+        with self._lock:
+            if ruta is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(str(ruta), None)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+                "archivos_en_cache": len(self._entradas),
+            }
+
+
+cache_documentos = CacheDocumentos()
+
+
+def leer_documento(ruta) -> Any:
+    """
+    Lectura de un archivo JSON a través de la caché compartida.
+    Devuelve una copia que el llamador puede modificar libremente.
+    """
+    return _copiar_documento(cache_documentos.obtener(ruta))
+
+
+def invalidar_documento(ruta) -> None:
+    cache_documentos.invalidar(ruta)
+
+
+def estadisticas_cache() -> Dict[str, Any]:
+    from servicios.bitacora import estadisticas_bitacoras
+    from servicios.indice_usuarios import estadisticas_indices
+    return {
+        **cache_documentos.estadisticas(),
+        "bitacoras": estadisticas_bitacoras(),
+        "indices_usuarios": estadisticas_indices(),
+        "escrituras_agrupadas": estadisticas_escritura_agrupada(),
+    }
+
+
+# ============================================
+# COLECCIONES (JSON o SQLite)
+# ============================================
+
+def nombre_coleccion(ruta) -> str:
+    return Path(ruta).stem
+
+
+def usa_sqlite(ruta) -> bool:
+    """True si la colección de `ruta` vive en SQLite según la configuración"""
+    return config.STORAGE_BACKEND == "sqlite" and nombre_coleccion(ruta) in CAMPOS_INDEXADOS
+
+
+def usa_bitacora(ruta) -> bool:
+    """True si la colección JSON de `ruta` escribe sus cambios en una bitácora"""
+    return not usa_sqlite(ruta) and nombre_coleccion(ruta) in config.BITACORA_COLECCIONES
+
+
+def _bitacora(ruta):
+    from servicios.bitacora import bitacora_para
+    return bitacora_para(ruta)
+
+
+def escribir_documento_atomico(ruta, datos) -> None:
+    """
+    Escribe en un temporal y lo renombra sobre el original (atómico),
+    con el códec configurado para la colección (ver servicios/serializacion.py).
+    """
+    ruta = str(ruta)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temp = ruta + ".tmp"
+    contenido = codificar(datos, codec_para(ruta))
+    try:
+        with open(temp, "wb") as f:
+            f.write(contenido)
+        os.replace(temp, ruta)
+    except Exception:
+        if os.path.exists(temp):
+            os.unlink(temp)
+        raise
+    finally:
+        invalidar_documento(ruta)
+
+
+def leer_coleccion(ruta) -> List[Dict[str, Any]]:
+    """
+    Todos los registros de la colección.
+    Con JSON propaga FileNotFoundError / json.JSONDecodeError.
+    """
+    registros = _leer_coleccion_ahora(ruta)
+    pendiente = buffer_pendiente(ruta)
+    return pendiente.superponer(registros) if pendiente else registros
+
+
+def _leer_coleccion_ahora(ruta) -> List[Dict[str, Any]]:
+    if usa_sqlite(ruta):
+        return almacenamiento_sqlite.leer_coleccion(nombre_coleccion(ruta))
+    if usa_bitacora(ruta):
+        return _bitacora(ruta).leer()
+    d = leer_documento(ruta)
+    return d if isinstance(d, list) else []
+
+
+def _leer_o_vacia(ruta) -> List[Dict[str, Any]]:
+    try:
+        return _leer_coleccion_ahora(ruta)
+    except FileNotFoundError:
+        return []
+
+
+def escribir_coleccion(ruta, registros: List[Dict[str, Any]]) -> None:
+    """
+    Reemplaza la colección completa (lanza excepción si falla).
+    ConflictoVersion si algún registro es más viejo que el guardado.
+    """
+    volcar_pendientes(ruta)
+    _escribir_coleccion_ahora(ruta, registros)
+
+
+def _escribir_coleccion_ahora(ruta, registros: List[Dict[str, Any]]) -> None:
+    if usa_sqlite(ruta):
+        almacenamiento_sqlite.reemplazar_coleccion(nombre_coleccion(ruta), registros)
+        return
+    with bloqueo_archivo(ruta):
+        try:
+            actuales = _leer_o_vacia(ruta)
+        except json.JSONDecodeError:
+            actuales = []  # archivo dañado: se sobrescribe
+        if registros:
+            preparar_reemplazo(actuales, registros)
+        # La secuencia de ids no retrocede aunque se borren registros
+        secuencias.reservar_hasta(ruta, max(_max_id(actuales), _max_id(registros)), lambda: 0)
+        if usa_bitacora(ruta):
+            _bitacora(ruta).reemplazar(registros)
+        else:
+            escribir_documento_atomico(ruta, registros)
+        nombre = nombre_coleccion(ruta)
+        if contadores.cuenta(nombre):
+            contadores.fijar(ruta, nombre, contadores.conteos(nombre, registros))
+
+
+def _a_id(valor) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _max_id(registros: List[Dict[str, Any]]) -> int:
+    return max((_a_id(r.get("id")) or 0 for r in registros if isinstance(r, dict)), default=0)
+
+
+def _coincide(nombre: str, registro: Dict[str, Any], campo: str, valor) -> bool:
+    actual = registro.get(campo)
+    if nombre in CAMPOS_INDEXADOS and campo in CAMPOS_INDEXADOS[nombre]:
+        actual = normalizar_campo(campo, actual)
+        if isinstance(valor, (list, tuple, set, frozenset)):
+            return actual in {normalizar_campo(campo, v) for v in valor}
+        return actual == normalizar_campo(campo, valor)
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return actual in valor
+    return actual == valor
+
+
+def buscar_registros(ruta, **filtros) -> List[Dict[str, Any]]:
+    """
+    Registros cuyo campo == valor para cada filtro (lista/tupla/conjunto = "está en").
+    En SQLite los campos indexados se resuelven con índice.
+    """
+    nombre = nombre_coleccion(ruta)
+
+    def cumple(r):
+        return all(_coincide(nombre, r, campo, valor) for campo, valor in filtros.items())
+
+    if buffer_pendiente(ruta):
+        # Durante la ventana de agrupación se filtra sobre la vista con lo pendiente
+        return [r for r in leer_coleccion(ruta) if cumple(r)]
+    if usa_sqlite(ruta):
+        return almacenamiento_sqlite.filtrar(nombre, **filtros)
+    if usa_bitacora(ruta):
+        return _bitacora(ruta).buscar(cumple)
+    return [r for r in _leer_o_vacia(ruta) if cumple(r)]
+
+
+def iterar_registros(ruta, **filtros) -> Iterator[Dict[str, Any]]:
+    """
+    Como buscar_registros, pero es un generador: los archivos JSON se leen de
+    forma incremental (servicios/lectura_incremental.py) y en SQLite se avanza
+    el cursor, así la memoria no crece con el tamaño de la colección.
+    Pensado para recorridos largos (historial, reportes).
+    """
+    nombre = nombre_coleccion(ruta)
+
+    def cumple(r):
+        return all(_coincide(nombre, r, campo, valor) for campo, valor in filtros.items())
+
+    if buffer_pendiente(ruta):
+        yield from buscar_registros(ruta, **filtros)
+    elif usa_sqlite(ruta):
+        yield from almacenamiento_sqlite.iterar(nombre, **filtros)
+    elif usa_bitacora(ruta):
+        yield from _bitacora(ruta).iterar(cumple)
+    else:
+        try:
+            for r in iterar_archivo(ruta):
+                if isinstance(r, dict) and cumple(r):
+                    yield r
+        except FileNotFoundError:
+            return
+
+
+def obtener_registro(ruta, registro_id) -> Optional[Dict[str, Any]]:
+    rid = _a_id(registro_id)
+    if rid is None:
+        return None
+    if buffer_pendiente(ruta):
+        return next((r for r in leer_coleccion(ruta) if _a_id(r.get("id")) == rid), None)
+    if usa_sqlite(ruta):
+        return almacenamiento_sqlite.obtener(nombre_coleccion(ruta), rid)
+    if usa_bitacora(ruta):
+        return _bitacora(ruta).obtener(rid)
+    return next((r for r in _leer_o_vacia(ruta) if _a_id(r.get("id")) == rid), None)
+
+
+def insertar_registro(ruta, registro: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agrega un registro. Si no trae "id", se le asigna el siguiente de la
+    secuencia de la colección (servicios/secuencias.py, sin recorrer los
+    registros) bajo el bloqueo, así dos procesos no reciben el mismo id.
+    Devuelve el mismo diccionario ya con su id y version. Lanza excepción si falla.
+    """
+    volcar_pendientes(ruta)
+    if usa_sqlite(ruta):
+        return almacenamiento_sqlite.insertar(nombre_coleccion(ruta), registro)
+    nombre = nombre_coleccion(ruta)
+    with bloqueo_archivo(ruta):
+        if usa_bitacora(ruta):
+            _bitacora(ruta).insertar(registro)
+        else:
+            registros = _leer_o_vacia(ruta)
+            if registro.get("id") is None:
+                registro["id"] = secuencias.siguiente_id(ruta, lambda: _max_id(registros))
+            else:
+                secuencias.reservar_hasta(ruta, registro["id"], lambda: _max_id(registros))
+            registro.setdefault("version", 1)
+            registros.append(registro)
+            escribir_documento_atomico(ruta, registros)
+        if contadores.cuenta(nombre):
+            contadores.sumar(ruta, contadores.deltas(nombre, [(None, registro)]))
+    return registro
+
+
+def insertar_registros(ruta, registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Como insertar_registro para un lote completo: los ids se reservan en un
+    solo bloque de la secuencia y la colección se escribe una vez (una
+    reescritura en JSON, un append en la bitácora, una transacción en SQLite).
+    Todo o nada: si falla no queda ningún registro del lote. Devuelve los mismos
+    diccionarios ya con id y version.
+    """
+    if not registros:
+        return registros
+    volcar_pendientes(ruta)
+    if usa_sqlite(ruta):
+        return almacenamiento_sqlite.insertar_varios(nombre_coleccion(ruta), registros)
+    nombre = nombre_coleccion(ruta)
+    with bloqueo_archivo(ruta):
+        if usa_bitacora(ruta):
+            _bitacora(ruta).insertar_varios(registros)
+        else:
+            actuales = _leer_o_vacia(ruta)
+            sin_id = [r for r in registros if r.get("id") is None]
+            secuencias.reservar_hasta(ruta, _max_id(registros), lambda: _max_id(actuales))
+            if sin_id:
+                primero = secuencias.reservar_bloque(ruta, len(sin_id), lambda: _max_id(actuales))
+                for i, r in enumerate(sin_id):
+                    r["id"] = primero + i
+            for r in registros:
+                r.setdefault("version", 1)
+            escribir_documento_atomico(ruta, actuales + registros)
+        if contadores.cuenta(nombre):
+            contadores.sumar(ruta, contadores.deltas(nombre, ((None, r) for r in registros)))
+    return registros
+
+
+def actualizar_registros(ruta, *registros: Dict[str, Any]) -> bool:
+    """
+    Persiste los registros indicados (se reemplazan por id).
+    Devuelve False si alguno no existe o si falla la escritura.
+    Lanza ConflictoVersion si alguno cambió desde que se leyó (hay que releer y
+    reintentar, ver concurrencia.reintentar_si_conflicto).
+    """
+    volcar_pendientes(ruta)
+    return _actualizar_ahora(ruta, *registros)
+
+
+def _actualizar_ahora(ruta, *registros: Dict[str, Any]) -> bool:
+    if not registros:
+        return True
+    try:
+        if usa_sqlite(ruta):
+            almacenamiento_sqlite.guardar_varios(nombre_coleccion(ruta), list(registros))
+            return True
+
+        nombre = nombre_coleccion(ruta)
+        if usa_bitacora(ruta):
+            bitacora = _bitacora(ruta)
+            with bloqueo_archivo(ruta):
+                ultimos = {_a_id(r.get("id")): r for r in registros}
+                anteriores = ({rid: bitacora.obtener(rid) for rid in ultimos}
+                              if contadores.cuenta(nombre) else None)
+                faltantes = bitacora.actualizar(list(registros))
+                if faltantes:
+                    print(f"⚠️ Registros inexistentes en {nombre}: {faltantes}")
+                    return False
+                if anteriores is not None:
+                    contadores.sumar(ruta, contadores.deltas(
+                        nombre, ((anteriores[rid], r) for rid, r in ultimos.items())))
+            return True
+
+        por_id = {_a_id(r.get("id")): r for r in registros}
+        with bloqueo_archivo(ruta):
+            todos = _leer_o_vacia(ruta)
+            pendientes = set(por_id)
+            pares = []
+            for i, actual in enumerate(todos):
+                rid = _a_id(actual.get("id"))
+                if rid in pendientes:
+                    nuevo = por_id[rid]
+                    if nuevo != actual:
+                        verificar_y_subir_version(actual, nuevo)
+                    todos[i] = nuevo
+                    pares.append((actual, nuevo))
+                    pendientes.discard(rid)
+            if pendientes:
+                print(f"⚠️ Registros inexistentes en {nombre}: {sorted(pendientes, key=str)}")
+                return False
+            escribir_documento_atomico(ruta, todos)
+            if contadores.cuenta(nombre):
+                contadores.sumar(ruta, contadores.deltas(nombre, pares))
+        return True
+    except ConflictoVersion:
+        raise
+    except Exception as e:
+        print(f"❌ Error guardando {ruta}:", e)
+        return False
+
+
+# ============================================
+# ESCRITURA AGRUPADA (diferida)
+# ============================================
+
+def _buffer(ruta):
+    return buffer_para(
+        ruta,
+        reemplazar=lambda registros: _escribir_coleccion_ahora(ruta, registros),
+        actualizar=lambda *registros: _actualizar_ahora(ruta, *registros),
+        a_id=_a_id,
+    )
+
+
+def _completado(funcion, *args) -> Future:
+    futuro = Future()
+    try:
+        futuro.set_result(funcion(*args))
+    except Exception as e:
+        futuro.set_exception(e)
+    return futuro
+
+
+def actualizar_registros_diferido(ruta, *registros: Dict[str, Any]) -> "Future[bool]":
+    """
+    Como actualizar_registros, pero el cambio se agrupa con los demás que
+    lleguen a la colección dentro de la ventana y se escriben juntos.
+    El Future da el mismo resultado (True/False o ConflictoVersion) una vez
+    escrito; no hace falta esperarlo si el cambio no es crítico.
+    """
+    if config.GRUPO_VENTANA_MS <= 0:
+        return _completado(actualizar_registros, ruta, *registros)
+    return _buffer(ruta).actualizar(*registros)
+
+
+def escribir_coleccion_diferido(ruta, registros: List[Dict[str, Any]]) -> Future:
+    """Como escribir_coleccion, agrupado (varios reemplazos seguidos escriben solo el último)"""
+    if config.GRUPO_VENTANA_MS <= 0:
+        return _completado(escribir_coleccion, ruta, registros)
+    return _buffer(ruta).reemplazar(registros)
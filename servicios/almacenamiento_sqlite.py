@@ -0,0 +1,431 @@
+# servicios/almacenamiento_sqlite.py
+"""
+Motor SQLite para los datos de TransPort (se activa con TRANSPORT_STORAGE=sqlite).
+
+Cada colección (pasajeros, conductores, solicitudes, contraofertas, viajes)
+es una tabla con:
+  - id:    clave primaria
+  - datos: el registro completo en JSON (mismo formato que los archivos)
+  - columnas extra indexadas para las búsquedas frecuentes
+    (pasajero_id, conductor_id, estado, solicitud_id, correo, placa)
+
+Así un cambio de estado actualiza UNA fila en vez de reescribir todo el archivo.
+La tabla `secuencias` guarda el último id entregado por colección (ids nuevos
+en O(1), sin MAX(id), y sin reutilizar ids borrados).
+Se usa modo WAL para que las lecturas no bloqueen a las escrituras.
+Las escrituras usan BEGIN IMMEDIATE (una sola a la vez entre procesos) y
+verifican el campo "version" de cada registro (ver servicios/concurrencia.py).
+Un registro sin id numérico no entra en la tabla: la escritura entera se
+deshace con RegistrosSinId en vez de perderlo en silencio.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from servicios import config
+from servicios import contadores
+from servicios.concurrencia import verificar_y_subir_version, preparar_reemplazo
+
+# Columnas indexadas por colección
+CAMPOS_INDEXADOS = {
+    "pasajeros": ("correo",),
+    "conductores": ("correo", "placa"),
+    "solicitudes": ("pasajero_id", "conductor_id", "estado"),
+    "contraofertas": ("solicitud_id", "conductor_id", "estado"),
+    "viajes": ("pasajero_id", "conductor_id", "estado"),
+}
+
+
+
+class RegistrosSinId(ValueError):
+    """Registros cuyo id no es un entero (SQLite no los puede guardar)"""
+
+    def __init__(self, rechazados: Dict[str, List[Any]]):
+        self.rechazados = rechazados
+        total = sum(len(v) for v in rechazados.values())
+        super().__init__(f"{total} registro(s) sin id numérico en {', '.join(sorted(rechazados))}")
+
+
+_local = threading.local()
+_esquema_listo = set()
+_esquema_lock = threading.Lock()
+
+
+def normalizar_campo(campo: str, valor: Any) -> Any:
+    """Forma canónica de un campo indexado (igual en JSON y en SQLite)"""
+    if valor is None:
+        return None
+    if campo == "correo":
+        return str(valor).strip().lower()
+    if campo == "placa":
+        return str(valor).strip().upper()
+    return valor
+
+
+def _crear_esquema(con: sqlite3.Connection):
+    con.execute("CREATE TABLE IF NOT EXISTS secuencias (coleccion TEXT PRIMARY KEY, ultimo INTEGER NOT NULL)")
+    con.execute("CREATE TABLE IF NOT EXISTS contadores (clave TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+    for tabla, campos in CAMPOS_INDEXADOS.items():
+        columnas = "".join(f", {c}" for c in campos)
+        con.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (id INTEGER PRIMARY KEY, datos TEXT NOT NULL{columnas})")
+        for c in campos:
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{c} ON {tabla}({c})")
+
+
+def conexion() -> sqlite3.Connection:
+    """Conexión propia de cada hilo (sqlite3 no comparte conexiones entre hilos)"""
+    ruta = str(config.SQLITE_PATH)
+    con = getattr(_local, "con", None)
+    if con is None or getattr(_local, "ruta", None) != ruta:
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(ruta, isolation_level=None, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        _local.con, _local.ruta = con, ruta
+    if ruta not in _esquema_listo:
+        with _esquema_lock:
+            if ruta not in _esquema_listo:
+                _crear_esquema(con)
+                _esquema_listo.add(ruta)
+    return con
+
+
+def _tabla(nombre: str) -> str:
+    if nombre not in CAMPOS_INDEXADOS:
+        raise ValueError(f"Colección no válida: {nombre}")
+    return nombre
+
+
+def _fila(nombre: str, registro: Dict[str, Any]) -> tuple:
+    campos = CAMPOS_INDEXADOS[nombre]
+    return (
+        int(registro["id"]),
+        json.dumps(registro, ensure_ascii=False),
+        *(normalizar_campo(c, registro.get(c)) for c in campos),
+    )
+
+
+def _sql_upsert(nombre: str) -> str:
+    campos = CAMPOS_INDEXADOS[nombre]
+    columnas = ", ".join(("id", "datos") + campos)
+    marcas = ", ".join("?" * (2 + len(campos)))
+    return f"INSERT OR REPLACE INTO {nombre} ({columnas}) VALUES ({marcas})"
+
+
+def _filas(nombre: str, registros: List[Dict[str, Any]]) -> List[tuple]:
+    """Filas para _sql_upsert; RegistrosSinId (dentro de la transacción: se deshace) si alguno no tiene id entero"""
+    filas, rechazados = [], []
+    for r in registros:
+        try:
+            filas.append(_fila(nombre, r))
+        except (KeyError, TypeError, ValueError):
+            rechazados.append(r)
+    if rechazados:
+        raise RegistrosSinId({nombre: rechazados})
+    return filas
+
+
+def registros_sin_id(registros: List[Any]) -> List[Any]:
+    """Los registros que _filas rechazaría (para revisar antes de escribir)"""
+    rechazados = []
+    for r in registros:
+        try:
+            int(r["id"])
+        except (KeyError, TypeError, ValueError):
+            rechazados.append(r)
+    return rechazados
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+def leer_coleccion(nombre: str) -> List[Dict[str, Any]]:
+    tabla = _tabla(nombre)
+    filas = conexion().execute(f"SELECT datos FROM {tabla} ORDER BY id")
+    return [json.loads(d) for (d,) in filas]
+
+
+def obtener(nombre: str, registro_id: int) -> Optional[Dict[str, Any]]:
+    tabla = _tabla(nombre)
+    fila = conexion().execute(f"SELECT datos FROM {tabla} WHERE id = ?", (registro_id,)).fetchone()
+    return json.loads(fila[0]) if fila else None
+
+
+def filtrar(nombre: str, **filtros) -> List[Dict[str, Any]]:
+    """
+    Busca por columnas indexadas; un valor lista/tupla/conjunto equivale a IN (...).
+    Los filtros sobre campos no indexados se aplican después en Python.
+    """
+    return list(iterar(nombre, **filtros))
+
+
+def iterar(nombre: str, **filtros) -> Iterator[Dict[str, Any]]:
+    """Como filtrar, pero entrega las filas de a una a medida que avanza el cursor"""
+    tabla = _tabla(nombre)
+    indexados = CAMPOS_INDEXADOS[nombre]
+    condiciones, params, resto = [], [], {}
+    for campo, valor in filtros.items():
+        if campo not in indexados and campo != "id":
+            resto[campo] = valor
+            continue
+        if isinstance(valor, (list, tuple, set, frozenset)):
+            valores = [normalizar_campo(campo, v) for v in valor]
+            if not valores:
+                return
+            condiciones.append(f"{campo} IN ({', '.join('?' * len(valores))})")
+            params.extend(valores)
+        elif valor is None:
+            condiciones.append(f"{campo} IS NULL")
+        else:
+            condiciones.append(f"{campo} = ?")
+            params.append(normalizar_campo(campo, valor))
+
+    sql = f"SELECT datos FROM {tabla}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY id"
+
+    def cumple(r):
+        for campo, valor in resto.items():
+            if isinstance(valor, (list, tuple, set, frozenset)):
+                if r.get(campo) not in valor:
+                    return False
+            elif r.get(campo) != valor:
+                return False
+        return True
+
+    for (d,) in conexion().execute(sql, params):
+        r = json.loads(d)
+        if cumple(r):
+            yield r
+
+
+# ============================================
+# ESCRITURA
+# ============================================
+
+def _ultimo_id(con: sqlite3.Connection, tabla: str) -> int:
+    fila = con.execute("SELECT ultimo FROM secuencias WHERE coleccion = ?", (tabla,)).fetchone()
+    if fila is not None:
+        return fila[0]
+    # Primera vez: se parte del mayor id existente
+    (ultimo,) = con.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()
+    return ultimo
+
+
+def _siguiente_id(con: sqlite3.Connection, tabla: str) -> int:
+    """Avanza la secuencia (llamar dentro de la transacción)"""
+    nuevo = _ultimo_id(con, tabla) + 1
+    con.execute("INSERT OR REPLACE INTO secuencias (coleccion, ultimo) VALUES (?, ?)", (tabla, nuevo))
+    return nuevo
+
+
+def _reservar_hasta(con: sqlite3.Connection, tabla: str, registros: List[Dict[str, Any]]):
+    """La secuencia nunca queda por debajo de ids escritos a mano (llamar dentro de la transacción)"""
+    ids = [r.get("id") for r in registros if isinstance(r, dict) and isinstance(r.get("id"), int)]
+    ultimo = max([_ultimo_id(con, tabla)] + ids)
+    con.execute("INSERT OR REPLACE INTO secuencias (coleccion, ultimo) VALUES (?, ?)", (tabla, ultimo))
+
+
+def insertar(nombre: str, registro: Dict[str, Any]) -> Dict[str, Any]:
+    """Inserta un registro; si no trae id, se toma el siguiente de la secuencia de la colección"""
+    tabla = _tabla(nombre)
+    con = conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if registro.get("id") is None:
+            registro["id"] = _siguiente_id(con, tabla)
+        else:
+            _reservar_hasta(con, tabla, [registro])
+        registro.setdefault("version", 1)
+        con.execute(_sql_upsert(nombre), _fila(nombre, registro))
+        if contadores.cuenta(nombre):
+            _sumar_contadores(con, contadores.deltas(nombre, [(None, registro)]))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return registro
+
+
+def insertar_varios(nombre: str, registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Como insertar, para un lote completo en una sola transacción (todo o nada)"""
+    tabla = _tabla(nombre)
+    con = conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        sin_id = [r for r in registros if r.get("id") is None]
+        _reservar_hasta(con, tabla, registros)
+        ultimo = _ultimo_id(con, tabla)
+        for i, registro in enumerate(sin_id, start=1):
+            registro["id"] = ultimo + i
+        if sin_id:
+            con.execute("INSERT OR REPLACE INTO secuencias (coleccion, ultimo) VALUES (?, ?)",
+                        (tabla, ultimo + len(sin_id)))
+        for registro in registros:
+            registro.setdefault("version", 1)
+        con.executemany(_sql_upsert(nombre), [_fila(nombre, r) for r in registros])
+        if contadores.cuenta(nombre):
+            _sumar_contadores(con, contadores.deltas(nombre, ((None, r) for r in registros)))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return registros
+
+
+def _datos_por_id(con: sqlite3.Connection, tabla: str, ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+    ids = [i for i in ids if isinstance(i, int)]
+    if not ids:
+        return {}
+    marcas = ",".join("?" * len(ids))
+    filas = con.execute(f"SELECT id, datos FROM {tabla} WHERE id IN ({marcas})", ids).fetchall()
+    return {rid: json.loads(datos) for rid, datos in filas}
+
+
+def guardar_varios(nombre: str, registros: List[Dict[str, Any]]) -> None:
+    """
+    Inserta o reemplaza solo los registros indicados (una transacción).
+    Lanza ConflictoVersion si alguno cambió desde que se leyó.
+    """
+    tabla = _tabla(nombre)
+    con = conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        actuales = _datos_por_id(con, tabla, [r.get("id") for r in registros if isinstance(r, dict)])
+        for nuevo in registros:
+            actual = actuales.get(nuevo.get("id")) if isinstance(nuevo, dict) else None
+            if actual is None:
+                if isinstance(nuevo, dict):
+                    nuevo.setdefault("version", 1)
+            elif nuevo != actual:
+                verificar_y_subir_version(actual, nuevo)
+        _reservar_hasta(con, tabla, registros)
+        con.executemany(_sql_upsert(nombre), _filas(nombre, registros))
+        if contadores.cuenta(nombre):
+            ultimos = {r.get("id"): r for r in registros if isinstance(r, dict)}
+            _sumar_contadores(con, contadores.deltas(
+                nombre, ((actuales.get(rid), r) for rid, r in ultimos.items())))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+def reemplazar_coleccion(nombre: str, registros: List[Dict[str, Any]]) -> None:
+    """
+    Compatibilidad con el código que guarda la lista completa
+    (equivalente a reescribir el archivo JSON).
+    """
+    tabla = _tabla(nombre)
+    con = conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        actuales = [json.loads(d) for (d,) in con.execute(f"SELECT datos FROM {tabla}")]
+        preparar_reemplazo(actuales, registros)
+        _reservar_hasta(con, tabla, actuales + registros)
+        con.execute(f"DELETE FROM {tabla}")
+        con.executemany(_sql_upsert(nombre), _filas(nombre, registros))
+        if contadores.cuenta(nombre):
+            _fijar_contadores(con, nombre, contadores.conteos(nombre, registros))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+# ============================================
+# CONTADORES (ver servicios/contadores.py)
+# ============================================
+
+_INICIALIZADOS = "_inicializados"
+
+
+def _contadores_listos(con: sqlite3.Connection) -> bool:
+    return con.execute("SELECT 1 FROM contadores WHERE clave = ?", (_INICIALIZADOS,)).fetchone() is not None
+
+
+def _sumar_contadores(con: sqlite3.Connection, cambios: Dict[str, int]):
+    """Llamar dentro de la transacción que hizo el cambio"""
+    if not cambios or not _contadores_listos(con):
+        return
+    con.executemany(
+        "INSERT INTO contadores (clave, valor) VALUES (?, ?) "
+        "ON CONFLICT(clave) DO UPDATE SET valor = valor + excluded.valor",
+        list(cambios.items()),
+    )
+
+
+def _fijar_contadores(con: sqlite3.Connection, nombre: str, valores: Dict[str, int]):
+    if not _contadores_listos(con):
+        return
+    con.execute("DELETE FROM contadores WHERE clave = ? OR clave LIKE ?", (nombre, nombre + ".%"))
+    con.executemany("INSERT INTO contadores (clave, valor) VALUES (?, ?)", list(valores.items()))
+
+
+def leer_contadores() -> Dict[str, int]:
+    """Contadores de la plataforma; la primera vez se calculan con COUNT(*) sobre las tablas"""
+    con = conexion()
+    if not _contadores_listos(con):
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if not _contadores_listos(con):
+                valores = {}
+                for nombre in contadores.COLECCIONES:
+                    tabla = _tabla(nombre)
+                    if nombre == "solicitudes":
+                        for estado, n in con.execute(f"SELECT estado, COUNT(*) FROM {tabla} GROUP BY estado"):
+                            valores[contadores.clave_estado(estado)] = n
+                    else:
+                        (valores[nombre],) = con.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()
+                con.execute("DELETE FROM contadores")
+                con.executemany("INSERT INTO contadores (clave, valor) VALUES (?, ?)",
+                                list(valores.items()) + [(_INICIALIZADOS, 1)])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    return {clave: valor for clave, valor in con.execute("SELECT clave, valor FROM contadores")
+            if clave != _INICIALIZADOS}
+
+
+# ============================================
+# MIGRACIÓN DESDE data/*.json
+# ============================================
+
+def migrar_desde_json(data_dir: Path = config.DATA_DIR) -> Dict[str, int]:
+    """
+    Copia una sola vez los archivos data/<colección>.json a la base SQLite.
+    Devuelve {colección: registros migrados}. Los archivos JSON no se tocan.
+    Se leen en cualquier formato (ver servicios/serializacion.py) e incluyen
+    los cambios pendientes en su bitácora, si la tienen.
+
+    Si algún registro no tiene id numérico (p. ej. "sol-..." de versiones
+    anteriores) no se migra nada y se lanza RegistrosSinId con todos ellos.
+    """
+    from servicios.bitacora import Bitacora  # importa almacenamiento (evita ciclo)
+
+    colecciones, rechazados = {}, {}
+    for nombre in CAMPOS_INDEXADOS:
+        ruta = Path(data_dir) / f"{nombre}.json"
+        bitacora = Bitacora(ruta)
+        if not bitacora.existe():
+            continue
+        registros = bitacora.leer()
+        if not isinstance(registros, list):
+            registros = []
+        colecciones[nombre] = registros
+        sin_id = registros_sin_id(registros)
+        if sin_id:
+            rechazados[nombre] = sin_id
+    if rechazados:
+        raise RegistrosSinId(rechazados)
+
+    resultado = {}
+    for nombre, registros in colecciones.items():
+        reemplazar_coleccion(nombre, registros)
+        resultado[nombre] = len(registros)
+    return resultado
@@ -0,0 +1,329 @@
+# servicios/bitacora.py
+"""
+Bitácora de cambios (append-only) para colecciones JSON con muchas escrituras.
+
+En vez de reescribir todo el archivo por cada cambio de un campo, cada
+modificación se agrega como una línea JSONL en <archivo>.log:
+
+    {"op": "i", "r": {...registro completo...}}              # inserción
+    {"op": "p", "id": 7, "set": {"estado": "en_curso"}, "unset": []}  # parche
+
+Lectura: último snapshot (<archivo>.json) + reproducción de la bitácora.
+El estado reproducido se mantiene en memoria junto con el offset leído, así
+que una lectura sin cambios cuesta unos stat() y las nuevas líneas se aplican
+de forma incremental.
+
+Compactación: cuando la bitácora supera config.BITACORA_MAX_BYTES, un hilo en
+segundo plano la renombra a <archivo>.log.compactando, la funde con el
+snapshot y escribe un snapshot nuevo. Las operaciones son idempotentes
+(inserción = reemplazo, parche = asignación), así que volver a aplicar una
+bitácora ya fundida tras una caída no cambia el resultado.
+
+Las escrituras (append, renombrado, reemplazo) se hacen con el bloqueo entre
+procesos de la colección (servicios/concurrencia.py), y los parches verifican
+la versión de cada registro.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from servicios import config
+from servicios.concurrencia import bloqueo_archivo, verificar_y_subir_version
+from servicios import secuencias
+from servicios.almacenamiento import (
+    cache_documentos, _copiar_documento, _firma_archivo, escribir_documento_atomico
+)
+
+_FALTA = object()
+
+
+def _firma_o_none(ruta: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        return _firma_archivo(ruta)
+    except FileNotFoundError:
+        return None
+
+
+def _a_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+class Bitacora:
+    """Snapshot JSON + bitácora JSONL de parches por registro"""
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self.ruta_log = self.ruta + ".log"
+        self.ruta_compactando = self.ruta_log + ".compactando"
+
+        self._lock = threading.RLock()          # estado en memoria
+        self._compactando = threading.Lock()
+
+        self._clave = None      # (firma snapshot, firma compactando, inodo log)
+        self._offset = 0        # bytes de la bitácora ya aplicados
+        self._registros: List[Dict[str, Any]] = []
+        self._posiciones: Dict[Any, int] = {}
+
+        self.reconstrucciones = 0
+        self.lineas_aplicadas = 0
+        self.compactaciones = 0
+
+    # ---------------- Reproducción ----------------
+
+    def _aplicar(self, op: Dict[str, Any]):
+        if op.get("op") == "i":
+            r = dict(op["r"])
+            rid = _a_id(r.get("id"))
+            pos = self._posiciones.get(rid)
+            if pos is None:
+                self._posiciones[rid] = len(self._registros)
+                self._registros.append(r)
+            else:
+                self._registros[pos] = r
+        elif op.get("op") == "p":
+            pos = self._posiciones.get(_a_id(op.get("id")))
+            if pos is None:
+                return
+            r = self._registros[pos]
+            r.update(op.get("set") or {})
+            for campo in op.get("unset") or []:
+                r.pop(campo, None)
+        self.lineas_aplicadas += 1
+
+    def _aplicar_archivo(self, ruta: str, desde: int = 0) -> int:
+        """Aplica las líneas completas a partir de `desde`; devuelve el nuevo offset"""
+        try:
+            with open(ruta, "rb") as f:
+                f.seek(desde)
+                datos = f.read()
+        except FileNotFoundError:
+            return desde
+        fin = datos.rfind(b"\n")
+        if fin < 0:
+            return desde  # solo hay una línea incompleta (escritura en curso)
+        for linea in datos[:fin].split(b"\n"):
+            if not linea.strip():
+                continue
+            try:
+                self._aplicar(json.loads(linea))
+            except (ValueError, KeyError) as e:
+                print(f"⚠️ Línea inválida en {ruta}: {e}")
+        return desde + fin + 1
+
+    def _cargar_snapshot(self):
+        try:
+            base = cache_documentos.obtener(self.ruta)
+        except FileNotFoundError:
+            base = []
+        self._registros = _copiar_documento(base if isinstance(base, list) else [])
+        self._posiciones = {_a_id(r.get("id")): i for i, r in enumerate(self._registros)
+                            if isinstance(r, dict)}
+
+    def _reconstruir(self, firma_snap, firma_comp, firma_log):
+        self._cargar_snapshot()
+        if firma_comp is not None:
+            self._aplicar_archivo(self.ruta_compactando)
+        self._offset = self._aplicar_archivo(self.ruta_log) if firma_log else 0
+        self._clave = (firma_snap, firma_comp, firma_log[2] if firma_log else None)
+        self.reconstrucciones += 1
+
+    def _sincronizar(self):
+        """Pone el estado en memoria al día con los archivos (llamar con _lock)"""
+        firma_snap = _firma_o_none(self.ruta)
+        firma_comp = _firma_o_none(self.ruta_compactando)
+        firma_log = _firma_o_none(self.ruta_log)
+        inodo_log = firma_log[2] if firma_log else None
+
+        if (self._clave != (firma_snap, firma_comp, inodo_log)
+                or (firma_log and firma_log[1] < self._offset)):
+            self._reconstruir(firma_snap, firma_comp, firma_log)
+        elif firma_log and firma_log[1] > self._offset:
+            self._offset = self._aplicar_archivo(self.ruta_log, self._offset)
+
+    # ---------------- API ----------------
+
+    def existe(self) -> bool:
+        return any(os.path.exists(p) for p in (self.ruta, self.ruta_log, self.ruta_compactando))
+
+    def leer(self) -> List[Dict[str, Any]]:
+        """Registros actuales (copia). FileNotFoundError si la colección no existe."""
+        if not self.existe():
+            raise FileNotFoundError(self.ruta)
+        with self._lock:
+            self._sincronizar()
+            return _copiar_documento(self._registros)
+
+    def obtener(self, registro_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sincronizar()
+            pos = self._posiciones.get(_a_id(registro_id))
+            return dict(self._registros[pos]) if pos is not None else None
+
+    def buscar(self, predicado) -> List[Dict[str, Any]]:
+        """Copias de los registros que cumplen el predicado (sin copiar el resto)"""
+        if not self.existe():
+            return []
+        with self._lock:
+            self._sincronizar()
+            return [dict(r) for r in self._registros if predicado(r)]
+
+    def iterar(self, predicado) -> Iterator[Dict[str, Any]]:
+        """
+        Como buscar, pero entrega las copias de a una. El estado ya vive en
+        memoria; lo que se evita es armar la lista de resultados completa.
+        """
+        if not self.existe():
+            return
+        with self._lock:
+            self._sincronizar()
+            registros = list(self._registros)  # solo referencias
+        for r in registros:
+            if predicado(r):
+                yield dict(r)
+
+    def max_id(self) -> int:
+        """Mayor id actual (solo para inicializar la secuencia de ids)"""
+        with self._lock:
+            self._sincronizar()
+            return max((i for i in self._posiciones if isinstance(i, int)), default=0)
+
+    def _agregar_lineas(self, ops: List[Dict[str, Any]]):
+        if not ops:
+            return
+        contenido = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops)
+        with bloqueo_archivo(self.ruta):
+            os.makedirs(os.path.dirname(self.ruta_log), exist_ok=True)
+            with open(self.ruta_log, "a", encoding="utf-8") as f:
+                f.write(contenido)
+            tam = os.path.getsize(self.ruta_log)
+        if tam > config.BITACORA_MAX_BYTES:
+            self.compactar_en_segundo_plano()
+
+    def insertar(self, registro: Dict[str, Any]):
+        """Agrega el registro (si no trae id se le asigna el siguiente de la secuencia)"""
+        with bloqueo_archivo(self.ruta):
+            if registro.get("id") is None:
+                registro["id"] = secuencias.siguiente_id(self.ruta, self.max_id)
+            else:
+                secuencias.reservar_hasta(self.ruta, registro["id"], self.max_id)
+            registro.setdefault("version", 1)
+            self._agregar_lineas([{"op": "i", "r": registro}])
+
+    def insertar_varios(self, registros: List[Dict[str, Any]]):
+        """Como insertar, para un lote: un solo bloque de ids y un solo append"""
+        with bloqueo_archivo(self.ruta):
+            sin_id = [r for r in registros if r.get("id") is None]
+            for r in registros:
+                if r.get("id") is not None:
+                    secuencias.reservar_hasta(self.ruta, r["id"], self.max_id)
+            if sin_id:
+                primero = secuencias.reservar_bloque(self.ruta, len(sin_id), self.max_id)
+                for i, r in enumerate(sin_id):
+                    r["id"] = primero + i
+            for r in registros:
+                r.setdefault("version", 1)
+            self._agregar_lineas([{"op": "i", "r": r} for r in registros])
+
+    def actualizar(self, registros: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Agrega un parche por cada registro con los campos que cambiaron.
+        Devuelve los ids que no existen (no se escribe nada).
+        Lanza ConflictoVersion si algún registro cambió desde que se leyó.
+        """
+        ops, faltantes = [], []
+        with bloqueo_archivo(self.ruta), self._lock:
+            self._sincronizar()
+            for nuevo in registros:
+                rid = _a_id(nuevo.get("id"))
+                pos = self._posiciones.get(rid)
+                if pos is None:
+                    faltantes.append(rid)
+                    continue
+                actual = self._registros[pos]
+                if nuevo == actual:
+                    continue
+                verificar_y_subir_version(actual, nuevo)
+                cambios = {k: v for k, v in nuevo.items() if actual.get(k, _FALTA) != v}
+                quitar = [k for k in actual if k not in nuevo]
+                ops.append({"op": "p", "id": rid, "set": cambios, "unset": quitar})
+            if faltantes:
+                return faltantes
+            self._agregar_lineas(ops)
+        return []
+
+    def reemplazar(self, registros: List[Dict[str, Any]]):
+        """Escribe un snapshot completo nuevo y descarta la bitácora"""
+        with bloqueo_archivo(self.ruta):
+            escribir_documento_atomico(self.ruta, registros)
+            for p in (self.ruta_compactando, self.ruta_log):
+                if os.path.exists(p):
+                    os.unlink(p)
+
+    # ---------------- Compactación ----------------
+
+    def compactar(self) -> bool:
+        """Funde la bitácora en un snapshot nuevo. Devuelve True si compactó."""
+        if not self._compactando.acquire(blocking=False):
+            return False  # ya hay una compactación en marcha
+        try:
+            with bloqueo_archivo(self.ruta):
+                if not os.path.exists(self.ruta_compactando):
+                    if not os.path.exists(self.ruta_log):
+                        return False
+                    os.replace(self.ruta_log, self.ruta_compactando)
+                firma_snap = _firma_o_none(self.ruta)
+
+            # Fundir snapshot + bitácora renombrada (las nuevas escrituras van a .log)
+            fusion = Bitacora(self.ruta)
+            fusion._cargar_snapshot()
+            fusion._aplicar_archivo(self.ruta_compactando)
+            registros = fusion._registros
+
+            with bloqueo_archivo(self.ruta):
+                # Si alguien reemplazó la colección mientras tanto, su snapshot manda
+                if _firma_o_none(self.ruta) != firma_snap or not os.path.exists(self.ruta_compactando):
+                    return False
+                escribir_documento_atomico(self.ruta, registros)
+                os.unlink(self.ruta_compactando)
+            self.compactaciones += 1
+            return True
+        except Exception as e:
+            print(f"❌ Error compactando {self.ruta}: {e}")
+            return False
+        finally:
+            self._compactando.release()
+
+    def compactar_en_segundo_plano(self):
+        if self._compactando.locked():
+            return
+        threading.Thread(target=self.compactar, name=f"compactar-{os.path.basename(self.ruta)}",
+                         daemon=True).start()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "reconstrucciones": self.reconstrucciones,
+            "lineas_aplicadas": self.lineas_aplicadas,
+            "compactaciones": self.compactaciones,
+            "bytes_bitacora": os.path.getsize(self.ruta_log) if os.path.exists(self.ruta_log) else 0,
+        }
+
+
+_bitacoras: Dict[str, Bitacora] = {}
+_bitacoras_lock = threading.Lock()
+
+
+def bitacora_para(ruta) -> Bitacora:
+    clave = str(ruta)
+    with _bitacoras_lock:
+        if clave not in _bitacoras:
+            _bitacoras[clave] = Bitacora(clave)
+        return _bitacoras[clave]
+
+
+def estadisticas_bitacoras() -> Dict[str, Any]:
+    with _bitacoras_lock:
+        return {os.path.basename(r): b.estadisticas() for r, b in _bitacoras.items()}
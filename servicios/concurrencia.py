@@ -0,0 +1,176 @@
+# servicios/concurrencia.py
+"""
+Concurrencia entre varios procesos (workers de gunicorn) e hilos.
+
+1) BLOQUEO POR ARCHIVO: fcntl.flock sobre <archivo>.lock para que los ciclos
+   leer → modificar → escribir de una colección no se pisen entre procesos.
+   Es reentrante dentro del mismo hilo. Sin fcntl (Windows) solo se
+   sincronizan los hilos del proceso.
+
+2) VERSIÓN POR REGISTRO: cada registro lleva un campo "version". Al guardar,
+   la versión leída debe coincidir con la guardada; si otro proceso lo cambió
+   antes se lanza ConflictoVersion y la operación se reintenta desde la lectura
+   (decorador reintentar_si_conflicto).
+"""
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from typing import Any, Dict, Iterable, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ConflictoVersion(Exception):
+    """El registro cambió desde que se leyó (escritura concurrente)"""
+
+
+# ============================================
+# BLOQUEO ENTRE PROCESOS
+# ============================================
+
+class _BloqueoRuta:
+    """RLock entre hilos + flock entre procesos sobre un mismo archivo .lock"""
+
+    def __init__(self, ruta_lock: str):
+        self.ruta_lock = ruta_lock
+        self._rlock = threading.RLock()
+        self._profundidad = 0
+        self._fd = None
+        self._pid = None
+        self.dueno = None   # hilo que lo tiene tomado
+
+    def _descriptor(self) -> int:
+        # Tras un fork el descriptor heredado compartiría el flock con el padre
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta_lock) or ".", exist_ok=True)
+            self._fd = os.open(self.ruta_lock, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def adquirir(self):
+        self._rlock.acquire()
+        self._profundidad += 1
+        self.dueno = threading.get_ident()
+        if self._profundidad == 1 and fcntl is not None:
+            try:
+                fcntl.flock(self._descriptor(), fcntl.LOCK_EX)
+            except Exception:
+                self._profundidad -= 1
+                self._rlock.release()
+                raise
+
+    def liberar(self):
+        self._profundidad -= 1
+        if self._profundidad == 0:
+            self.dueno = None
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._rlock.release()
+
+
+_bloqueos: Dict[str, _BloqueoRuta] = {}
+_bloqueos_lock = threading.Lock()
+
+
+def _bloqueo_para(ruta) -> _BloqueoRuta:
+    clave = str(ruta) + ".lock"
+    with _bloqueos_lock:
+        if clave not in _bloqueos:
+            _bloqueos[clave] = _BloqueoRuta(clave)
+        return _bloqueos[clave]
+
+
+@contextmanager
+def bloqueo_archivo(ruta):
+    """Bloqueo exclusivo (entre procesos) de la colección guardada en `ruta`"""
+    b = _bloqueo_para(ruta)
+    b.adquirir()
+    try:
+        yield
+    finally:
+        b.liberar()
+
+
+def bloqueo_tomado(ruta) -> bool:
+    """True si el hilo actual tiene tomado el bloqueo de `ruta`"""
+    return _bloqueo_para(ruta).dueno == threading.get_ident()
+
+
+@contextmanager
+def bloqueo_colecciones(*rutas):
+    """Bloquea varias colecciones siempre en el mismo orden (evita interbloqueos)"""
+    with ExitStack() as pila:
+        for ruta in sorted({str(r) for r in rutas}):
+            pila.enter_context(bloqueo_archivo(ruta))
+        yield
+
+
+# ============================================
+# VERSIONES POR REGISTRO
+# ============================================
+
+def version_de(registro: Dict[str, Any]) -> int:
+    try:
+        return int(registro.get("version") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def verificar_y_subir_version(actual: Dict[str, Any], nuevo: Dict[str, Any]):
+    """
+    `nuevo` debe haberse leído con la misma versión que `actual` tiene en disco.
+    Si es así, le asigna la versión siguiente; si no, lanza ConflictoVersion.
+    """
+    if version_de(nuevo) != version_de(actual):
+        raise ConflictoVersion(
+            f"Registro #{nuevo.get('id')}: versión {version_de(nuevo)} leída, "
+            f"{version_de(actual)} guardada"
+        )
+    nuevo["version"] = version_de(actual) + 1
+
+
+def preparar_reemplazo(actuales: Iterable[Dict[str, Any]], nuevos: List[Dict[str, Any]]):
+    """
+    Para guardados de colección completa: ningún registro leído puede ser más
+    viejo que el guardado; los que cambiaron suben de versión. Un registro sin
+    campo "version" (armado a mano, no leído) sobrescribe al guardado.
+    """
+    por_id = {r.get("id"): r for r in actuales if isinstance(r, dict)}
+    for nuevo in nuevos:
+        if not isinstance(nuevo, dict):
+            continue
+        actual = por_id.get(nuevo.get("id"))
+        if actual is None:
+            nuevo.setdefault("version", 1)
+        elif "version" in nuevo and version_de(nuevo) < version_de(actual):
+            raise ConflictoVersion(
+                f"Registro #{nuevo.get('id')}: se intentó guardar una copia desactualizada"
+            )
+        elif nuevo != actual:
+            nuevo["version"] = version_de(actual) + 1
+
+
+def reintentar_si_conflicto(intentos: int = 5, valor_si_falla: Any = None):
+    """
+    Vuelve a ejecutar la función (que debe releer sus datos) cuando otra
+    escritura concurrente provoca un ConflictoVersion.
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            for intento in range(1, intentos + 1):
+                try:
+                    return func(*args, **kwargs)
+                except ConflictoVersion as e:
+                    print(f"🔁 {func.__name__}: conflicto de versión ({e}), intento {intento}/{intentos}")
+                    time.sleep(random.uniform(0, 0.005 * intento))
+            print(f"❌ {func.__name__}: no se pudo completar por escrituras concurrentes")
+            return valor_si_falla
+        return envoltura
+    return decorador
@@ -0,0 +1,74 @@
+# servicios/config.py
+"""
+Configuración de la capa de datos.
+Todo se puede cambiar con variables de entorno sin tocar el código.
+"""
+import os
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_DIR = BASE_DIR / "data"
+
+# Motor de almacenamiento: "json" (archivos en /data) o "sqlite"
+STORAGE_BACKEND = os.environ.get("TRANSPORT_STORAGE", "json").strip().lower()
+
+# Base de datos usada cuando STORAGE_BACKEND == "sqlite"
+SQLITE_PATH = Path(os.environ.get("TRANSPORT_SQLITE_PATH", str(DATA_DIR / "transport.db")))
+
+# Bitácora de cambios (JSONL append-only) para las colecciones JSON que más se
+# modifican; un cambio escribe solo el parche del registro, no todo el archivo.
+# Vacío ("") desactiva la bitácora.
+BITACORA_COLECCIONES = {
+    c.strip() for c in os.environ.get("TRANSPORT_BITACORA", "solicitudes,contraofertas").split(",") if c.strip()
+}
+
+# Tamaño de la bitácora a partir del cual se compacta en segundo plano
+BITACORA_MAX_BYTES = int(os.environ.get("TRANSPORT_BITACORA_MAX_BYTES", 256 * 1024))
+
+# Formato de los archivos de colección (ver servicios/serializacion.py):
+# json (compacto), json_legible (indent=2), orjson, msgpack o marshal.
+CODEC_POR_DEFECTO = os.environ.get("TRANSPORT_CODEC", "json").strip().lower()
+
+# Códec por colección, p. ej. TRANSPORT_CODECS="solicitudes=marshal,pasajeros=json_legible"
+CODECS_POR_COLECCION = {
+    nombre.strip(): codec.strip().lower()
+    for nombre, _, codec in (
+        par.partition("=") for par in os.environ.get("TRANSPORT_CODECS", "").split(",") if "=" in par
+    )
+}
+
+# Repositorio de solicitudes/contraofertas (ver servicios/repositorios.py):
+# "archivo" (capa de almacenamiento) o "memoria" (efímero, sin disco; para
+# benchmarks y pruebas de carga)
+REPOSITORIO = os.environ.get("TRANSPORT_REPOSITORIO", "archivo").strip().lower()
+
+# Archivo frío de viajes terminados (ver servicios/particiones.py): carpeta de
+# las particiones mensuales y días que un viaje terminado sigue en el archivo caliente
+ARCHIVO_DIR = Path(os.environ.get("TRANSPORT_ARCHIVO_DIR", str(DATA_DIR / "archivo")))
+ARCHIVO_DIAS_RETENCION = int(os.environ.get("TRANSPORT_ARCHIVO_DIAS", 7))
+
+# Escritura agrupada (ver servicios/escritura_agrupada.py): los cambios diferidos
+# de una colección se acumulan esta cantidad de milisegundos y se escriben en un
+# solo volcado. 0 desactiva la agrupación (se escribe en el momento).
+GRUPO_VENTANA_MS = float(os.environ.get("TRANSPORT_GRUPO_MS", 20))
+
+# Contraseñas (ver servicios/contrasenas.py): hilos que calculan hashes, pedidos
+# que pueden esperar turno (el resto recibe "intenta de nuevo"), espera máxima
+# en segundos y método/costo de los hashes nuevos. Los hashes guardados con otro
+# método se recalculan al iniciar sesión.
+HASH_TRABAJADORES = int(os.environ.get("TRANSPORT_HASH_HILOS", os.cpu_count() or 2))
+HASH_COLA_MAX = int(os.environ.get("TRANSPORT_HASH_COLA", 64))
+HASH_TIMEOUT = float(os.environ.get("TRANSPORT_HASH_TIMEOUT", 10))
+HASH_METODO = os.environ.get("TRANSPORT_HASH_METODO", "pbkdf2:sha256").strip()
+
+# Solicitudes programadas ("30_min", "60_min"; ver servicios/programador_solicitudes.py):
+# minutos antes de la hora de partida en que pasan a la cola que ven los conductores
+PROGRAMADAS_ANTICIPACION_MIN = float(os.environ.get("TRANSPORT_ANTICIPACION_MIN", 15))
+
+# Cola por zonas (ver servicios/zonas.py): lado en km de las celdas de la grilla
+# con que se reparte la cola de pendientes según el origen de cada solicitud
+ZONA_CELDA_KM = float(os.environ.get("TRANSPORT_ZONA_KM", 1))
+
+# Ubicación de conductores (ver servicios/ubicaciones_conductores.py): segundos sin
+# reportar posición tras los cuales un conductor deja de contar como cercano
+UBICACION_TTL_S = float(os.environ.get("TRANSPORT_UBICACION_TTL", 120))
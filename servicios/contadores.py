@@ -0,0 +1,155 @@
+# servicios/contadores.py
+"""
+Contadores de la plataforma mantenidos de forma incremental:
+
+    pasajeros                  total de pasajeros registrados
+    conductores                total de conductores
+    solicitudes.<estado>       viajes por estado (pendiente, en_curso, completado, ...)
+
+Antes cada render (inject_stats) leía los archivos de usuarios completos solo
+para contarlos. Ahora la capa de almacenamiento ajusta los contadores en la
+misma escritura que los cambia (registro, actualización de estado, reemplazo
+o vaciado de la colección), con el bloqueo de la colección tomado, y leerlos
+cuesta lo mismo con 10 o con 100 000 usuarios.
+
+Se guardan junto a los datos:
+  - JSON: data/contadores.json (caché de documentos: un stat() por lectura)
+  - SQLite: tabla `contadores`, en la misma transacción que el cambio
+
+Si todavía no existen (datos anteriores a este módulo, o el archivo se borró)
+se calculan una vez recorriendo las colecciones, con todas ellas bloqueadas.
+Mientras no existan, las escrituras no los tocan: el recuento inicial ya
+incluye su cambio.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from servicios.concurrencia import bloqueo_archivo, bloqueo_colecciones
+
+COLECCIONES = ("pasajeros", "conductores", "solicitudes")
+SIN_ESTADO = "sin_estado"
+
+
+def cuenta(nombre: str) -> bool:
+    """True si la colección `nombre` lleva contadores"""
+    return nombre in COLECCIONES
+
+
+def clave_estado(estado) -> str:
+    return f"solicitudes.{estado if estado is not None else SIN_ESTADO}"
+
+
+def _claves(nombre: str, registro: Optional[Dict[str, Any]]) -> List[str]:
+    if not isinstance(registro, dict):
+        return []
+    if nombre == "solicitudes":
+        return [clave_estado(registro.get("estado"))]
+    return [nombre]
+
+
+def deltas(nombre: str, pares: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> Dict[str, int]:
+    """Cambios de los contadores para pares (anterior, nuevo); anterior None = inserción"""
+    cambios: Dict[str, int] = {}
+    for anterior, nuevo in pares:
+        for clave in _claves(nombre, anterior):
+            cambios[clave] = cambios.get(clave, 0) - 1
+        for clave in _claves(nombre, nuevo):
+            cambios[clave] = cambios.get(clave, 0) + 1
+    return {k: v for k, v in cambios.items() if v}
+
+
+def conteos(nombre: str, registros: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Valores absolutos de los contadores de una colección completa"""
+    return deltas(nombre, ((None, r) for r in registros))
+
+
+def es_de(nombre: str, clave: str) -> bool:
+    return clave == nombre or clave.startswith(nombre + ".")
+
+
+# ============================================
+# JSON: data/contadores.json
+# ============================================
+
+def ruta_contadores(ruta_coleccion) -> Path:
+    return Path(ruta_coleccion).parent / "contadores.json"
+
+
+def _leer(ruta: Path) -> Optional[Dict[str, int]]:
+    from servicios.almacenamiento import leer_documento  # importa este módulo (evita ciclo)
+    try:
+        datos = leer_documento(ruta)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+def _escribir(ruta: Path, contadores: Dict[str, int]):
+    from servicios.almacenamiento import escribir_documento_atomico
+    escribir_documento_atomico(ruta, contadores)
+
+
+def sumar(ruta_coleccion, cambios: Dict[str, int]) -> None:
+    """Aplica `cambios` (llamar con la colección bloqueada, después de escribirla)"""
+    if not cambios:
+        return
+    ruta = ruta_contadores(ruta_coleccion)
+    with bloqueo_archivo(ruta):
+        actuales = _leer(ruta)
+        if actuales is None:
+            return
+        for clave, valor in cambios.items():
+            actuales[clave] = actuales.get(clave, 0) + valor
+        _escribir(ruta, actuales)
+
+
+def fijar(ruta_coleccion, nombre: str, valores: Dict[str, int]) -> None:
+    """Reemplaza los contadores de una colección reescrita completa (con la colección bloqueada)"""
+    ruta = ruta_contadores(ruta_coleccion)
+    with bloqueo_archivo(ruta):
+        actuales = _leer(ruta)
+        if actuales is None:
+            return
+        actuales = {k: v for k, v in actuales.items() if not es_de(nombre, k)}
+        actuales.update(valores)
+        _escribir(ruta, actuales)
+
+
+def _inicializar(ruta_coleccion) -> Dict[str, int]:
+    from servicios.almacenamiento import leer_coleccion
+
+    carpeta = Path(ruta_coleccion).parent
+    rutas = [carpeta / f"{nombre}.json" for nombre in COLECCIONES]
+    ruta = ruta_contadores(ruta_coleccion)
+    # Mismo orden que las escrituras (colección → contadores): nadie cambia datos a mitad del recuento
+    with bloqueo_colecciones(*rutas), bloqueo_archivo(ruta):
+        actuales = _leer(ruta)
+        if actuales is None:
+            actuales = {}
+            for nombre, ruta_col in zip(COLECCIONES, rutas):
+                try:
+                    actuales.update(conteos(nombre, leer_coleccion(ruta_col)))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+            _escribir(ruta, actuales)
+            print(f"🔢 Contadores inicializados en {ruta}")
+    return actuales
+
+
+def leer_contadores(ruta_coleccion) -> Dict[str, int]:
+    """
+    Contadores de la carpeta de datos de `ruta_coleccion` (o de SQLite si esa
+    colección vive allí). Los inicializa si todavía no existen.
+    """
+    from servicios.almacenamiento import usa_sqlite
+    from servicios import almacenamiento_sqlite
+    if usa_sqlite(ruta_coleccion):
+        return almacenamiento_sqlite.leer_contadores()
+    actuales = _leer(ruta_contadores(ruta_coleccion))
+    return actuales if actuales is not None else _inicializar(ruta_coleccion)
+
+
+def viajes_por_estado(contadores: Dict[str, int]) -> Dict[str, int]:
+    prefijo = "solicitudes."
+    return {k[len(prefijo):]: v for k, v in contadores.items() if k.startswith(prefijo) and v}
@@ -0,0 +1,182 @@
+# servicios/contrasenas.py
+"""
+Hash y verificación de contraseñas en un pool acotado de hilos.
+
+PBKDF2 con cientos de miles de iteraciones tarda decenas de milisegundos de
+CPU por contraseña. En un pico de logins, hacerlo dentro de cada request
+dejaba al servidor sin CPU para el resto de las rutas. Ahora:
+
+- El cálculo corre en config.HASH_TRABAJADORES hilos (hashlib libera el GIL
+  durante PBKDF2, así que los hilos sí trabajan en paralelo).
+- Como mucho config.HASH_COLA_MAX pedidos esperan turno; si la cola está
+  llena se lanza PoolSaturado y el request responde enseguida ("intenta de
+  nuevo") en vez de sumarse a la espera.
+- estadisticas_hash() expone la profundidad de la cola y los tiempos.
+
+Política de costo: config.HASH_METODO (p. ej. "pbkdf2:sha256:1000000") define
+cómo se generan los hashes nuevos. Al iniciar sesión con éxito, si el hash
+guardado usa otro método o cantidad de iteraciones, se recalcula con la
+política actual en segundo plano y se guarda (rehash transparente).
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from servicios import config
+
+SALT_LONGITUD = 16
+
+
+class PoolSaturado(Exception):
+    """La cola de hashing está llena: responder 503 / reintentar más tarde"""
+
+
+class PoolHash:
+    """ThreadPoolExecutor con admisión acotada y métricas de cola"""
+
+    def __init__(self, trabajadores: int, cola_max: int):
+        self.trabajadores = max(1, trabajadores)
+        self.cola_max = max(0, cola_max)
+        self._ejecutor = ThreadPoolExecutor(max_workers=self.trabajadores, thread_name_prefix="hash")
+        self._cupo = threading.BoundedSemaphore(self.trabajadores + self.cola_max)
+        self._lock = threading.Lock()
+
+        self.en_cola = 0
+        self.en_curso = 0
+        self.completados = 0
+        self.rechazados = 0
+        self.max_en_cola = 0
+        self._espera_total = 0.0
+        self._calculo_total = 0.0
+
+    def enviar(self, funcion: Callable[..., Any], *args) -> Future:
+        if not self._cupo.acquire(blocking=False):
+            with self._lock:
+                self.rechazados += 1
+            raise PoolSaturado("Demasiadas contraseñas en proceso")
+        encolado = time.perf_counter()
+        with self._lock:
+            self.en_cola += 1
+            self.max_en_cola = max(self.max_en_cola, self.en_cola)
+
+        def tarea():
+            inicio = time.perf_counter()
+            with self._lock:
+                self.en_cola -= 1
+                self.en_curso += 1
+                self._espera_total += inicio - encolado
+            try:
+                return funcion(*args)
+            finally:
+                with self._lock:
+                    self.en_curso -= 1
+                    self.completados += 1
+                    self._calculo_total += time.perf_counter() - inicio
+                self._cupo.release()
+
+        try:
+            return self._ejecutor.submit(tarea)
+        except Exception:
+            with self._lock:
+                self.en_cola -= 1
+            self._cupo.release()
+            raise
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            hechos = self.completados or 1
+            return {
+                "trabajadores": self.trabajadores,
+                "cola_max": self.cola_max,
+                "en_cola": self.en_cola,
+                "en_curso": self.en_curso,
+                "max_en_cola": self.max_en_cola,
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+                "espera_promedio_ms": round(self._espera_total / hechos * 1000, 2),
+                "calculo_promedio_ms": round(self._calculo_total / hechos * 1000, 2),
+            }
+
+
+_pool: Optional[PoolHash] = None
+_pool_lock = threading.Lock()
+
+
+def pool_hash() -> PoolHash:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolHash(config.HASH_TRABAJADORES, config.HASH_COLA_MAX)
+    return _pool
+
+
+# ============================================
+# POLÍTICA DE COSTO
+# ============================================
+
+def _normalizar_metodo(metodo: str) -> str:
+    """"pbkdf2:sha256" → "pbkdf2:sha256:<iteraciones por defecto>" (para comparar hashes)"""
+    partes = (metodo or "").split(":")
+    if partes[0] == "pbkdf2":
+        if len(partes) < 2:
+            partes.append("sha256")
+        if len(partes) < 3:
+            partes.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ":".join(partes)
+
+
+def metodo_actual() -> str:
+    return _normalizar_metodo(config.HASH_METODO)
+
+
+def necesita_rehash(pwd_hash: str) -> bool:
+    """True si `pwd_hash` no se generó con la política actual"""
+    metodo = (pwd_hash or "").split("$", 1)[0]
+    return _normalizar_metodo(metodo) != metodo_actual()
+
+
+# ============================================
+# API
+# ============================================
+
+def _generar(password: str) -> str:
+    return generate_password_hash(password, method=metodo_actual(), salt_length=SALT_LONGITUD)
+
+
+def generar_hash(password: str, timeout: Optional[float] = None) -> str:
+    """Hash con la política actual, calculado en el pool (PoolSaturado si está lleno)"""
+    return pool_hash().enviar(_generar, password).result(timeout=timeout or config.HASH_TIMEOUT)
+
+
+def verificar(pwd_hash: str, password: str, timeout: Optional[float] = None) -> bool:
+    """check_password_hash en el pool (PoolSaturado si está lleno)"""
+    return pool_hash().enviar(check_password_hash, pwd_hash, password).result(
+        timeout=timeout or config.HASH_TIMEOUT
+    )
+
+
+def rehash_en_segundo_plano(password: str, guardar: Callable[[str], Any]) -> Optional[Future]:
+    """
+    Recalcula el hash con la política actual y llama a guardar(nuevo_hash)
+    desde el pool. Si el pool está lleno se deja para el próximo login.
+    """
+    def tarea():
+        nuevo = _generar(password)
+        try:
+            guardar(nuevo)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el hash actualizado: {e}")
+        return nuevo
+
+    try:
+        return pool_hash().enviar(tarea)
+    except PoolSaturado:
+        return None
+
+
+def estadisticas_hash() -> Dict[str, Any]:
+    return {**pool_hash().estadisticas(), "metodo": metodo_actual()}
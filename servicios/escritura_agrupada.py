@@ -0,0 +1,275 @@
+# servicios/escritura_agrupada.py
+"""
+Escritura agrupada (group commit) por archivo de datos.
+
+En los picos, muchos cambios pequeños llegan al mismo archivo con pocos
+milisegundos de diferencia y cada uno pagaba una reescritura completa +
+rename. Con este búfer, los cambios diferidos de una colección se acumulan
+durante config.GRUPO_VENTANA_MS y se escriben juntos en un solo volcado
+(una reescritura atómica en JSON, un append en la bitácora o una transacción
+en SQLite).
+
+- Cada operación devuelve un concurrent.futures.Future que se resuelve cuando
+  su volcado terminó: quien necesite durabilidad (o enterarse de un
+  ConflictoVersion) hace .result(); quien no, sigue de largo. Los cambios de
+  estado de los viajes esperan así, y los que llegan juntos comparten volcado.
+  Si quien espera tiene tomado el bloqueo de la colección (bloquear(...)),
+  nadie más puede volcar: .result() vuelca ahí mismo en vez de esperar.
+- Parches consecutivos sobre el mismo id se fusionan (gana el último).
+- Las lecturas del mismo proceso ven lo pendiente superpuesto sobre lo que hay
+  en disco (sin forzar el volcado, si no no se agruparía nada) y las
+  escrituras normales vuelcan antes lo pendiente, así que el proceso siempre
+  ve sus propios cambios. Otros procesos los ven a lo sumo una ventana más tarde.
+- Lo superpuesto lleva la versión que el volcado va a escribir, así que un
+  registro leído así se puede volver a guardar (diferido o no) sin
+  ConflictoVersion. Un parche leído así que pisa a otro pendiente se vuelca
+  con la versión leída por el primero.
+"""
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from servicios import config
+from servicios.concurrencia import ConflictoVersion, bloqueo_archivo, bloqueo_tomado, version_de
+
+
+def _con_version(registro: Dict[str, Any], version: int) -> Dict[str, Any]:
+    copia = dict(registro)
+    if version != version_de(registro):
+        copia["version"] = version
+    return copia
+
+
+def _como_quedara(actual: Optional[Dict[str, Any]], nuevo: Dict[str, Any]) -> Dict[str, Any]:
+    """`nuevo` tal como lo guarda la escritura sobre `actual` (misma regla de versiones)"""
+    if actual is None:
+        return dict(nuevo, version=nuevo.get("version", 1))
+    if _sin_version(nuevo) == _sin_version(actual):
+        return dict(actual)  # sin cambios, o ya escrito por el volcado en curso
+    return dict(nuevo, version=version_de(actual) + 1)
+
+
+def _sin_version(registro: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in registro.items() if k != "version"}
+
+
+def _resolver(futuros: List[Future], resultado=None, error: Optional[BaseException] = None):
+    for f in futuros:
+        if f.done():
+            continue
+        if error is not None:
+            f.set_exception(error)
+        else:
+            f.set_result(resultado)
+
+
+class FuturoVolcado(Future):
+    """Future de una operación del búfer que no se queda esperando al propio hilo"""
+
+    def __init__(self, buffer: "BufferEscritura"):
+        super().__init__()
+        self._buffer = buffer
+
+    def _volcar_si_bloqueado(self):
+        # El temporizador necesita el bloqueo que este hilo no va a soltar mientras espera
+        if not self.done() and bloqueo_tomado(self._buffer.ruta):
+            self._buffer.volcar()
+
+    def result(self, timeout=None):
+        self._volcar_si_bloqueado()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        self._volcar_si_bloqueado()
+        return super().exception(timeout)
+
+
+class BufferEscritura:
+    """
+    Operaciones pendientes de un archivo, en orden de llegada:
+      ("parches", {id: (registro, [futuros], versión leída)})   → actualizar(*registros) -> bool
+      ("reemplazo", (registros, [futuros]))      → reemplazar(registros)
+    """
+
+    def __init__(self, ruta, reemplazar: Callable[[list], None],
+                 actualizar: Callable[..., bool], a_id: Callable[[Any], Any]):
+        self.ruta = str(ruta)
+        self._reemplazar = reemplazar
+        self._actualizar = actualizar
+        self._a_id = a_id
+        self._lock = threading.Lock()
+        self._ops: List[list] = []
+        self._en_curso: List[list] = []   # lo que se está volcando ahora
+        self._temporizador: Optional[threading.Timer] = None
+
+        self.volcados = 0
+        self.operaciones = 0
+
+    # ---------------- Encolar ----------------
+
+    def _programar(self):
+        """Arranca la ventana con la primera operación pendiente (llamar con _lock)"""
+        if self._temporizador is None:
+            t = threading.Timer(config.GRUPO_VENTANA_MS / 1000.0, self.volcar)
+            t.daemon = True
+            self._temporizador = t
+            t.start()
+
+    def actualizar(self, *registros: Dict[str, Any]) -> Future:
+        futuro = FuturoVolcado(self)
+        with self._lock:
+            if not self._ops or self._ops[-1][0] != "parches":
+                self._ops.append(["parches", {}])
+            parches = self._ops[-1][1]
+            for r in registros:
+                rid = self._a_id(r.get("id"))
+                anterior = parches.pop(rid, None)  # reinsertar = orden del último
+                leida = version_de(r)
+                if anterior is not None and leida == anterior[2] + 1:
+                    leida = anterior[2]  # leído de la superposición: la versión que el volcado va a escribir
+                parches[rid] = (r, (anterior[1] if anterior else []) + [futuro], leida)
+            if not registros:
+                futuro.set_result(True)
+            self.operaciones += 1
+            self._programar()
+        return futuro
+
+    def reemplazar(self, registros: List[Dict[str, Any]]) -> Future:
+        futuro = FuturoVolcado(self)
+        with self._lock:
+            if self._ops and self._ops[-1][0] == "reemplazo":
+                # El reemplazo anterior queda pisado por este: se resuelven juntos
+                self._ops[-1][1] = (registros, self._ops[-1][1][1] + [futuro])
+            else:
+                self._ops.append(["reemplazo", (registros, [futuro])])
+            self.operaciones += 1
+            self._programar()
+        return futuro
+
+    # ---------------- Volcar ----------------
+
+    def pendiente(self) -> bool:
+        return bool(self._ops) or bool(self._en_curso)
+
+    def superponer(self, registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """`registros` (leídos de disco) con las operaciones pendientes aplicadas encima"""
+        with self._lock:
+            ops = [(tipo, datos[0] if tipo == "reemplazo"
+                    else [_con_version(r, leida) for r, _, leida in datos.values()])
+                   for tipo, datos in self._en_curso + self._ops]
+        for tipo, nuevos in ops:
+            actuales = {self._a_id(r.get("id")): r for r in registros}
+            if tipo == "reemplazo":
+                registros = [_como_quedara(actuales.get(self._a_id(r.get("id"))), r) for r in nuevos]
+                continue
+            por_id = {self._a_id(r.get("id")): r for r in nuevos}
+            registros = [_como_quedara(r, por_id[rid]) if rid in por_id else dict(r)
+                         for rid, r in ((self._a_id(r.get("id")), r) for r in registros)]
+        return registros
+
+    def volcar(self):
+        """Escribe todo lo pendiente (también lo llama el temporizador)"""
+        # Mismo orden de bloqueos que cualquier escritura: archivo → búfer
+        with bloqueo_archivo(self.ruta):
+            with self._lock:
+                if self._temporizador is not None:
+                    self._temporizador.cancel()
+                    self._temporizador = None
+                ops, self._ops = self._ops, []
+                self._en_curso = ops
+            try:
+                for tipo, datos in ops:
+                    if tipo == "parches":
+                        self._volcar_parches(datos)
+                    else:
+                        self._volcar_reemplazo(*datos)
+                if ops:
+                    self.volcados += 1
+            finally:
+                with self._lock:
+                    self._en_curso = []
+
+    def _volcar_reemplazo(self, registros, futuros):
+        try:
+            self._reemplazar(registros)
+            _resolver(futuros, True)
+        except Exception as e:
+            print(f"❌ Escritura agrupada en {self.ruta}: {e}")
+            _resolver(futuros, error=e)
+
+    def _volcar_parches(self, parches: Dict[Any, tuple]):
+        registros = [r for r, _, _ in parches.values()]
+        # Se escriben copias: si el grupo falla a mitad, las versiones de los
+        # originales no quedan subidas para el reintento uno por uno
+        copias = [_con_version(r, leida) for r, _, leida in parches.values()]
+        try:
+            if self._actualizar(*copias):
+                for r, copia in zip(registros, copias):
+                    r.update(copia)
+                for _, futuros, _ in parches.values():
+                    _resolver(futuros, True)
+                return
+        except ConflictoVersion:
+            pass
+        except Exception as e:
+            print(f"❌ Escritura agrupada en {self.ruta}: {e}")
+            for _, futuros, _ in parches.values():
+                _resolver(futuros, error=e)
+            return
+
+        # Algún registro falló (conflicto o inexistente): se aplica uno por uno
+        # para que el resto del grupo no pague por él
+        for r, futuros, leida in parches.values():
+            copia = _con_version(r, leida)
+            try:
+                resultado = self._actualizar(copia)
+                if resultado:
+                    r.update(copia)
+                _resolver(futuros, resultado)
+            except Exception as e:
+                print(f"⚠️ Escritura agrupada en {self.ruta}, registro #{r.get('id')}: {e}")
+                _resolver(futuros, error=e)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {"operaciones": self.operaciones, "volcados": self.volcados}
+
+
+_buffers: Dict[str, BufferEscritura] = {}
+_buffers_lock = threading.Lock()
+
+
+def buffer_para(ruta, reemplazar, actualizar, a_id) -> BufferEscritura:
+    clave = str(ruta)
+    with _buffers_lock:
+        if clave not in _buffers:
+            _buffers[clave] = BufferEscritura(clave, reemplazar, actualizar, a_id)
+        return _buffers[clave]
+
+
+def buffer_pendiente(ruta) -> Optional[BufferEscritura]:
+    """El búfer de la colección si tiene algo sin escribir (o escribiéndose)"""
+    b = _buffers.get(str(ruta))
+    return b if b is not None and b.pendiente() else None
+
+
+def volcar_pendientes(ruta) -> None:
+    """Si la colección tiene cambios diferidos (o un volcado en curso), los escribe ya"""
+    b = _buffers.get(str(ruta))
+    if b is not None and b.pendiente():
+        b.volcar()
+
+
+def volcar_todo() -> None:
+    for b in list(_buffers.values()):
+        if b.pendiente():
+            b.volcar()
+
+
+def estadisticas_escritura_agrupada() -> Dict[str, Any]:
+    with _buffers_lock:
+        return {b.ruta.rsplit("/", 1)[-1]: b.estadisticas() for b in _buffers.values()}
+
+
+# Lo pendiente no se pierde al apagar el proceso de forma ordenada
+atexit.register(volcar_todo)
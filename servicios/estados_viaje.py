@@ -53,16 +53,14 @@ class GestorEstados:
         viaje['estado'] = nuevo_estado
         viaje['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Agregar al historial
-        if 'historial_estados' not in viaje:
-            viaje['historial_estados'] = []
-            
-        viaje['historial_estados'].append({
+        # Agregar al historial (lista nueva: el viaje puede venir de la caché
+        # de documentos, que solo copia el primer nivel de cada registro)
+        viaje['historial_estados'] = list(viaje.get('historial_estados', [])) + [{
             'estado': nuevo_estado,
             'fecha': viaje['fecha_actualizacion'],
             'usuario_id': usuario_id,
             'motivo': motivo
-        })
+        }]
         
         return True
 
@@ -0,0 +1,96 @@
+# servicios/geo.py
+"""
+Distancias entre coordenadas (Haversine + factor de corrección por carretera).
+
+Un solo núcleo por lotes para toda la app:
+
+    distancias_desde(lat, lng, lats, lngs)     uno contra muchos  -> [km, ...]
+    matriz_distancias(lats1, lngs1, lats2, lngs2)  muchos contra muchos -> [[km, ...], ...]
+    distancia(lat1, lng1, lat2, lng2)          un par (lote de uno)
+
+Con NumPy instalado los lotes de UMBRAL_NUMPY pares o más se calculan
+vectorizados; los chicos (y todos, sin NumPy) en Python puro con la misma
+fórmula, precalculando lo que depende solo del punto de partida. Los
+resultados son km por carretera redondeados a 2 decimales, como antes.
+"""
+import math
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RADIO_TIERRA_KM = 6371
+
+# En ciudades como Lima, las calles no son rectas, hay curvas, desvíos, etc.
+# Estudios indican que la distancia real es ~1.3 a 1.5 veces la distancia aérea
+FACTOR_CORRECCION_CARRETERA = 1.4  # 40% más que línea recta
+
+# Por debajo de este tamaño armar arreglos cuesta más que el cálculo
+UMBRAL_NUMPY = 32
+
+
+def _desde_python(lat, lng, lats, lngs, factor) -> List[float]:
+    lat1 = math.radians(lat)
+    lng1 = math.radians(lng)
+    cos1 = math.cos(lat1)
+    escala = 2 * RADIO_TIERRA_KM * factor
+    resultado = []
+    for lat2, lng2 in zip(lats, lngs):
+        lat2 = math.radians(lat2)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + cos1 * math.cos(lat2) * math.sin((math.radians(lng2) - lng1) / 2) ** 2)
+        resultado.append(round(escala * math.atan2(math.sqrt(a), math.sqrt(1 - a)), 2))
+    return resultado
+
+
+def _haversine_numpy(lat1, lng1, lat2, lng2, factor):
+    """Arreglos en grados (se combinan por broadcasting) -> km redondeados"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return np.round(2 * RADIO_TIERRA_KM * factor * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), 2)
+
+
+def distancias_desde(lat: float, lng: float, lats: Sequence[float], lngs: Sequence[float],
+                     factor: float = FACTOR_CORRECCION_CARRETERA) -> List[float]:
+    """Distancia (km por carretera) desde un punto a cada uno de los puntos dados"""
+    if np is not None and len(lats) >= UMBRAL_NUMPY:
+        return _haversine_numpy(lat, lng, lats, lngs, factor).tolist()
+    return _desde_python(lat, lng, lats, lngs, factor)
+
+
+def matriz_distancias(lats1: Sequence[float], lngs1: Sequence[float],
+                      lats2: Sequence[float], lngs2: Sequence[float],
+                      factor: float = FACTOR_CORRECCION_CARRETERA) -> List[List[float]]:
+    """Fila i = distancias desde el punto i del primer grupo a todos los del segundo"""
+    if np is not None and len(lats1) * len(lats2) >= UMBRAL_NUMPY:
+        lats1 = np.asarray(lats1, dtype=float)[:, None]   # columnas: una fila por punto de origen
+        lngs1 = np.asarray(lngs1, dtype=float)[:, None]
+        return _haversine_numpy(lats1, lngs1, lats2, lngs2, factor).tolist()
+    return [_desde_python(lat, lng, lats2, lngs2, factor) for lat, lng in zip(lats1, lngs1)]
+
+
+def distancia(lat1: float, lng1: float, lat2: float, lng2: float,
+              factor: float = FACTOR_CORRECCION_CARRETERA) -> float:
+    """Distancia (km por carretera) entre dos coordenadas"""
+    return distancias_desde(lat1, lng1, (lat2,), (lng2,), factor)[0]
+
+
+# ---------------- Coordenadas para índices espaciales ----------------
+# En 3D (sobre una esfera de RADIO_TIERRA_KM) la distancia en línea recta entre
+# dos puntos, la cuerda, crece con la distancia sobre la superficie: los más
+# cercanos por cuerda son los más cercanos por Haversine (ver estructuras/arbol_kd.py).
+
+def cartesianas(lat: float, lng: float) -> tuple:
+    """(x, y, z) en km del punto sobre la esfera terrestre"""
+    lat = math.radians(lat)
+    lng = math.radians(lng)
+    return (RADIO_TIERRA_KM * math.cos(lat) * math.cos(lng),
+            RADIO_TIERRA_KM * math.cos(lat) * math.sin(lng),
+            RADIO_TIERRA_KM * math.sin(lat))
+
+
+def cuerda_km(distancia_aerea_km: float) -> float:
+    """Cuerda (km en línea recta por dentro de la esfera) para una distancia sobre la superficie"""
+    return 2 * RADIO_TIERRA_KM * math.sin(min(distancia_aerea_km / (2 * RADIO_TIERRA_KM), math.pi / 2))
@@ -2,60 +2,80 @@
 """
 Servicio de historial de viajes usando ListaEnlazada
 Solo muestra viajes COMPLETADOS sin datos personales sensibles
+
+Los viajes antiguos están en las particiones mensuales (servicios/particiones.py);
+se leen solo los meses en los que el usuario tiene viajes, y después los recientes.
+Ambos se recorren como generadores (registro por registro), así que la memoria
+depende de los viajes del usuario y no del tamaño de los archivos.
 """
 
+from itertools import chain
+from typing import Optional
+
 from estructuras.lista_enlazada import ListaEnlazada
-from servicios.solicitudes_mejoradas import _leer_json, SOLICITUDES_FILE
+from servicios.particiones import iterar_archivadas
+from servicios.repositorios import Repositorio
+from servicios.solicitudes_mejoradas import repositorio_solicitudes
 
 
-def obtener_historial_pasajero(pasajero_id: int) -> ListaEnlazada:
+def obtener_historial_pasajero(pasajero_id: int, repo: Optional[Repositorio] = None) -> ListaEnlazada:
     """
     Obtiene el historial de viajes completados de un pasajero.
     Solo incluye: origen, destino, fecha y precio (sin datos personales).
     
+    `repo`: repositorio de solicitudes (por defecto el activo en solicitudes_mejoradas).
     Retorna una ListaEnlazada con los viajes.
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
+    repo = repo or repositorio_solicitudes()
     historial = ListaEnlazada()
     
-    for s in solicitudes:
-        if s.get('pasajero_id') == pasajero_id and s.get('estado') == 'completado':
-            viaje_seguro = {
-                'id': s.get('id'),
-                'origen': s.get('origen', {}).get('nombre', 'Desconocido'),
-                'destino': s.get('destino', {}).get('nombre', 'Desconocido'),
-                'fecha': s.get('fecha_fin') or s.get('fecha_creacion', ''),
-                'precio': s.get('precio_acordado') or s.get('precio_estandar', 0),
-                'distancia': s.get('distancia', 0),
-                'duracion_minutos': s.get('duracion_minutos', 0)
-            }
-            historial.insertar_final(viaje_seguro)
+    vistos = set()
+    recientes = repo.iterar(pasajero_id=pasajero_id, estado='completado')
+    for s in chain(iterar_archivadas('pasajero', pasajero_id, 'completado'), recientes):
+        if s.get('id') in vistos:
+            continue  # archivado a medias: está en ambos lados
+        vistos.add(s.get('id'))
+        viaje_seguro = {
+            'id': s.get('id'),
+            'origen': s.get('origen', {}).get('nombre', 'Desconocido'),
+            'destino': s.get('destino', {}).get('nombre', 'Desconocido'),
+            'fecha': s.get('fecha_fin') or s.get('fecha_creacion', ''),
+            'precio': s.get('precio_acordado') or s.get('precio_estandar', 0),
+            'distancia': s.get('distancia', 0),
+            'duracion_minutos': s.get('duracion_minutos', 0)
+        }
+        historial.insertar_final(viaje_seguro)
     
     return historial
 
 
-def obtener_historial_conductor(conductor_id: int) -> ListaEnlazada:
+def obtener_historial_conductor(conductor_id: int, repo: Optional[Repositorio] = None) -> ListaEnlazada:
     """
     Obtiene el historial de viajes completados de un conductor.
     Solo incluye: origen, destino, fecha y precio (sin datos personales).
     
+    `repo`: repositorio de solicitudes (por defecto el activo en solicitudes_mejoradas).
     Retorna una ListaEnlazada con los viajes.
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
+    repo = repo or repositorio_solicitudes()
     historial = ListaEnlazada()
     
-    for s in solicitudes:
-        if s.get('conductor_id') == conductor_id and s.get('estado') == 'completado':
-            viaje_seguro = {
-                'id': s.get('id'),
-                'origen': s.get('origen', {}).get('nombre', 'Desconocido'),
-                'destino': s.get('destino', {}).get('nombre', 'Desconocido'),
-                'fecha': s.get('fecha_fin') or s.get('fecha_creacion', ''),
-                'precio': s.get('precio_acordado') or s.get('precio_estandar', 0),
-                'distancia': s.get('distancia', 0),
-                'duracion_minutos': s.get('duracion_minutos', 0)
-            }
-            historial.insertar_final(viaje_seguro)
+    vistos = set()
+    recientes = repo.iterar(conductor_id=conductor_id, estado='completado')
+    for s in chain(iterar_archivadas('conductor', conductor_id, 'completado'), recientes):
+        if s.get('id') in vistos:
+            continue  # archivado a medias: está en ambos lados
+        vistos.add(s.get('id'))
+        viaje_seguro = {
+            'id': s.get('id'),
+            'origen': s.get('origen', {}).get('nombre', 'Desconocido'),
+            'destino': s.get('destino', {}).get('nombre', 'Desconocido'),
+            'fecha': s.get('fecha_fin') or s.get('fecha_creacion', ''),
+            'precio': s.get('precio_acordado') or s.get('precio_estandar', 0),
+            'distancia': s.get('distancia', 0),
+            'duracion_minutos': s.get('duracion_minutos', 0)
+        }
+        historial.insertar_final(viaje_seguro)
     
     return historial
 
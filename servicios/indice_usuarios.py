@@ -0,0 +1,167 @@
+# servicios/indice_usuarios.py
+"""
+Índices hash en memoria de pasajeros y conductores (modo JSON):
+
+    id                → usuario
+    correo normalizado → usuario
+    placa en mayúsculas → conductor
+
+Login, registro y las búsquedas por id dejan de recorrer la colección: cada
+consulta es un stat() del archivo + una búsqueda en un dict.
+
+El índice se construye una vez y recuerda la firma del archivo con la que
+está al día. Las escrituras de este proceso (set_usuarios, actualizar_usuario,
+crear_usuario) lo actualizan en el lugar con el bloqueo de la colección tomado,
+así que no hace falta reconstruirlo; si otro proceso cambia el archivo, la
+firma ya no coincide y se reconstruye en la siguiente consulta.
+
+En SQLite no se usa: correo y placa ya son columnas indexadas.
+"""
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from servicios.almacenamiento import (
+    _a_id, _firma_archivo, leer_coleccion, usa_bitacora, usa_sqlite
+)
+from servicios.almacenamiento_sqlite import normalizar_campo
+from servicios.concurrencia import bloqueo_archivo
+
+
+class IndiceUsuarios:
+    """Índices por id, correo y placa de una colección de usuarios"""
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self._lock = threading.RLock()
+        self._firma = None
+        self._construido = False
+        self._por_id: Dict[Any, Dict[str, Any]] = {}
+        self._por_correo: Dict[str, Dict[str, Any]] = {}
+        self._por_placa: Dict[str, Dict[str, Any]] = {}
+
+        self.reconstrucciones = 0
+        self.actualizaciones = 0
+
+    def _firma_actual(self):
+        try:
+            return _firma_archivo(self.ruta)
+        except FileNotFoundError:
+            return None
+
+    # ---------------- Mantenimiento ----------------
+
+    def _agregar(self, u: Dict[str, Any]):
+        self._por_id[_a_id(u.get("id"))] = u
+        correo = normalizar_campo("correo", u.get("correo"))
+        if correo:
+            self._por_correo.setdefault(correo, u)  # con duplicados gana el primero, como buscar_registros
+        placa = normalizar_campo("placa", u.get("placa"))
+        if placa:
+            self._por_placa.setdefault(placa, u)
+
+    def _quitar(self, u: Dict[str, Any]):
+        self._por_id.pop(_a_id(u.get("id")), None)
+        for indice, campo in ((self._por_correo, "correo"), (self._por_placa, "placa")):
+            clave = normalizar_campo(campo, u.get(campo))
+            if clave and indice.get(clave) is u:
+                del indice[clave]
+
+    def _construir(self, usuarios: List[Dict[str, Any]], firma):
+        self._por_id, self._por_correo, self._por_placa = {}, {}, {}
+        for u in usuarios:
+            if isinstance(u, dict):
+                self._agregar(dict(u))
+        self._firma = firma
+        self._construido = True
+        self.reconstrucciones += 1
+
+    def sincronizar(self):
+        """Reconstruye el índice si el archivo cambió desde la última vez"""
+        with self._lock:
+            firma = self._firma_actual()
+            if self._construido and firma == self._firma:
+                return
+            try:
+                usuarios = leer_coleccion(self.ruta)
+            except (FileNotFoundError, json.JSONDecodeError):
+                usuarios = []
+            # Si el archivo cambió mientras se leía, la firma vieja obliga a releer luego
+            self._construir(usuarios, firma)
+
+    @contextmanager
+    def escritura(self):
+        """
+        Bloqueo de la colección con el índice al día. Dentro, escribir y luego
+        llamar a aplicar()/reemplazar() con lo escrito.
+        """
+        with bloqueo_archivo(self.ruta):
+            self.sincronizar()
+            yield self
+
+    def aplicar(self, *usuarios: Dict[str, Any]):
+        """Refleja usuarios recién insertados/actualizados (llamar dentro de escritura())"""
+        with self._lock:
+            for u in usuarios:
+                anterior = self._por_id.get(_a_id(u.get("id")))
+                if anterior is not None:
+                    self._quitar(anterior)
+                self._agregar(dict(u))
+            self._firma = self._firma_actual()
+            self.actualizaciones += 1
+
+    def reemplazar(self, usuarios: List[Dict[str, Any]]):
+        """Refleja una colección reescrita completa (llamar dentro de escritura())"""
+        with self._lock:
+            self._construir(usuarios, self._firma_actual())
+
+    # ---------------- Consultas ----------------
+
+    def _copia(self, u: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        return dict(u) if u is not None else None
+
+    def por_id(self, user_id) -> Optional[Dict[str, Any]]:
+        self.sincronizar()
+        return self._copia(self._por_id.get(_a_id(user_id)))
+
+    def por_ids(self, ids) -> Dict[Any, Dict[str, Any]]:
+        """{id: usuario} de los ids que existen (una sola sincronización)"""
+        self.sincronizar()
+        por_id = self._por_id
+        return {rid: dict(por_id[rid]) for rid in ids if rid in por_id}
+
+    def por_correo(self, correo) -> Optional[Dict[str, Any]]:
+        self.sincronizar()
+        return self._copia(self._por_correo.get(normalizar_campo("correo", correo)))
+
+    def por_placa(self, placa) -> Optional[Dict[str, Any]]:
+        self.sincronizar()
+        return self._copia(self._por_placa.get(normalizar_campo("placa", placa)))
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "usuarios": len(self._por_id),
+            "reconstrucciones": self.reconstrucciones,
+            "actualizaciones": self.actualizaciones,
+        }
+
+
+_indices: Dict[str, IndiceUsuarios] = {}
+_indices_lock = threading.Lock()
+
+
+def indice_para(ruta) -> Optional[IndiceUsuarios]:
+    """Índice de la colección en `ruta`, o None si el backend ya indexa (SQLite) o usa bitácora"""
+    if usa_sqlite(ruta) or usa_bitacora(ruta):
+        return None
+    clave = str(ruta)
+    with _indices_lock:
+        if clave not in _indices:
+            _indices[clave] = IndiceUsuarios(clave)
+        return _indices[clave]
+
+
+def estadisticas_indices() -> Dict[str, Any]:
+    with _indices_lock:
+        return {i.ruta.rsplit("/", 1)[-1]: i.estadisticas() for i in _indices.values()}
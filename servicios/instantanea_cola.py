@@ -0,0 +1,93 @@
+# servicios/instantanea_cola.py
+"""
+Instantánea del orden de la cola de solicitudes pendientes.
+
+    data/cola_solicitudes.json   {"orden": [ids en orden FIFO], "cursor": n}
+
+Antes, cada vez que la cola en memoria quedaba vacía (horas tranquilas, o
+justo después de reiniciar) se releía la colección completa de solicitudes
+y se ordenaba por fecha, una vez por cada sondeo de conductor. Ahora:
+
+- Cada alta o baja de la cola se refleja aquí, con el bloqueo del archivo
+  tomado, y `cursor` avanza en uno.
+- Al arrancar, la cola se restaura con los ids de `orden` (solo se buscan las
+  solicitudes pendientes, sin recorrer ni ordenar el resto).
+- Una cola vacía es un estado válido: mientras el cursor no cambie no hay
+  nada que recargar. Si otro proceso cambió la cola, el cursor ya no es el que
+  este proceso conoce y se recarga la próxima vez que se consulte.
+
+Leer el cursor cuesta un stat() (caché de documentos). Si el archivo no
+existe o está dañado, se reconstruye desde la colección como antes.
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from servicios.almacenamiento import escribir_documento_atomico, leer_documento
+from servicios.concurrencia import bloqueo_archivo
+
+
+def cursor_inicial() -> int:
+    """
+    Cursor de un archivo recién creado: parte de la hora en ms y no de 0, así
+    un archivo borrado y recreado no repite un cursor que otro proceso ya vio.
+    """
+    return int(time.time() * 1000)
+
+
+def ruta_instantanea(ruta_coleccion) -> Path:
+    ruta = Path(ruta_coleccion)
+    return ruta.with_name(f"cola_{ruta.stem}.json")
+
+
+class InstantaneaCola:
+    """Orden FIFO + cursor de la cola de la colección en `ruta_coleccion`"""
+
+    def __init__(self, ruta_coleccion):
+        self.ruta = str(ruta_instantanea(ruta_coleccion))
+
+    def leer(self) -> Optional[Tuple[List[Any], int]]:
+        """(orden, cursor), o None si todavía no hay instantánea válida"""
+        try:
+            datos = leer_documento(self.ruta)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(datos, dict) or not isinstance(datos.get("orden"), list):
+            return None
+        try:
+            return datos["orden"], int(datos.get("cursor") or 0)
+        except (TypeError, ValueError):
+            return None
+
+    def _escribir(self, orden: List[Any], cursor: int):
+        escribir_documento_atomico(self.ruta, {"orden": orden, "cursor": cursor})
+
+    def guardar(self, orden: Iterable[Any]) -> int:
+        """Reemplaza el orden completo (reconstrucción). Devuelve el cursor nuevo."""
+        with bloqueo_archivo(self.ruta):
+            actual = self.leer()
+            cursor = actual[1] + 1 if actual else cursor_inicial()
+            self._escribir(list(orden), cursor)
+            return cursor
+
+    def aplicar(self, encolados: Iterable[Any] = (), removidos: Iterable[Any] = ()) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Agrega ids al final y quita otros. Devuelve (cursor anterior, cursor
+        nuevo); (None, None) si no hay instantánea (la próxima consulta la crea).
+        Si no cambia nada no se escribe y el cursor queda igual.
+        """
+        quitar = {str(i) for i in removidos}
+        with bloqueo_archivo(self.ruta):
+            actual = self.leer()
+            if actual is None:
+                return None, None
+            orden, cursor = actual
+            presentes = {str(i) for i in orden}
+            nuevos = [i for i in encolados if str(i) not in presentes and str(i) not in quitar]
+            if not nuevos and not (quitar & presentes):
+                return cursor, cursor
+            if quitar:
+                orden = [i for i in orden if str(i) not in quitar]
+            self._escribir(orden + nuevos, cursor + 1)
+            return cursor, cursor + 1
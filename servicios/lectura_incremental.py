@@ -0,0 +1,125 @@
+# servicios/lectura_incremental.py
+"""
+Lectura incremental de archivos de colección: un generador que entrega los
+registros de a uno, sin cargar ni parsear el archivo completo.
+
+    [ {...}, {...}, ... ]     arreglo JSON (json / json_legible / orjson):
+                              se recorre sobre un mmap del archivo y se decodifica
+                              un registro por vez con JSONDecoder.raw_decode
+    {...}\\n{...}\\n            JSONL (un registro por línea)
+    msgpack                   Unpacker sobre el archivo, elemento por elemento
+    marshal                   no admite lectura parcial: se carga entero
+
+La memoria usada depende del tamaño de un registro (más un bloque de lectura),
+no del tamaño del archivo, así que sirve para el historial y los reportes
+aunque el archivo de viajes siga creciendo.
+"""
+import codecs
+import json
+import mmap
+from typing import Any, Dict, Iterator
+
+from servicios.serializacion import CABECERAS, decodificar, detectar_codec, msgpack
+
+BLOQUE = 64 * 1024
+_ESPACIOS = " \t\r\n"
+_decodificador = json.JSONDecoder()
+
+
+def _iterar_arreglo(datos, inicio: int) -> Iterator[Any]:
+    """Elementos del arreglo JSON que empieza en datos[inicio] ('[')"""
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    total = len(datos)
+    leido = inicio + 1
+    buf, pos = "", 0
+
+    def cargar() -> bool:
+        nonlocal buf, pos, leido
+        if leido >= total:
+            return False
+        fin = min(leido + BLOQUE, total)
+        buf = buf[pos:] + utf8.decode(datos[leido:fin], final=fin == total)
+        pos, leido = 0, fin
+        return True
+
+    while True:
+        # Separadores entre elementos
+        while True:
+            while pos < len(buf) and (buf[pos] in _ESPACIOS or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) or not cargar():
+                break
+        if pos >= len(buf):
+            raise json.JSONDecodeError("Arreglo sin cerrar", buf, pos)
+        if buf[pos] == "]":
+            return
+        try:
+            elemento, fin = _decodificador.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Registro partido entre dos bloques: se lee más y se reintenta
+            if cargar():
+                continue
+            raise
+        if fin >= len(buf) and leido < total:
+            cargar()  # un número/literal podría seguir en el próximo bloque
+            continue
+        pos = fin
+        yield elemento
+
+
+def _iterar_lineas(datos, inicio: int) -> Iterator[Any]:
+    total = len(datos)
+    while inicio < total:
+        fin = datos.find(b"\n", inicio)
+        if fin < 0:
+            fin = total
+        linea = datos[inicio:fin]
+        inicio = fin + 1
+        if linea.strip():
+            yield json.loads(linea)
+
+
+def iterar_archivo(ruta) -> Iterator[Dict[str, Any]]:
+    """
+    Registros del archivo de colección en `ruta`, de a uno.
+    Propaga FileNotFoundError / json.JSONDecodeError como leer_archivo.
+    """
+    with open(ruta, "rb") as f:
+        try:
+            datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # archivo vacío (no se puede mapear): equivale a []
+        try:
+            cabecera = datos[:max(len(c) for c in CABECERAS.values())]
+            codec = detectar_codec(cabecera)
+
+            if codec == "msgpack" and msgpack is not None:
+                datos.seek(len(CABECERAS["msgpack"]))
+                lector = msgpack.Unpacker(datos, raw=False, strict_map_key=False)
+                try:
+                    for _ in range(lector.read_array_header()):
+                        yield lector.unpack()
+                except (ValueError, msgpack.OutOfData) as e:
+                    raise json.JSONDecodeError(f"Archivo msgpack inválido: {e}", "", 0) from e
+                return
+            if codec != "json":
+                contenido = decodificar(datos[:])
+                yield from (contenido if isinstance(contenido, list) else [])
+                return
+
+            inicio = 0
+            while inicio < len(datos) and datos[inicio:inicio + 1] in (b" ", b"\t", b"\r", b"\n"):
+                inicio += 1
+            if inicio >= len(datos):
+                return
+            if datos[inicio:inicio + 3] == b"\xef\xbb\xbf":
+                inicio += 3
+            primero = datos[inicio:inicio + 1]
+            if primero == b"[":
+                yield from _iterar_arreglo(datos, inicio)
+            elif primero == b"{":
+                yield from _iterar_lineas(datos, inicio)
+            else:
+                raise json.JSONDecodeError("Se esperaba un arreglo JSON o JSONL", "", inicio)
+        finally:
+            datos.close()
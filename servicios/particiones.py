@@ -0,0 +1,237 @@
+# servicios/particiones.py
+"""
+Archivo de viajes terminados en particiones mensuales (datos "fríos").
+
+Las solicitudes en estado terminal (completado, cancelado_pasajero,
+cancelado_conductor) cerradas hace más de config.ARCHIVO_DIAS_RETENCION días
+salen del archivo "caliente" (solicitudes.json) junto con sus contraofertas y
+pasan a:
+
+    data/archivo/solicitudes-AAAA-MM.json
+    data/archivo/contraofertas-AAAA-MM.json
+    data/archivo/indice.json   {"AAAA-MM": {"pasajero": [ids], "conductor": [ids]}}
+    data/archivo/conteos.json  {"AAAA-MM": {estado: cantidad}}
+
+Así los sondeos de pasajeros y conductores solo recorren viajes vivos. El
+historial usa el índice para abrir únicamente los meses en los que el usuario
+tiene viajes, y los lee bajo demanda (generador).
+
+Archivar no es borrar: los contadores de la plataforma (servicios/contadores.py)
+solo cuentan el archivo caliente, y conteos.json guarda los viajes por estado
+de cada partición, recalculados cada vez que se reescribe. Las estadísticas
+suman ambos (viajes_archivados_por_estado).
+
+Orden de escritura: particiones → índice → archivo caliente. Si el proceso se
+corta a mitad, el registro queda en ambos lados y volver a archivar lo funde
+por id sin duplicarlo.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from servicios import config
+from servicios.almacenamiento import leer_documento, escribir_documento_atomico, _a_id
+from servicios.concurrencia import bloqueo_archivo
+from servicios.contadores import conteos, viajes_por_estado
+from servicios.lectura_incremental import iterar_archivo
+from servicios.repositorios import Repositorio, bloquear
+
+ESTADOS_TERMINALES = ("completado", "cancelado_pasajero", "cancelado_conductor")
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+# ============================================
+# RUTAS Y FECHAS
+# ============================================
+
+def ruta_particion(coleccion: str, mes: str) -> Path:
+    return Path(config.ARCHIVO_DIR) / f"{coleccion}-{mes}.json"
+
+
+def ruta_indice() -> Path:
+    return Path(config.ARCHIVO_DIR) / "indice.json"
+
+
+def ruta_conteos() -> Path:
+    return Path(config.ARCHIVO_DIR) / "conteos.json"
+
+
+def fecha_cierre(solicitud: Dict[str, Any]) -> Optional[datetime]:
+    """Cuándo terminó el viaje (o la fecha más reciente que tenga)"""
+    for campo in ("fecha_fin", "fecha_cancelacion", "fecha_actualizacion", "fecha_creacion"):
+        valor = solicitud.get(campo)
+        if valor:
+            try:
+                return datetime.strptime(str(valor)[:19], FORMATO_FECHA)
+            except ValueError:
+                continue
+    return None
+
+
+def mes_de(solicitud: Dict[str, Any]) -> str:
+    fecha = fecha_cierre(solicitud)
+    return fecha.strftime("%Y-%m") if fecha else "sin-fecha"
+
+
+def _leer_o_vacio(ruta: Path, vacio):
+    try:
+        return leer_documento(ruta)
+    except FileNotFoundError:
+        return vacio
+
+
+# ============================================
+# ARCHIVAR
+# ============================================
+
+def _fusionar_particion(coleccion: str, mes: str, nuevos: List[Dict[str, Any]]):
+    ruta = ruta_particion(coleccion, mes)
+    with bloqueo_archivo(ruta):
+        por_id = {_a_id(r.get("id")): r for r in _leer_o_vacio(ruta, [])}
+        for r in nuevos:
+            por_id[_a_id(r.get("id"))] = r
+        escribir_documento_atomico(ruta, sorted(por_id.values(), key=lambda r: _a_id(r.get("id")) or 0))
+        if coleccion == "solicitudes":
+            _fijar_conteos(mes, por_id.values())
+
+
+def _conteos_mes(solicitudes) -> Dict[str, int]:
+    return viajes_por_estado(conteos("solicitudes", solicitudes))
+
+
+def _fijar_conteos(mes: str, solicitudes):
+    """Viajes por estado de la partición `mes` (recalculados: volver a archivar no suma dos veces)"""
+    ruta = ruta_conteos()
+    with bloqueo_archivo(ruta):
+        actuales = _leer_o_vacio(ruta, None)
+        if not isinstance(actuales, dict):
+            actuales = _recontar()
+        actuales[mes] = _conteos_mes(solicitudes)
+        escribir_documento_atomico(ruta, actuales)
+
+
+def _recontar() -> Dict[str, Dict[str, int]]:
+    """Conteos de todas las particiones existentes (archivos anteriores a conteos.json)"""
+    prefijo = "solicitudes-"
+    return {
+        ruta.stem[len(prefijo):]: _conteos_mes(iterar_archivo(ruta))
+        for ruta in sorted(Path(config.ARCHIVO_DIR).glob(f"{prefijo}*.json"))
+    }
+
+
+def _actualizar_indice(por_mes: Dict[str, List[Dict[str, Any]]]):
+    ruta = ruta_indice()
+    with bloqueo_archivo(ruta):
+        indice = _leer_o_vacio(ruta, {})
+        if not isinstance(indice, dict):
+            indice = {}
+        for mes, solicitudes in por_mes.items():
+            entrada = indice.get(mes) or {}
+            for rol in ("pasajero", "conductor"):
+                ids = set(entrada.get(rol) or [])
+                ids.update(s.get(f"{rol}_id") for s in solicitudes if s.get(f"{rol}_id") is not None)
+                entrada[rol] = sorted(ids, key=str)
+            indice[mes] = entrada
+        escribir_documento_atomico(ruta, indice)
+
+
+def archivar_terminados(repo_solicitudes: Repositorio, repo_contraofertas: Repositorio,
+                        dias_retencion: Optional[int] = None,
+                        ahora: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Mueve las solicitudes terminadas (y sus contraofertas) a las particiones
+    mensuales. Devuelve {"solicitudes": n, "contraofertas": m, "meses": [...]}.
+    """
+    if dias_retencion is None:
+        dias_retencion = config.ARCHIVO_DIAS_RETENCION
+    limite = (ahora or datetime.now()) - timedelta(days=dias_retencion)
+
+    with bloquear(repo_solicitudes, repo_contraofertas):
+        solicitudes = repo_solicitudes.leer()
+        archivar = {}
+        for s in solicitudes:
+            if s.get("estado") not in ESTADOS_TERMINALES:
+                continue
+            cierre = fecha_cierre(s)
+            if cierre is None or cierre <= limite:
+                archivar[_a_id(s.get("id"))] = s
+        if not archivar:
+            return {"solicitudes": 0, "contraofertas": 0, "meses": []}
+
+        contraofertas = repo_contraofertas.leer()
+        contra_archivar = [c for c in contraofertas if _a_id(c.get("solicitud_id")) in archivar]
+
+        por_mes: Dict[str, List[Dict[str, Any]]] = {}
+        for s in archivar.values():
+            por_mes.setdefault(mes_de(s), []).append(s)
+        contra_por_mes: Dict[str, List[Dict[str, Any]]] = {}
+        for c in contra_archivar:
+            mes = mes_de(archivar[_a_id(c.get("solicitud_id"))])
+            contra_por_mes.setdefault(mes, []).append(c)
+
+        # 1) particiones frías  2) índice  3) quitar del archivo caliente
+        for mes, lote in por_mes.items():
+            _fusionar_particion("solicitudes", mes, lote)
+        for mes, lote in contra_por_mes.items():
+            _fusionar_particion("contraofertas", mes, lote)
+        _actualizar_indice(por_mes)
+
+        ids_contra = {_a_id(c.get("id")) for c in contra_archivar}
+        repo_contraofertas.reemplazar([c for c in contraofertas if _a_id(c.get("id")) not in ids_contra])
+        repo_solicitudes.reemplazar([s for s in solicitudes if _a_id(s.get("id")) not in archivar])
+
+    meses = sorted(por_mes)
+    print(f"🗄️ Archivadas {len(archivar)} solicitudes y {len(contra_archivar)} contraofertas en {meses}")
+    return {"solicitudes": len(archivar), "contraofertas": len(contra_archivar), "meses": meses}
+
+
+# ============================================
+# LECTURA (bajo demanda)
+# ============================================
+
+def meses_con_viajes(rol: str, usuario_id) -> List[str]:
+    """Meses archivados en los que `usuario_id` aparece como pasajero/conductor (del más antiguo al más reciente)"""
+    indice = _leer_o_vacio(ruta_indice(), {})
+    if not isinstance(indice, dict):
+        return []
+    return sorted(mes for mes, entrada in indice.items() if usuario_id in (entrada.get(rol) or []))
+
+
+def viajes_archivados_por_estado() -> Dict[str, int]:
+    """{estado: cantidad} de todas las particiones, sin abrirlas"""
+    ruta = ruta_conteos()
+    por_mes = _leer_o_vacio(ruta, None)
+    if not isinstance(por_mes, dict):
+        if not Path(config.ARCHIVO_DIR).is_dir():
+            return {}
+        with bloqueo_archivo(ruta):
+            por_mes = _leer_o_vacio(ruta, None)
+            if not isinstance(por_mes, dict):
+                por_mes = _recontar()
+                escribir_documento_atomico(ruta, por_mes)
+    total: Dict[str, int] = {}
+    for estados in por_mes.values():
+        for estado, cantidad in (estados or {}).items():
+            total[estado] = total.get(estado, 0) + cantidad
+    return total
+
+
+def leer_particion(coleccion: str, mes: str) -> List[Dict[str, Any]]:
+    datos = _leer_o_vacio(ruta_particion(coleccion, mes), [])
+    return datos if isinstance(datos, list) else []
+
+
+def iterar_archivadas(rol: str, usuario_id, estado: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Solicitudes archivadas del usuario, abriendo solo las particiones de los
+    meses que lo necesitan, de a una a la vez y registro por registro
+    (servicios/lectura_incremental.py).
+    """
+    campo = f"{rol}_id"
+    for mes in meses_con_viajes(rol, usuario_id):
+        try:
+            for s in iterar_archivo(ruta_particion("solicitudes", mes)):
+                if s.get(campo) == usuario_id and (estado is None or s.get("estado") == estado):
+                    yield s
+        except FileNotFoundError:
+            continue
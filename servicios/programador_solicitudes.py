@@ -0,0 +1,152 @@
+# servicios/programador_solicitudes.py
+"""
+Programador de solicitudes con hora de partida futura ("30_min", "60_min").
+
+Antes entraban a la misma cola FIFO que las inmediatas y los conductores las
+veían enseguida, media hora o una hora antes de que el pasajero saliera.
+Ahora esperan en un montículo ordenado por la hora en que deben liberarse
+(fecha_partida_estimada - config.PROGRAMADAS_ANTICIPACION_MIN) y pasan a
+cola_solicitudes cuando llega ese momento:
+
+- ver la próxima a liberar es O(1) (la cima del montículo); programar y
+  liberar, O(log n). Mientras la cima no venció, consultar cuesta un stat().
+- No hay hilo propio: las libera la siguiente consulta de la cola
+  (sondeo de conductores, alta de solicitudes) que ocurra después de la hora.
+
+Persistencia propia, compartida entre workers:
+
+    data/programadas_solicitudes.json  {"programadas": [[liberar_en, id], ...], "cursor": n}
+
+Cada cambio se escribe con el bloqueo del archivo y avanza el cursor; un
+worker cuyo cursor quedó atrás reconstruye su montículo (heapify, O(n)).
+Liberar es sacar del archivo con el bloqueo tomado, así que cada solicitud
+se libera una sola vez aunque haya varios workers.
+"""
+import json
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from estructuras.monticulo import Monticulo
+from servicios.almacenamiento import escribir_documento_atomico, leer_documento
+from servicios.concurrencia import bloqueo_archivo
+from servicios.instantanea_cola import cursor_inicial
+
+
+def ruta_programadas(ruta_coleccion) -> Path:
+    ruta = Path(ruta_coleccion)
+    return ruta.with_name(f"programadas_{ruta.stem}.json")
+
+
+class ProgramadorSolicitudes:
+    """Solicitudes en espera hasta su hora de liberación (sin ruta: solo en memoria)"""
+
+    def __init__(self, ruta_coleccion=None):
+        self.ruta = str(ruta_programadas(ruta_coleccion)) if ruta_coleccion is not None else None
+        self._monticulo = Monticulo()
+        self._cursor: Optional[int] = None
+        self._lock = threading.RLock()
+
+    # ---------------- Persistencia ----------------
+
+    def _bloqueo(self):
+        return bloqueo_archivo(self.ruta) if self.ruta else nullcontext()
+
+    def _leer(self) -> Optional[Tuple[List[Any], int]]:
+        try:
+            datos = leer_documento(self.ruta)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(datos, dict) or not isinstance(datos.get("programadas"), list):
+            return None
+        try:
+            return datos["programadas"], int(datos.get("cursor") or 0)
+        except (TypeError, ValueError):
+            return None
+
+    def _sincronizar(self):
+        """Reconstruye el montículo si otro worker cambió el archivo"""
+        if not self.ruta:
+            return
+        actual = self._leer()
+        programadas, cursor = actual if actual is not None else ([], 0)
+        if cursor == self._cursor:
+            return
+        self._monticulo = Monticulo(
+            (str(liberar_en), str(rid), None) for liberar_en, rid in programadas
+        )
+        self._cursor = cursor
+
+    def _guardar(self):
+        """Escribe el montículo (llamar con el bloqueo del archivo tomado)"""
+        if not self.ruta:
+            return
+        programadas = [[liberar_en, rid] for liberar_en, rid, _ in self._monticulo.elementos()]
+        self._cursor = self._cursor + 1 if self._cursor else cursor_inicial()
+        escribir_documento_atomico(self.ruta, {"programadas": programadas, "cursor": self._cursor})
+
+    # ---------------- API ----------------
+
+    def programar(self, solicitud_id, liberar_en: str) -> None:
+        """Retiene la solicitud hasta `liberar_en` ("%Y-%m-%d %H:%M:%S")"""
+        with self._lock, self._bloqueo():
+            self._sincronizar()
+            self._monticulo.insertar(liberar_en, str(solicitud_id))
+            self._guardar()
+
+    def remover(self, solicitud_id) -> bool:
+        """Quita una solicitud programada (cancelada/aceptada antes de liberarse)"""
+        with self._lock:
+            self._sincronizar()
+            if str(solicitud_id) not in self._monticulo:
+                return False
+            with self._bloqueo():
+                self._sincronizar()
+                if self._monticulo.remover(str(solicitud_id)) is None:
+                    return False
+                self._guardar()
+                return True
+
+    def proxima(self) -> Optional[Tuple[str, str]]:
+        """(liberar_en, id) de la próxima a liberar, o None"""
+        with self._lock:
+            self._sincronizar()
+            minimo = self._monticulo.ver_minimo()
+            return (minimo[0], minimo[1]) if minimo else None
+
+    def vencidas(self, ahora: str) -> List[str]:
+        """Saca y devuelve (en orden de liberación) los ids cuya hora ya llegó"""
+        with self._lock:
+            proxima = self.proxima()
+            if proxima is None or proxima[0] > ahora:
+                return []
+            with self._bloqueo():
+                self._sincronizar()
+                ids = []
+                while True:
+                    minimo = self._monticulo.ver_minimo()
+                    if minimo is None or minimo[0] > ahora:
+                        break
+                    ids.append(self._monticulo.extraer_minimo()[1])
+                if ids:
+                    self._guardar()
+                return ids
+
+    def liberacion(self, solicitud_id) -> Optional[str]:
+        """Hora en que se libera la solicitud, o None si no está programada"""
+        with self._lock:
+            self._sincronizar()
+            return self._monticulo.prioridad(str(solicitud_id))
+
+    def ids(self) -> set:
+        with self._lock:
+            self._sincronizar()
+            return {rid for _, rid, _ in self._monticulo.elementos()}
+
+    def estadisticas(self) -> Dict[str, Any]:
+        proxima = self.proxima()
+        return {
+            "programadas": len(self._monticulo),
+            "proxima": {"liberar_en": proxima[0], "solicitud_id": proxima[1]} if proxima else None,
+        }
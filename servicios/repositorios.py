@@ -0,0 +1,278 @@
+# servicios/repositorios.py
+"""
+Repositorios de colecciones (solicitudes, contraofertas, ...).
+
+La lógica de negocio (solicitudes_mejoradas, historial) trabaja contra esta
+interfaz en vez de usar rutas de archivo directamente:
+
+    leer()                 todos los registros (copias)
+    reemplazar(registros)  guarda la colección completa
+    buscar(**filtros)      registros con campo == valor (lista/conjunto = "está en")
+    iterar(**filtros)      igual que buscar, como generador (recorridos largos)
+    obtener(id)            un registro o None
+    insertar(registro)     asigna id (si falta) y version; devuelve el registro
+    actualizar(*regs)      reemplaza por id; False si alguno no existe
+    actualizar_diferido(*regs)  igual, agrupado con otros cambios; devuelve un Future
+    bloqueo()              context manager para leer-verificar-escribir sin carreras
+    conteo_por_estado()    {estado: cantidad} sin recorrer la colección
+
+Implementaciones:
+  - RepositorioArchivo: la capa de almacenamiento (JSON, bitácora o SQLite).
+  - RepositorioMemoria: diccionarios + índices secundarios, sin E/S de disco.
+    Sirve para benchmarks y para levantar el servicio en modo efímero
+    (TRANSPORT_REPOSITORIO=memoria): lo guardado se pierde al reiniciar.
+"""
+import threading
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from servicios import config
+from servicios import contadores
+from servicios.almacenamiento import (
+    nombre_coleccion, leer_coleccion, escribir_coleccion,
+    buscar_registros, iterar_registros, obtener_registro, insertar_registro, actualizar_registros,
+    actualizar_registros_diferido,
+    _a_id, _coincide,
+)
+from servicios.almacenamiento_sqlite import CAMPOS_INDEXADOS, normalizar_campo
+from servicios.concurrencia import bloqueo_archivo, verificar_y_subir_version, preparar_reemplazo
+
+
+def _orden_id(rid):
+    # ids numéricos primero y en orden (= orden de inserción), luego el resto
+    return (0, rid, "") if isinstance(rid, int) else (1, 0, str(rid))
+
+
+class Repositorio:
+    """Interfaz común (ver docstring del módulo)"""
+
+    nombre: str = ""
+
+    def leer(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def reemplazar(self, registros: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def buscar(self, **filtros) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def iterar(self, **filtros) -> Iterator[Dict[str, Any]]:
+        yield from self.buscar(**filtros)
+
+    def obtener(self, registro_id) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def insertar(self, registro: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def actualizar(self, *registros: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def actualizar_diferido(self, *registros: Dict[str, Any]) -> Future:
+        """Para cambios que no necesitan esperar al disco (ver servicios/escritura_agrupada.py)"""
+        futuro = Future()
+        try:
+            futuro.set_result(self.actualizar(*registros))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+    def bloqueo(self):
+        raise NotImplementedError
+
+    def conteo_por_estado(self) -> Dict[str, int]:
+        conteo: Dict[str, int] = {}
+        for r in self.iterar():
+            estado = r.get("estado") if r.get("estado") is not None else contadores.SIN_ESTADO
+            conteo[estado] = conteo.get(estado, 0) + 1
+        return conteo
+
+
+# ============================================
+# ARCHIVOS / SQLITE
+# ============================================
+
+class RepositorioArchivo(Repositorio):
+    """Colección guardada en `ruta` a través de servicios/almacenamiento.py"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.nombre = nombre_coleccion(ruta)
+
+    def leer(self):
+        return leer_coleccion(self.ruta)
+
+    def reemplazar(self, registros):
+        escribir_coleccion(self.ruta, registros)
+
+    def buscar(self, **filtros):
+        return buscar_registros(self.ruta, **filtros)
+
+    def iterar(self, **filtros):
+        return iterar_registros(self.ruta, **filtros)
+
+    def obtener(self, registro_id):
+        return obtener_registro(self.ruta, registro_id)
+
+    def insertar(self, registro):
+        return insertar_registro(self.ruta, registro)
+
+    def actualizar(self, *registros):
+        return actualizar_registros(self.ruta, *registros)
+
+    def actualizar_diferido(self, *registros):
+        return actualizar_registros_diferido(self.ruta, *registros)
+
+    def bloqueo(self):
+        return bloqueo_archivo(self.ruta)
+
+    def conteo_por_estado(self):
+        if self.nombre == "solicitudes":
+            return contadores.viajes_por_estado(contadores.leer_contadores(self.ruta))
+        return super().conteo_por_estado()
+
+
+# ============================================
+# MEMORIA
+# ============================================
+
+class RepositorioMemoria(Repositorio):
+    """
+    Registros en un dict {id: registro} (en orden de inserción) con un índice
+    {campo: {valor: {ids}}} por cada campo de CAMPOS_INDEXADOS de la colección.
+    Misma semántica que la versión de archivos: copias al leer, id max + 1,
+    verificación de "version" al actualizar.
+    """
+
+    def __init__(self, nombre: str, registros: Optional[List[Dict[str, Any]]] = None):
+        self.nombre = nombre
+        self._lock = threading.RLock()
+        self._registros: Dict[Any, Dict[str, Any]] = {}
+        self._indices: Dict[str, Dict[Any, Set[Any]]] = {
+            campo: {} for campo in CAMPOS_INDEXADOS.get(nombre, ())
+        }
+        self._ultimo_id = 0
+        if registros:
+            self.reemplazar(registros)
+
+    # ---------------- Índices ----------------
+
+    def _indexar(self, rid, registro: Dict[str, Any]):
+        for campo, indice in self._indices.items():
+            indice.setdefault(normalizar_campo(campo, registro.get(campo)), set()).add(rid)
+
+    def _desindexar(self, rid, registro: Dict[str, Any]):
+        for campo, indice in self._indices.items():
+            clave = normalizar_campo(campo, registro.get(campo))
+            ids = indice.get(clave)
+            if ids is not None:
+                ids.discard(rid)
+                if not ids:
+                    del indice[clave]
+
+    def _guardar(self, registro: Dict[str, Any]):
+        rid = _a_id(registro.get("id"))
+        anterior = self._registros.get(rid)
+        if anterior is not None:
+            self._desindexar(rid, anterior)
+        self._registros[rid] = dict(registro)
+        self._indexar(rid, registro)
+        if isinstance(rid, int):
+            self._ultimo_id = max(self._ultimo_id, rid)
+
+    def _candidatos(self, filtros: Dict[str, Any]) -> Optional[Set[Any]]:
+        """Ids que cumplen los filtros sobre campos indexados (None = sin índice aplicable)"""
+        candidatos = None
+        for campo, valor in filtros.items():
+            indice = self._indices.get(campo)
+            if indice is None:
+                continue
+            valores = valor if isinstance(valor, (list, tuple, set, frozenset)) else (valor,)
+            ids = set()
+            for v in valores:
+                ids |= indice.get(normalizar_campo(campo, v), set())
+            candidatos = ids if candidatos is None else candidatos & ids
+        return candidatos
+
+    # ---------------- API ----------------
+
+    def leer(self):
+        with self._lock:
+            return [dict(r) for r in self._registros.values()]
+
+    def reemplazar(self, registros):
+        with self._lock:
+            preparar_reemplazo(self._registros.values(), registros)
+            self._registros = {}
+            for indice in self._indices.values():
+                indice.clear()
+            for r in registros:
+                if isinstance(r, dict):
+                    self._guardar(r)
+
+    def buscar(self, **filtros):
+        with self._lock:
+            candidatos = self._candidatos(filtros)
+            if candidatos is None:
+                registros = self._registros.values()
+            else:
+                registros = (self._registros[rid] for rid in sorted(candidatos, key=_orden_id)
+                             if rid in self._registros)
+            return [dict(r) for r in registros
+                    if all(_coincide(self.nombre, r, campo, valor) for campo, valor in filtros.items())]
+
+    def obtener(self, registro_id):
+        rid = _a_id(registro_id)
+        with self._lock:
+            r = self._registros.get(rid)
+            return dict(r) if r is not None else None
+
+    def insertar(self, registro):
+        with self._lock:
+            if registro.get("id") is None:
+                registro["id"] = self._ultimo_id + 1
+            registro.setdefault("version", 1)
+            self._guardar(registro)
+        return registro
+
+    def actualizar(self, *registros):
+        with self._lock:
+            faltantes = [r.get("id") for r in registros if _a_id(r.get("id")) not in self._registros]
+            if faltantes:
+                print(f"⚠️ Registros inexistentes en {self.nombre}: {faltantes}")
+                return False
+            for nuevo in registros:
+                actual = self._registros[_a_id(nuevo.get("id"))]
+                if nuevo != actual:
+                    verificar_y_subir_version(actual, nuevo)
+            for nuevo in registros:
+                self._guardar(nuevo)
+        return True
+
+    def bloqueo(self):
+        return self._lock
+
+    def conteo_por_estado(self):
+        indice = self._indices.get("estado")
+        if indice is None:
+            return super().conteo_por_estado()
+        with self._lock:
+            return {(e if e is not None else contadores.SIN_ESTADO): len(ids) for e, ids in indice.items() if ids}
+
+
+def crear_repositorio(ruta) -> Repositorio:
+    """Repositorio para la colección de `ruta` según config.REPOSITORIO"""
+    if config.REPOSITORIO == "memoria":
+        return RepositorioMemoria(nombre_coleccion(ruta))
+    return RepositorioArchivo(ruta)
+
+
+@contextmanager
+def bloquear(*repositorios: Repositorio):
+    """Bloquea varios repositorios siempre en el mismo orden (evita interbloqueos)"""
+    with ExitStack() as pila:
+        for repo in sorted(repositorios, key=lambda r: r.nombre):
+            pila.enter_context(repo.bloqueo())
+        yield
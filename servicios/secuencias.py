@@ -0,0 +1,84 @@
+# servicios/secuencias.py
+"""
+Secuencias de ids por colección (modo JSON).
+
+En vez de recorrer toda la colección para calcular max(id) + 1 en cada
+inserción, el último id entregado se guarda en un archivo pequeño junto a la
+colección (data/<colección>.json.seq). Pedir un id es leer y reescribir ese
+número con el bloqueo entre procesos de la colección tomado, así que cuesta
+lo mismo con 10 o con 100 000 registros y dos workers nunca reciben el mismo.
+
+La secuencia solo avanza: si la colección se vacía o se borra un registro,
+sus ids no se reutilizan. Se inicializa una sola vez con el max(id) existente.
+(En SQLite la secuencia es la tabla `secuencias`, ver almacenamiento_sqlite.py.)
+"""
+import os
+from typing import Callable
+
+from servicios.concurrencia import bloqueo_archivo
+
+
+def ruta_secuencia(ruta) -> str:
+    return str(ruta) + ".seq"
+
+
+def _leer(ruta_seq: str):
+    try:
+        with open(ruta_seq, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        print(f"⚠️ Secuencia dañada en {ruta_seq}, se recalcula")
+        return None
+
+
+def _escribir(ruta_seq: str, valor: int):
+    os.makedirs(os.path.dirname(ruta_seq) or ".", exist_ok=True)
+    temp = ruta_seq + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(str(valor))
+    os.replace(temp, ruta_seq)
+
+
+def siguiente_id(ruta, max_actual: Callable[[], int]) -> int:
+    """
+    Próximo id de la colección guardada en `ruta`.
+    `max_actual` (el max(id) de la colección) solo se llama si la secuencia
+    todavía no existe o está dañada.
+    """
+    ruta_seq = ruta_secuencia(ruta)
+    with bloqueo_archivo(ruta):
+        ultimo = _leer(ruta_seq)
+        if ultimo is None:
+            ultimo = max_actual()
+        _escribir(ruta_seq, ultimo + 1)
+        return ultimo + 1
+
+
+def reservar_hasta(ruta, registro_id, max_actual: Callable[[], int]) -> None:
+    """Garantiza que la secuencia no entregue `registro_id` ni ids menores (ids puestos a mano)"""
+    try:
+        registro_id = int(registro_id)
+    except (TypeError, ValueError):
+        return
+    ruta_seq = ruta_secuencia(ruta)
+    with bloqueo_archivo(ruta):
+        guardado = _leer(ruta_seq)
+        ultimo = max_actual() if guardado is None else guardado
+        if guardado is None or registro_id > ultimo:
+            _escribir(ruta_seq, max(ultimo, registro_id))
+
+
+def reservar_bloque(ruta, cantidad: int, max_actual: Callable[[], int]) -> int:
+    """
+    Reserva `cantidad` ids consecutivos de una vez (inserciones en lote) y
+    devuelve el primero. Una sola lectura/escritura de la secuencia.
+    """
+    ruta_seq = ruta_secuencia(ruta)
+    with bloqueo_archivo(ruta):
+        ultimo = _leer(ruta_seq)
+        if ultimo is None:
+            ultimo = max_actual()
+        _escribir(ruta_seq, ultimo + max(0, cantidad))
+        return ultimo + 1
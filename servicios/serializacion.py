@@ -0,0 +1,125 @@
+# servicios/serializacion.py
+"""
+Formatos (códecs) para los archivos de colección en /data.
+
+    json          JSON compacto, sin indentación (por defecto)
+    json_legible  JSON con indent=2 (el formato original, cómodo para editar a mano)
+    orjson        JSON compacto con orjson, si está instalado (si no, json)
+    msgpack       binario con msgpack, si está instalado (si no, marshal)
+    marshal       binario con el módulo marshal de Python
+
+El códec se elige por colección en config (TRANSPORT_CODEC / TRANSPORT_CODECS)
+y al leer se detecta solo: los binarios empiezan con una cabecera propia y
+todo lo demás se trata como JSON. Cambiar de códec no requiere migrar nada;
+el archivo se reescribe en el formato nuevo en el siguiente guardado.
+
+Ojo: marshal depende de la versión de Python que escribió el archivo.
+"""
+import json
+import marshal
+from pathlib import Path
+from typing import Any, Dict
+
+from servicios import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 0x93 nunca inicia un texto UTF-8 válido, así que no se confunde con JSON
+CABECERAS = {
+    "msgpack": b"\x93TPmp\n",
+    "marshal": b"\x93TPma\n",
+}
+
+CODECS = ("json", "json_legible", "orjson", "msgpack", "marshal")
+
+
+def codecs_disponibles() -> Dict[str, bool]:
+    return {
+        "json": True,
+        "json_legible": True,
+        "orjson": orjson is not None,
+        "msgpack": msgpack is not None,
+        "marshal": True,
+    }
+
+
+def _resolver(codec: str) -> str:
+    """Códec que realmente se usará (con alternativa si falta la librería)"""
+    codec = (codec or "json").strip().lower()
+    if codec == "orjson" and orjson is None:
+        return "json"
+    if codec == "msgpack" and msgpack is None:
+        return "marshal"
+    if codec not in CODECS:
+        print(f"⚠️ Códec desconocido '{codec}', se usa json")
+        return "json"
+    return codec
+
+
+def codec_para(ruta) -> str:
+    """Códec configurado para la colección guardada en `ruta`"""
+    nombre = Path(ruta).stem
+    return _resolver(config.CODECS_POR_COLECCION.get(nombre, config.CODEC_POR_DEFECTO))
+
+
+# ============================================
+# CODIFICAR / DECODIFICAR
+# ============================================
+
+def codificar(datos: Any, codec: str = "json") -> bytes:
+    codec = _resolver(codec)
+    if codec == "json":
+        return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if codec == "json_legible":
+        return json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8")
+    if codec == "orjson":
+        return orjson.dumps(datos, option=orjson.OPT_NON_STR_KEYS)
+    if codec == "msgpack":
+        return CABECERAS["msgpack"] + msgpack.packb(datos, use_bin_type=True)
+    return CABECERAS["marshal"] + marshal.dumps(datos)
+
+
+def detectar_codec(contenido: bytes) -> str:
+    for codec, cabecera in CABECERAS.items():
+        if contenido.startswith(cabecera):
+            return codec
+    return "json"
+
+
+def decodificar(contenido: bytes) -> Any:
+    """
+    Decodifica el contenido de un archivo detectando el formato.
+    Vacío equivale a []. Si está dañado lanza json.JSONDecodeError
+    (también para los binarios, así los llamadores tratan igual cualquier error).
+    """
+    codec = detectar_codec(contenido)
+    if codec == "json":
+        if not contenido.strip():
+            return []
+        if orjson is not None:
+            return orjson.loads(contenido)  # orjson.JSONDecodeError hereda de json.JSONDecodeError
+        return json.loads(contenido.decode("utf-8"))
+
+    cuerpo = contenido[len(CABECERAS[codec]):]
+    try:
+        if codec == "msgpack":
+            if msgpack is None:
+                raise ValueError("el archivo está en msgpack y el paquete msgpack no está instalado")
+            return msgpack.unpackb(cuerpo, raw=False, strict_map_key=False)
+        return marshal.loads(cuerpo)
+    except (ValueError, EOFError, TypeError) as e:
+        raise json.JSONDecodeError(f"Archivo {codec} inválido: {e}", "", 0) from e
+
+
+def leer_archivo(ruta) -> Any:
+    """Lee y decodifica un archivo de datos en cualquiera de los formatos"""
+    with open(ruta, "rb") as f:
+        return decodificar(f.read())
@@ -4,14 +4,21 @@ Sistema de solicitudes con soporte para contraofertas
 Usa la estructura COLA para manejar solicitudes en orden FIFO
 (First In, First Out - Primero en llegar, primero en ser atendido)
 """
-import json
-import os
+import threading
 import time
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from servicios.usuarios_repo import _guardar_json_atomic
-from estructuras.cola import Cola  # ← ESTRUCTURA DE DATOS: COLA
+from servicios.almacenamiento import leer_coleccion, escribir_coleccion, iterar_registros
+from servicios.concurrencia import ConflictoVersion, reintentar_si_conflicto
+from servicios.repositorios import Repositorio, RepositorioArchivo, crear_repositorio, bloquear
+from servicios.instantanea_cola import InstantaneaCola
+from servicios.programador_solicitudes import ProgramadorSolicitudes
+from servicios.ubicaciones_conductores import registro_conductores
+from servicios import config
+from servicios.zonas import zona_de_solicitud, zonas_en_radio
+from servicios.geo import FACTOR_CORRECCION_CARRETERA, cartesianas, cuerda_km, distancias_desde
+from estructuras.cola_zonas import ColaPorZonas  # ← ESTRUCTURA DE DATOS: COLA (repartida por zonas)
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
@@ -25,8 +32,93 @@ VIAJES_FILE = DATA_DIR / "viajes.json"
 # La cola garantiza que las solicitudes se procesen en orden FIFO:
 # - El pasajero que solicita primero, aparece primero para los conductores
 # - Esto es justo y eficiente para el sistema de transporte
+#
+# Su orden se guarda en una instantánea (servicios/instantanea_cola.py): al
+# reiniciar se restaura sin ordenar la colección, y una cola vacía ya cargada
+# no obliga a releer nada.
+#
+# Las solicitudes con partida futura ("30_min", "60_min") esperan en el
+# programador (servicios/programador_solicitudes.py) y entran a la cola
+# config.PROGRAMADAS_ANTICIPACION_MIN minutos antes de la partida.
+#
+# Además de la fila global (posiciones, instantánea) cada solicitud queda en la
+# sub-cola de la zona de su origen (servicios/zonas.py): la búsqueda de un
+# conductor recorre solo las zonas que toca su radio, en el mismo orden FIFO.
+# Un árbol k-d sobre los mismos orígenes responde "las k más cercanas".
+
+
+def _clave_cola(solicitud: dict):
+    """Id con el que la cola indexa cada solicitud (remover/obtener en O(1))"""
+    return solicitud.get("solicitud_id") or solicitud.get("viaje_id") or solicitud.get("id")
+
+
+def _punto_cola(solicitud: dict):
+    """Origen en coordenadas 3D para el árbol k-d de la cola (None si no trae lat/lng)"""
+    origen = solicitud.get("origen") or {}
+    try:
+        return cartesianas(float(origen["lat"]), float(origen["lng"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _nueva_cola() -> ColaPorZonas:
+    return ColaPorZonas(clave=_clave_cola, zona=zona_de_solicitud, punto=_punto_cola)
+
+
+cola_solicitudes = _nueva_cola()  # Cola en memoria para solicitudes pendientes
+_cola_cursor = None          # cursor de la instantánea que refleja la cola (None = sin cargar)
+_cola_lock = threading.RLock()
+_programador = None          # ProgramadorSolicitudes del repositorio activo (se crea al usarlo)
+
+
+# ============================================
+# REPOSITORIOS (inyectables)
+# ============================================
+# La lógica no usa las rutas de archivo directamente sino estos repositorios
+# (ver servicios/repositorios.py). Para benchmarks o pruebas de carga se
+# cambian por RepositorioMemoria con configurar_repositorios().
+
+_repo_solicitudes: Repositorio = crear_repositorio(SOLICITUDES_FILE)
+_repo_contraofertas: Repositorio = crear_repositorio(CONTRAOFERTAS_FILE)
+
+
+def repositorio_solicitudes() -> Repositorio:
+    return _repo_solicitudes
+
 
-cola_solicitudes = Cola()  # Cola en memoria para solicitudes pendientes
+def repositorio_contraofertas() -> Repositorio:
+    return _repo_contraofertas
+
+
+def configurar_repositorios(solicitudes: Repositorio = None, contraofertas: Repositorio = None):
+    """Inyecta otros repositorios (la cola se vacía: reflejaba los anteriores)"""
+    global _repo_solicitudes, _repo_contraofertas, cola_solicitudes, _cola_cursor, _programador
+    if solicitudes is not None:
+        _repo_solicitudes = solicitudes
+    if contraofertas is not None:
+        _repo_contraofertas = contraofertas
+    with _cola_lock:
+        cola_solicitudes = _nueva_cola()
+        _cola_cursor = None
+        _programador = None
+
+
+def _guardar(repo: Repositorio, *registros) -> bool:
+    """
+    Guarda un cambio de estado y espera a que esté escrito. Pasa por la
+    escritura agrupada: las transiciones que llegan a la vez comparten un
+    solo volcado, y un ConflictoVersion vuelve por el Future igual que antes.
+    """
+    return repo.actualizar_diferido(*registros).result()
+
+
+def _repositorio_de(path):
+    """Repositorio activo para una de las rutas conocidas (None si no hay)"""
+    if Path(path) == SOLICITUDES_FILE:
+        return _repo_solicitudes
+    if Path(path) == CONTRAOFERTAS_FILE:
+        return _repo_contraofertas
+    return None
 
 
 # ============================================
@@ -46,63 +138,49 @@ def encolar_solicitud(solicitud: dict):
     return solicitud.get('solicitud_id') or solicitud.get('id')
 
 
+def iterar_solicitudes():
+    """
+    Generador con la unión de la cola en memoria + solicitudes.json + viajes.json
+    (sin conductor), en una sola pasada y sin repetir ids. Precedencia, de mayor
+    a menor: cola > solicitudes > viajes; como se recorren en ese orden, gana el
+    primero que aparece y los siguientes con el mismo id se saltan (O(1) cada uno
+    con un set). Las fuentes se leen de a un registro (ver iterar_registros).
+    """
+    _asegurar_cola()
+    with _cola_lock:
+        en_cola = cola_solicitudes.instantanea()
+    vistos = set()
+
+    def nuevos(registros):
+        for r in registros:
+            clave = str(r.get("id"))
+            if clave not in vistos:
+                vistos.add(clave)
+                yield r
+
+    yield from nuevos(en_cola)
+    yield from nuevos(_repo_solicitudes.iterar())
+    yield from nuevos(v for v in iterar_registros(VIAJES_FILE)
+                      if v.get('conductor_id') in (None, 0, ''))
+
+
 def listar_solicitudes():
-    """Combina solicitudes en memoria + archivo + viajes.json"""
-    resultado = []
+    """Combina solicitudes en memoria + archivo + viajes.json (lista de iterar_solicitudes)"""
     try:
-        if hasattr(cola_solicitudes, "to_list"):
-            resultado = cola_solicitudes.to_list() or []
-        else:
-            temp = []
-            while len(cola_solicitudes):
-                temp.append(cola_solicitudes.desencolar())
-            for s in temp:
-                cola_solicitudes.encolar(s)
-            resultado = temp
-
-        # Añadir las guardadas en solicitudes.json
-        archivo = _leer_json(SOLICITUDES_FILE)
-        for s in archivo:
-            if not any(str(r.get("id")) == str(s.get("id")) for r in resultado):
-                resultado.append(s)
-
-        # Añadir también desde viajes.json (sin conductor)
-        viajes = _leer_json(VIAJES_FILE)
-        for v in viajes:
-            if v.get('conductor_id') in (None, 0, ''):
-                if not any(str(r.get("id")) == str(v.get("id")) for r in resultado):
-                    resultado.append(v)
-        return resultado
+        return list(iterar_solicitudes())
     except Exception as e:
         print("❌ Error en listar_solicitudes:", e)
         return []
 
 
 def leer_solicitudes():
-    """Para el endpoint /api/solicitudes_cercanas"""
+    """Igual que listar_solicitudes (nombre anterior)"""
     return listar_solicitudes()
 
 
 def aceptar_solicitud_por_id(solicitud_id):
     """Busca y elimina una solicitud de la cola o archivo."""
-    aceptada = None
-    temp = []
-    try:
-        while len(cola_solicitudes):
-            s = cola_solicitudes.desencolar()
-            sid = s.get("solicitud_id") or s.get("viaje_id") or s.get("id")
-            if str(sid) == str(solicitud_id) and aceptada is None:
-                aceptada = s
-                continue
-            temp.append(s)
-    except Exception as e:
-        print("Error aceptar_solicitud_por_id:", e)
-    finally:
-        for item in temp:
-            try:
-                cola_solicitudes.encolar(item)
-            except Exception:
-                pass
+    aceptada = _quitar_de_cola(solicitud_id)  # O(1) por el índice de la cola
 
     # Quitar del archivo también
     data = _leer_json(SOLICITUDES_FILE)
@@ -111,93 +189,168 @@ def aceptar_solicitud_por_id(solicitud_id):
     return aceptada
 
 
+def _instantanea_cola():
+    """Instantánea del orden de la cola (None con repositorios en memoria: no hay nada que persistir)"""
+    if isinstance(_repo_solicitudes, RepositorioArchivo):
+        return InstantaneaCola(_repo_solicitudes.ruta)
+    return None
+
+
 def _sincronizar_cola_desde_json():
     """
-    Carga las solicitudes pendientes del JSON a la Cola (al iniciar el servidor).
-    Mantiene el orden por fecha_creacion (FIFO).
+    Carga las solicitudes pendientes del JSON a la Cola (arranque en frío:
+    no hay instantánea o está dañada). Mantiene el orden por fecha_creacion
+    (FIFO) y guarda ese orden como instantánea nueva.
     """
-    global cola_solicitudes
-    cola_solicitudes = Cola()  # Reiniciar cola
-    
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    pendientes = [s for s in solicitudes if s.get('estado') == 'pendiente']
-    
-    # Ordenar por fecha de creación (más antigua primero = FIFO)
-    pendientes.sort(key=lambda x: x.get('fecha_creacion', ''))
-    
-    for sol in pendientes:
-        cola_solicitudes.encolar(sol)
-    
+    global cola_solicitudes, _cola_cursor
+    with _cola_lock:
+        cola = _nueva_cola()
+
+        # Las programadas todavía no entran: las libera el programador
+        programadas = programador_solicitudes().ids()
+        pendientes = [s for s in _repo_solicitudes.buscar(estado='pendiente')
+                      if str(s.get('id')) not in programadas]
+
+        # Ordenar por fecha de creación (más antigua primero = FIFO)
+        pendientes.sort(key=lambda x: x.get('fecha_creacion', ''))
+
+        for sol in pendientes:
+            cola.encolar(sol)
+
+        instantanea = _instantanea_cola()
+        cola_solicitudes = cola
+        _cola_cursor = instantanea.guardar(s.get('id') for s in pendientes) if instantanea else 0
+
     print(f"📋 Cola sincronizada: {len(cola_solicitudes)} solicitudes pendientes")
 
 
+def _restaurar_cola(instantanea, orden, cursor):
+    """
+    Arranque en caliente: la cola se arma con los ids de la instantánea, en
+    su orden, buscando solo esas solicitudes. Las que ya no están pendientes
+    se descartan (y se quitan de la instantánea).
+    """
+    global cola_solicitudes, _cola_cursor
+    with _cola_lock:
+        por_id = {str(s.get('id')): s for s in _repo_solicitudes.buscar(id=set(orden))} if orden else {}
+        cola = _nueva_cola()
+        salientes = []
+        for rid in orden:
+            sol = por_id.get(str(rid))
+            if sol is not None and sol.get('estado') == 'pendiente':
+                cola.encolar(sol)
+            else:
+                salientes.append(rid)
+        cola_solicitudes = cola
+        _cola_cursor = cursor
+        if salientes:
+            _actualizar_instantanea(removidos=salientes)
+
+
+def _asegurar_cola():
+    """
+    Deja la cola en memoria al día con la instantánea: no hace nada si el
+    cursor no cambió (aunque la cola esté vacía), la restaura si otro proceso
+    la modificó y la reconstruye desde la colección si no hay instantánea.
+    """
+    with _cola_lock:
+        instantanea = _instantanea_cola()
+        if instantanea is None:
+            if _cola_cursor is None:
+                _sincronizar_cola_desde_json()
+        else:
+            actual = instantanea.leer()
+            if actual is None:
+                _sincronizar_cola_desde_json()
+            elif actual[1] != _cola_cursor:
+                _restaurar_cola(instantanea, *actual)
+        _liberar_programadas()
+
+
+def programador_solicitudes() -> ProgramadorSolicitudes:
+    """Programador de las solicitudes con partida futura (persistido junto a la colección)"""
+    global _programador
+    if _programador is None:
+        ruta = _repo_solicitudes.ruta if isinstance(_repo_solicitudes, RepositorioArchivo) else None
+        _programador = ProgramadorSolicitudes(ruta)
+    return _programador
+
+
+def _liberar_programadas():
+    """Pasa a la cola las programadas cuya hora de liberación ya llegó (en ese orden)"""
+    ids = programador_solicitudes().vencidas(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    if not ids:
+        return
+    por_id = {str(s.get('id')): s for s in _repo_solicitudes.buscar(id={int(i) for i in ids if i.isdigit()})}
+    liberadas = [por_id[i] for i in ids if i in por_id and por_id[i].get('estado') == 'pendiente']
+    _encolar_pendiente(*liberadas)
+    print(f"⏰ {len(liberadas)} solicitud(es) programada(s) pasan a la cola")
+
+
+def _actualizar_instantanea(encolados=(), removidos=()):
+    """
+    Refleja un alta/baja de la cola en la instantánea. Si nadie más la tocó
+    desde la última carga, la cola en memoria sigue al día con el cursor
+    nuevo; si no, se recarga en la próxima consulta.
+    """
+    global _cola_cursor
+    instantanea = _instantanea_cola()
+    if instantanea is None:
+        return
+    try:
+        anterior, nuevo = instantanea.aplicar(encolados, removidos)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar la instantánea de la cola: {e}")
+        return
+    if anterior is not None and anterior == _cola_cursor:
+        _cola_cursor = nuevo
+
+
+def _encolar_pendiente(*solicitudes):
+    if not solicitudes:
+        return
+    with _cola_lock:
+        for solicitud in solicitudes:
+            cola_solicitudes.encolar(solicitud)
+        _actualizar_instantanea(encolados=[s.get('id') for s in solicitudes])
+
+
+def _quitar_de_cola(*solicitud_ids):
+    """Saca las solicitudes de la cola en memoria y de la instantánea (devuelve la primera)"""
+    with _cola_lock:
+        removidas = [cola_solicitudes.remover(sid) for sid in solicitud_ids]
+        _actualizar_instantanea(removidos=solicitud_ids)
+    return removidas[0] if removidas else None
+
+
 def _guardar_cola_a_json():
     """
     Persiste el estado actual de la cola al JSON.
     """
     solicitudes = _leer_json(SOLICITUDES_FILE)
     
-    # Obtener IDs de solicitudes en la cola
-    ids_en_cola = set()
-    temp = []
-    while not cola_solicitudes.esta_vacia():
-        sol = cola_solicitudes.desencolar()
-        ids_en_cola.add(sol.get('id'))
-        temp.append(sol)
-    
-    # Re-encolar (mantener la cola intacta)
-    for sol in temp:
-        cola_solicitudes.encolar(sol)
-    
-    # Actualizar JSON con las solicitudes de la cola
+    # Actualizar JSON con la versión de la cola (búsqueda por id en el índice)
     for sol in solicitudes:
-        if sol.get('id') in ids_en_cola:
-            # Buscar la versión actualizada en la cola
-            for t in temp:
-                if t.get('id') == sol.get('id'):
-                    sol.update(t)
-                    break
+        en_cola = cola_solicitudes.obtener(sol.get('id'))
+        if en_cola is not None:
+            sol.update(en_cola)
     
     _guardar_json(SOLICITUDES_FILE, solicitudes)
 
-def _leer_json(path):
-    try:
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"⚠️ Error leyendo {path}:", e)
-    return []
-
 def _guardar_json(path, data):
     """
-    Guarda JSON de forma segura con escritura atómica
+    Guarda la colección completa de forma segura
+    (escritura atómica en JSON, o una transacción en SQLite)
     """
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        
-        # Crear archivo temporal
-        temp_path = str(path) + '.tmp'
-        
-        # Escribir en temporal
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Mover atómicamente (reemplazar el original)
-        import shutil
-        shutil.move(temp_path, path)
-        
+        repo = _repositorio_de(path)
+        if repo is not None:
+            repo.reemplazar(data)
+        else:
+            escribir_coleccion(path, data)
         return True
-        
     except Exception as e:
         print(f"❌ Error guardando {path}:", e)
-        # Limpiar temporal si existe
-        try:
-            temp_path = str(path) + '.tmp'
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-        except:
-            pass
         return False
 
 def calcular_precio(distancia_km):
@@ -232,10 +385,8 @@ def crear_solicitud_pasajero(pasajero_id, origen, destino, distancia, hora_viaje
     ESTRUCTURA DE DATOS: Usa COLA para encolar la solicitud (FIFO).
     El pasajero que solicita primero será atendido primero.
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    
-    nuevo_id = max([s.get('id', 0) for s in solicitudes], default=0) + 1
     precio_estimado = calcular_precio(distancia)
+    _asegurar_cola()  # la posición se calcula sobre la cola al día
 
     ahora = datetime.now()
     fecha_partida_estimada = ahora
@@ -243,9 +394,13 @@ def crear_solicitud_pasajero(pasajero_id, origen, destino, distancia, hora_viaje
         fecha_partida_estimada = ahora + timedelta(minutes=30)
     elif hora_viaje == "60_min":
         fecha_partida_estimada = ahora + timedelta(minutes=60)
+
+    # Con partida futura: espera en el programador hasta poco antes de salir
+    liberar_en = fecha_partida_estimada - timedelta(minutes=config.PROGRAMADAS_ANTICIPACION_MIN)
+    programada = liberar_en > ahora
     
     solicitud = {
-        "id": nuevo_id,
+        "id": None,  # lo asigna la capa de almacenamiento (max + 1)
         "pasajero_id": pasajero_id,
         "origen": origen,
         "destino": destino,
@@ -258,16 +413,20 @@ def crear_solicitud_pasajero(pasajero_id, origen, destino, distancia, hora_viaje
         "fecha_partida_estimada": fecha_partida_estimada.strftime("%Y-%m-%d %H:%M:%S"),
         "hora_seleccionada": hora_viaje,
         "fecha_actualizacion": None,
-        "posicion_cola": len(cola_solicitudes) + 1  # Posición en la cola FIFO
+        "posicion_cola": None if programada else len(cola_solicitudes) + 1  # Posición en la cola FIFO
     }
     
-    # ✅ ENCOLAR: Agregar a la cola de solicitudes (FIFO)
-    cola_solicitudes.encolar(solicitud)
-    print(f"📋 Solicitud #{nuevo_id} encolada. Posición en cola: {solicitud['posicion_cola']}")
-    
-    # Guardar también en JSON para persistencia
-    solicitudes.append(solicitud)
-    _guardar_json(SOLICITUDES_FILE, solicitudes)
+    # Guardar para persistencia (aquí se asigna el id)
+    _repo_solicitudes.insertar(solicitud)
+    nuevo_id = solicitud['id']
+
+    if programada:
+        programador_solicitudes().programar(nuevo_id, liberar_en.strftime("%Y-%m-%d %H:%M:%S"))
+        print(f"⏰ Solicitud #{nuevo_id} programada: entra a la cola a las {liberar_en.strftime('%H:%M')}")
+    else:
+        # ✅ ENCOLAR: Agregar a la cola de solicitudes (FIFO) y a su instantánea
+        _encolar_pendiente(solicitud)
+        print(f"📋 Solicitud #{nuevo_id} encolada. Posición en cola: {solicitud['posicion_cola']}")
     
     print(f"✅ Solicitud #{nuevo_id} creada: {origen['nombre']} → {destino['nombre']}, S/. {precio_estimado:.2f}")
     return solicitud
@@ -279,14 +438,10 @@ def contar_contraofertas_pendientes_pasajero(pasajero_id: int) -> int:
     de un pasajero.
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        contraofertas_data = _leer_json(CONTRAOFERTAS_FILE)
-
         # 1. Encontrar IDs de solicitudes 'pendientes' de este pasajero
         #
         mis_solicitudes_ids = {
-            s['id'] for s in solicitudes
-            if s.get('pasajero_id') == pasajero_id and s.get('estado') == 'pendiente'
+            s['id'] for s in _repo_solicitudes.buscar(pasajero_id=pasajero_id, estado='pendiente')
         }
 
         if not mis_solicitudes_ids:
@@ -294,40 +449,29 @@ def contar_contraofertas_pendientes_pasajero(pasajero_id: int) -> int:
 
         # 2. Contar contraofertas 'pendientes' para esas solicitudes
         #
-        conteo = 0
-        for c in contraofertas_data:
-            if c.get('solicitud_id') in mis_solicitudes_ids and c.get('estado') == 'pendiente':
-                conteo += 1
-
-        return conteo
+        return len(_repo_contraofertas.buscar(solicitud_id=mis_solicitudes_ids, estado='pendiente'))
 
     except Exception as e:
         print(f"❌ Error contando contraofertas: {e}")
         return 0
 
 
+@reintentar_si_conflicto(valor_si_falla=False)
 def pasajero_rechaza_contraoferta(pasajero_id, contraoferta_id):
     """
     El pasajero rechaza una contraoferta.
     La marca como 'rechazada' en contraofertas.json.
     """
-    contraofertas = _leer_json(CONTRAOFERTAS_FILE)
-    contraoferta_encontrada = False
-
     # Podríamos añadir una validación extra para asegurar que el pasajero_id
     # es el dueño de la solicitud original, pero por ahora esto es funcional.
+    c = _repo_contraofertas.obtener(contraoferta_id)
 
-    for c in contraofertas:
-        if c['id'] == contraoferta_id and c.get('estado') == 'pendiente':
-            c['estado'] = 'rechazada'
-            c['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            contraoferta_encontrada = True
-            break
-
-    if contraoferta_encontrada:
-        _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
-        print(f"👎 Contraoferta #{contraoferta_id} marcada como RECHAZADA.")
-        return True
+    if c and c.get('estado') == 'pendiente':
+        c['estado'] = 'rechazada'
+        c['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if _guardar(_repo_contraofertas, c):
+            print(f"👎 Contraoferta #{contraoferta_id} marcada como RECHAZADA.")
+            return True
 
     return False
 
@@ -340,97 +484,158 @@ def obtener_solicitudes_activas():
     ESTRUCTURA DE DATOS: Recorre la Cola sin modificarla para obtener
     las solicitudes en el orden en que llegaron.
     """
-    # Si la cola está vacía, sincronizar desde JSON
-    if cola_solicitudes.esta_vacia():
-        _sincronizar_cola_desde_json()
+    # Al día con la instantánea (una cola vacía ya cargada no se vuelve a leer)
+    _asegurar_cola()
     
-    # Recorrer la cola sin modificarla (desencolar y re-encolar)
+    # Recorrer la cola sin modificarla; las que ya no están pendientes se quitan
     solicitudes_ordenadas = []
-    temp = []
+    salientes = []
     
-    while not cola_solicitudes.esta_vacia():
-        sol = cola_solicitudes.desencolar()
-        # Solo incluir las que siguen pendientes
+    for sol in cola_solicitudes.recorrer():
         if sol.get('estado') == 'pendiente':
             solicitudes_ordenadas.append(sol)
-        temp.append(sol)
+        else:
+            salientes.append(_clave_cola(sol))
     
-    # Re-encolar todo para mantener la cola intacta
-    for sol in temp:
-        if sol.get('estado') == 'pendiente':
-            cola_solicitudes.encolar(sol)
+    if salientes:
+        _quitar_de_cola(*salientes)
     
     print(f"📋 Solicitudes activas (FIFO): {len(solicitudes_ordenadas)} en cola")
     return solicitudes_ordenadas
 
 
+def posicion_actual(solicitud_id):
+    """Posición actual (1 = la próxima) de la solicitud en la cola FIFO, o None si no está"""
+    _asegurar_cola()
+    return cola_solicitudes.posicion(solicitud_id)
+
+
+def posicion_en_cola(solicitud_id, pasajero_id):
+    """
+    Estado de la solicitud en la cola para el pasajero: posición actual y
+    cuántas tiene delante (O(log n) con el árbol de Fenwick de la cola, apto
+    para consultarse seguido). None si no existe o no es suya.
+    """
+    _asegurar_cola()
+    sol = cola_solicitudes.obtener(solicitud_id)
+    if sol is None:
+        sol = _repo_solicitudes.obtener(solicitud_id)
+    if not sol or str(sol.get('pasajero_id')) != str(pasajero_id):
+        return None
+
+    posicion = cola_solicitudes.posicion(solicitud_id)
+    return {
+        "solicitud_id": sol.get('id'),
+        "estado": sol.get('estado'),
+        "en_cola": posicion is not None,
+        "posicion": posicion,
+        "delante": posicion - 1 if posicion is not None else None,
+        "total_en_cola": len(cola_solicitudes),
+        "liberar_en": programador_solicitudes().liberacion(solicitud_id),
+    }
+
+
 def obtener_solicitudes_cercanas(lat_conductor, lng_conductor, radio_km=10):
     """
     Filtra solicitudes dentro de un radio de distancia del conductor.
     
     IMPORTANTE: Mantiene el orden FIFO de la cola, pero filtra por cercanía.
     Las solicitudes más antiguas aparecen primero dentro del radio.
+    Solo se miran las sub-colas de las zonas que toca el radio.
     """
-    from math import radians, sin, cos, sqrt, atan2
+    # Solo las zonas que toca el radio (en línea recta: radio / factor), en orden FIFO
+    _asegurar_cola()
+    zonas = zonas_en_radio(lat_conductor, lng_conductor, radio_km / FACTOR_CORRECCION_CARRETERA)
+    with _cola_lock:
+        candidatas = list(cola_solicitudes.recorrer_zonas(zonas))
+    salientes = [_clave_cola(sol) for sol in candidatas if sol.get('estado') != 'pendiente']
+    if salientes:
+        candidatas = [sol for sol in candidatas if sol.get('estado') == 'pendiente']
     
-    # Factor de corrección: distancia real por carretera ≈ 1.4x distancia aérea
-    FACTOR_CORRECCION = 1.4
-    
-    def calcular_distancia(lat1, lon1, lat2, lon2):
-        R = 6371
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distancia_aerea = R * c
-        return round(distancia_aerea * FACTOR_CORRECCION, 2)
-    
-    # Obtener solicitudes en orden FIFO
-    activas = obtener_solicitudes_activas()
+    # Una sola llamada al núcleo por lotes para todas las candidatas
+    distancias = distancias_desde(
+        lat_conductor, lng_conductor,
+        [sol['origen']['lat'] for sol in candidatas],
+        [sol['origen']['lng'] for sol in candidatas],
+    )
     cercanas = []
+    for sol, dist in zip(candidatas, distancias):
+        if dist <= radio_km:
+            sol['distancia_conductor'] = dist
+            cercanas.append(sol)
     
-    for sol in activas:
-        origen = sol.get('origen', {})
-        if 'lat' in origen and 'lng' in origen:
-            dist = calcular_distancia(
-                lat_conductor, lng_conductor,
-                origen['lat'], origen['lng']
-            )
-            if dist <= radio_km:
-                sol['distancia_conductor'] = round(dist, 2)
-                cercanas.append(sol)
+    if salientes:
+        _quitar_de_cola(*salientes)
     
+    print(f"📋 Solicitudes cercanas (FIFO): {len(cercanas)} de {len(candidatas)} en las zonas del radio")
     # NO reordenar por distancia - mantener orden FIFO (primero en llegar)
     # El conductor ve primero las solicitudes más antiguas dentro de su radio
     return cercanas
 
+def solicitudes_mas_cercanas(lat, lng, k=None, radio_km=None, estado='pendiente'):
+    """
+    Las k solicitudes más cercanas al punto y/o todas las que están a
+    radio_km o menos (km por carretera), de la más cercana a la más lejana,
+    cada una con 'distancia_km'. Sin k ni radio_km se usa un radio de 10 km.
+
+    Las pendientes salen del árbol k-d de la cola (sin recorrerla); para
+    otro `estado` se filtra la colección y se mide todo con el núcleo por lotes.
+    """
+    if k is None and radio_km is None:
+        radio_km = 10
+    if estado == 'pendiente':
+        _asegurar_cola()
+        # +0.005: una distancia apenas mayor al radio puede redondearse a él
+        radio_cuerda = (cuerda_km((radio_km + 0.005) / FACTOR_CORRECCION_CARRETERA)
+                        if radio_km is not None else None)
+        with _cola_lock:
+            vecinos = cola_solicitudes.cercanos(cartesianas(lat, lng), k, radio_cuerda)
+        candidatas = [sol for _, sol in vecinos if sol.get('estado') == 'pendiente']
+        salientes = [_clave_cola(sol) for _, sol in vecinos if sol.get('estado') != 'pendiente']
+        if salientes:
+            _quitar_de_cola(*salientes)
+    else:
+        candidatas = [sol for sol in _repo_solicitudes.buscar(estado=estado) if _punto_cola(sol)]
+
+    distancias = distancias_desde(
+        lat, lng,
+        [float(sol['origen']['lat']) for sol in candidatas],
+        [float(sol['origen']['lng']) for sol in candidatas],
+    )
+    # Orden estable: a igual distancia redondeada queda el orden del árbol
+    ordenadas = sorted(zip(distancias, range(len(candidatas)), candidatas))
+    if radio_km is not None:
+        ordenadas = [e for e in ordenadas if e[0] <= radio_km]
+    if k is not None:
+        ordenadas = ordenadas[:k]
+    return [dict(sol, distancia_km=dist) for dist, _, sol in ordenadas]
+
+
 def crear_contraoferta(conductor_id, solicitud_id, precio_ofrecido, mensaje=""):
     """
     El conductor crea una contraoferta para una solicitud
     """
-    contraofertas = _leer_json(CONTRAOFERTAS_FILE)
-    
-    # Verificar que la solicitud existe y está pendiente
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    solicitud = next((s for s in solicitudes if s['id'] == solicitud_id), None)
-    
-    if not solicitud or solicitud.get('estado') != 'pendiente':
-        return None
-    
-    nuevo_id = max([c.get('id', 0) for c in contraofertas], default=0) + 1
-    
-    contraoferta = {
-        "id": nuevo_id,
-        "solicitud_id": solicitud_id,
-        "conductor_id": conductor_id,
-        "precio_ofrecido": round(precio_ofrecido, 2),
-        "mensaje": mensaje,
-        "estado": "pendiente",  # pendiente, aceptada, rechazada
-        "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
-    contraofertas.append(contraoferta)
-    _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
+    # 🔒 Bloqueo entre procesos: la solicitud no puede confirmarse/cancelarse
+    # entre la verificación y la inserción de la oferta
+    with bloquear(_repo_solicitudes, _repo_contraofertas):
+        # Verificar que la solicitud existe y está pendiente
+        solicitud = _repo_solicitudes.obtener(solicitud_id)
+
+        if not solicitud or solicitud.get('estado') != 'pendiente':
+            return None
+
+        contraoferta = {
+            "id": None,  # lo asigna la capa de almacenamiento (max + 1)
+            "solicitud_id": solicitud_id,
+            "conductor_id": conductor_id,
+            "precio_ofrecido": round(precio_ofrecido, 2),
+            "mensaje": mensaje,
+            "estado": "pendiente",  # pendiente, aceptada, rechazada
+            "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+        _repo_contraofertas.insertar(contraoferta)
+        nuevo_id = contraoferta['id']
     
     print(f"💰 Contraoferta #{nuevo_id} creada por conductor #{conductor_id}: S/. {precio_ofrecido:.2f}")
     return contraoferta
@@ -440,22 +645,10 @@ def _desencolar_solicitud(solicitud_id):
     ESTRUCTURA DE DATOS: Remueve una solicitud de la Cola cuando es aceptada.
     Esto implementa el DESENCOLAR del FIFO - la solicitud sale de la cola.
     """
-    global cola_solicitudes
-    temp = []
-    removida = None
-    
-    while not cola_solicitudes.esta_vacia():
-        sol = cola_solicitudes.desencolar()
-        if sol.get('id') == solicitud_id:
-            removida = sol
-            print(f"📤 Solicitud #{solicitud_id} DESENCOLADA (salió de la cola FIFO)")
-        else:
-            temp.append(sol)
-    
-    # Re-encolar las que no fueron removidas
-    for sol in temp:
-        cola_solicitudes.encolar(sol)
-    
+    removida = _quitar_de_cola(solicitud_id)  # O(1): índice id → nodo
+    programador_solicitudes().remover(solicitud_id)  # por si todavía no se había liberado
+    if removida is not None:
+        print(f"📤 Solicitud #{solicitud_id} DESENCOLADA (salió de la cola FIFO)")
     return removida
 
 
@@ -469,55 +662,51 @@ def aceptar_solicitud_directa(conductor_id, solicitud_id):
     3. El pasajero ve TODAS las ofertas y elige una
     4. Al elegir, se rechazan las demás ofertas
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    
-    sol = next((s for s in solicitudes if s['id'] == solicitud_id and s.get('estado') == 'pendiente'), None)
-    if not sol:
-        return None
-    
-    contraofertas = _leer_json(CONTRAOFERTAS_FILE)
-    
-    ya_oferto = any(
-        c.get('conductor_id') == conductor_id 
-        and c.get('solicitud_id') == solicitud_id 
-        and c.get('estado') == 'pendiente'
-        for c in contraofertas
-    )
-    if ya_oferto:
-        return {"error": "Ya tienes una oferta pendiente para esta solicitud"}
-    
-    nuevo_id = max([c.get('id', 0) for c in contraofertas], default=0) + 1
-    
-    oferta = {
-        'id': nuevo_id,
-        'solicitud_id': solicitud_id,
-        'conductor_id': conductor_id,
-        'precio_ofrecido': sol['precio_estandar'],
-        'mensaje': 'Acepto el precio estándar',
-        'estado': 'pendiente',
-        'tipo': 'aceptacion_directa',
-        'fecha_creacion': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
-    contraofertas.append(oferta)
-    _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
+    # 🔒 Verificar + insertar sin que otro worker se cuele (evita ofertas duplicadas)
+    with bloquear(_repo_solicitudes, _repo_contraofertas):
+        sol = _repo_solicitudes.obtener(solicitud_id)
+        if not sol or sol.get('estado') != 'pendiente':
+            return None
+
+        ya_oferto = _repo_contraofertas.buscar(
+            conductor_id=conductor_id,
+            solicitud_id=solicitud_id,
+            estado='pendiente'
+        )
+        if ya_oferto:
+            return {"error": "Ya tienes una oferta pendiente para esta solicitud"}
+
+        oferta = {
+            'id': None,  # lo asigna la capa de almacenamiento (max + 1)
+            'solicitud_id': solicitud_id,
+            'conductor_id': conductor_id,
+            'precio_ofrecido': sol['precio_estandar'],
+            'mensaje': 'Acepto el precio estándar',
+            'estado': 'pendiente',
+            'tipo': 'aceptacion_directa',
+            'fecha_creacion': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+        _repo_contraofertas.insertar(oferta)
     
     print(f"✅ Conductor #{conductor_id} aceptó tarifa estándar para solicitud #{solicitud_id}")
     return oferta
 
+@reintentar_si_conflicto()
 def pasajero_acepta_contraoferta(pasajero_id, contraoferta_id):
     """
     El pasajero acepta una contraoferta específica y el viaje queda CONFIRMADO.
     
     ESTRUCTURA DE DATOS: Al confirmar, la solicitud se DESENCOLA (sale de la cola FIFO).
     """
-    # 1) Cargar contraofertas y buscar la elegida
-    contraofertas = _leer_json(CONTRAOFERTAS_FILE)
+    # 🔒 Dos pasajeros/conductores no pueden confirmar la misma solicitud a la vez
+    with bloquear(_repo_solicitudes, _repo_contraofertas):
+        return _aceptar_contraoferta(pasajero_id, contraoferta_id)
 
-    contraoferta = next(
-        (c for c in contraofertas if int(c.get('id', -1)) == int(contraoferta_id)),
-        None
-    )
+
+def _aceptar_contraoferta(pasajero_id, contraoferta_id):
+    # 1) Cargar contraofertas y buscar la elegida
+    contraoferta = _repo_contraofertas.obtener(contraoferta_id)
 
     if not contraoferta or contraoferta.get('estado') != 'pendiente':
         return None
@@ -527,8 +716,7 @@ def pasajero_acepta_contraoferta(pasajero_id, contraoferta_id):
     precio_ofrecido = contraoferta.get('precio_ofrecido')  # ✅ KEY CORRECTA
 
     # 2) Cargar solicitudes y validar pertenencia
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    sol = next((s for s in solicitudes if s.get('id') == solicitud_id), None)
+    sol = _repo_solicitudes.obtener(solicitud_id)
 
     if not sol:
         return None
@@ -551,20 +739,25 @@ def pasajero_acepta_contraoferta(pasajero_id, contraoferta_id):
     sol['fecha_confirmacion'] = now
 
     # 4) Actualizar estados de contraofertas: aceptar una, rechazar las demás pendientes
-    for c in contraofertas:
-        if c.get('solicitud_id') == solicitud_id and c.get('estado') == 'pendiente':
-            c['estado'] = 'rechazada'
-            c['fecha_actualizacion'] = now
+    otras = [
+        c for c in _repo_contraofertas.buscar(solicitud_id=solicitud_id, estado='pendiente')
+        if c.get('id') != contraoferta.get('id')
+    ]
+    for c in otras:
+        c['estado'] = 'rechazada'
+        c['fecha_actualizacion'] = now
 
     contraoferta['estado'] = 'aceptada'
     contraoferta['fecha_actualizacion'] = now
 
-    # ✅ DESENCOLAR: Remover de la cola FIFO (ya no está pendiente)
-    _desencolar_solicitud(solicitud_id)
+    # 5) Guardar solo los registros modificados. La solicitud primero: si esa
+    #    escritura falla no cambió nada y la oferta sigue pendiente para reintentar
+    _guardar(_repo_solicitudes, sol)
+    _guardar(_repo_contraofertas, contraoferta, *otras)
 
-    # 5) Guardar atómico (más seguro)
-    _guardar_json_atomic(CONTRAOFERTAS_FILE, contraofertas)
-    _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
+    # ✅ DESENCOLAR: Remover de la cola FIFO (ya no está pendiente), con todo guardado
+    _desencolar_solicitud(solicitud_id)
+    registro_conductores().marcar_disponible(conductor_id, False)  # ya tiene viaje
 
     print(f"✅ ¡MATCH! Viaje #{sol['id']} confirmado por contraoferta. Precio: {sol['precio_acordado']}")
     return sol
@@ -574,105 +767,106 @@ def obtener_contraofertas_pasajero(solicitud_id):
     """
     Obtiene todas las contraofertas pendientes para una solicitud
     """
-    contraofertas = _leer_json(CONTRAOFERTAS_FILE)
-    return [c for c in contraofertas 
-            if c['solicitud_id'] == solicitud_id and c['estado'] == 'pendiente']
+    return _repo_contraofertas.buscar(solicitud_id=solicitud_id, estado='pendiente')
 
 
+@reintentar_si_conflicto(valor_si_falla=(False, "La solicitud cambió mientras se cancelaba, intenta de nuevo"))
 def cancelar_solicitud_detalle(solicitud_id, usuario_id, motivo=""):
     """
     Cancela una solicitud (pasajero o conductor)
     Devuelve: (ok: bool, payload: dict|str)
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-
     try:
         sid = int(solicitud_id)
         uid = int(usuario_id)
     except Exception:
         return (False, "solicitud_id/usuario_id inválido")
 
-    for sol in solicitudes:
-        try:
-            if int(sol.get("id", -1)) != sid:
-                continue
-        except Exception:
-            continue
+    with bloquear(_repo_solicitudes, _repo_contraofertas):
+        return _cancelar_solicitud(sid, uid, motivo)
 
-        pasajero_id = sol.get("pasajero_id")
-        conductor_id = sol.get("conductor_id")
 
-        try:
-            pasajero_id = int(pasajero_id) if pasajero_id is not None else None
-        except Exception:
-            pass
-        try:
-            conductor_id = int(conductor_id) if conductor_id is not None else None
-        except Exception:
-            pass
+def _cancelar_solicitud(sid, uid, motivo):
+    sol = _repo_solicitudes.obtener(sid)
+    if not sol:
+        return (False, "Solicitud no encontrada")
 
-        if uid not in [pasajero_id, conductor_id]:
-            return (False, "No autorizado para cancelar esta solicitud")
+    pasajero_id = sol.get("pasajero_id")
+    conductor_id = sol.get("conductor_id")
 
-        estado = (sol.get("estado") or "").lower()
-        estados_cancelables = ["pendiente", "aceptada", "confirmado", "en_curso"]  # ✅ Agregar en_curso
+    try:
+        pasajero_id = int(pasajero_id) if pasajero_id is not None else None
+    except Exception:
+        pass
+    try:
+        conductor_id = int(conductor_id) if conductor_id is not None else None
+    except Exception:
+        pass
 
-        if estado not in estados_cancelables:
-            return (False, f"No se puede cancelar en estado: {estado}")
+    if uid not in [pasajero_id, conductor_id]:
+        return (False, "No autorizado para cancelar esta solicitud")
 
-        quien = "pasajero" if uid == pasajero_id else "conductor"
+    estado = (sol.get("estado") or "").lower()
+    estados_cancelables = ["pendiente", "aceptada", "confirmado", "en_curso"]  # ✅ Agregar en_curso
 
-        sol["estado"] = f"cancelado_{quien}"
-        sol["motivo_cancelacion"] = motivo or ""
-        sol["fecha_cancelacion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sol["fecha_actualizacion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if estado not in estados_cancelables:
+        return (False, f"No se puede cancelar en estado: {estado}")
 
-        # ✅ Guardar ID del conductor antes de limpiar
-        if conductor_id:
-            sol["conductor_id_cancelado"] = conductor_id
-
-        sol["conductor_id"] = None
-        sol["precio_acordado"] = None
-
-        # ✅ Rechazar todas las contraofertas pendientes de esta solicitud
-        contraofertas = _leer_json(CONTRAOFERTAS_FILE)
-        for c in contraofertas:
-            if c.get('solicitud_id') == sid and c.get('estado') == 'pendiente':
-                c['estado'] = 'rechazada'
-                c['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c['motivo_rechazo'] = 'Solicitud cancelada por pasajero'
-        _guardar_json(CONTRAOFERTAS_FILE, contraofertas)
-        
-        # ✅ Desencolar la solicitud de la cola FIFO
-        _desencolar_solicitud(sid)
+    quien = "pasajero" if uid == pasajero_id else "conductor"
 
-        _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
-        print(f"✅ Solicitud #{sid} cancelada por {quien}. Estado: cancelado_{quien}")
-        return (True, sol)
+    sol["estado"] = f"cancelado_{quien}"
+    sol["motivo_cancelacion"] = motivo or ""
+    sol["fecha_cancelacion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sol["fecha_actualizacion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    return (False, "Solicitud no encontrada")
+    # ✅ Guardar ID del conductor antes de limpiar
+    if conductor_id:
+        sol["conductor_id_cancelado"] = conductor_id
 
+    sol["conductor_id"] = None
+    sol["precio_acordado"] = None
 
+    # ✅ Rechazar todas las contraofertas pendientes de esta solicitud
+    contraofertas = _repo_contraofertas.buscar(solicitud_id=sid, estado='pendiente')
+    for c in contraofertas:
+        c['estado'] = 'rechazada'
+        c['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c['motivo_rechazo'] = 'Solicitud cancelada por pasajero'
+    _guardar(_repo_contraofertas, *contraofertas)
+    
+    # ✅ Desencolar la solicitud de la cola FIFO
+    _desencolar_solicitud(sid)
+
+    _guardar(_repo_solicitudes, sol)
+    if conductor_id:
+        registro_conductores().marcar_disponible(conductor_id, True)  # queda libre
+    print(f"✅ Solicitud #{sid} cancelada por {quien}. Estado: cancelado_{quien}")
+    return (True, sol)
+
+
+@reintentar_si_conflicto(valor_si_falla=False)
 def cancelar_solicitud(solicitud_id, usuario_id, motivo=""):
     """
     Compatibilidad: devuelve SOLO bool (para código antiguo).
     """
-    solicitudes = _leer_json(SOLICITUDES_FILE)
-    for sol in solicitudes:
-            if str(sol.get('id')) == str(solicitud_id):
-                if sol.get('estado') in ['pendiente', 'aceptada', 'confirmado', 'en_curso']:
-                    # ✅ Guardar conductor_id antes de limpiarlo
-                    if sol.get('conductor_id'):
-                        sol['conductor_id_cancelado'] = sol['conductor_id']
-                    
-                    sol['estado'] = 'cancelado_pasajero'
-                    sol['motivo_cancelacion'] = motivo
-                    sol['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    sol['fecha_cancelacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    sol['conductor_id'] = None
-                    _guardar_json(SOLICITUDES_FILE, solicitudes)
-                    print(f"✅ Solicitud #{solicitud_id} cancelada. Conductor guardado: {sol.get('conductor_id_cancelado')}")
-                    return True
+    sol = _repo_solicitudes.obtener(solicitud_id)
+    if sol and sol.get('estado') in ['pendiente', 'aceptada', 'confirmado', 'en_curso']:
+        # ✅ Guardar conductor_id antes de limpiarlo
+        if sol.get('conductor_id'):
+            sol['conductor_id_cancelado'] = sol['conductor_id']
+        
+        sol['estado'] = 'cancelado_pasajero'
+        sol['motivo_cancelacion'] = motivo
+        sol['fecha_actualizacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sol['fecha_cancelacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conductor_id = sol.get('conductor_id')
+        sol['conductor_id'] = None
+        _desencolar_solicitud(solicitud_id)  # sale de la cola y de sus índices (zonas, árbol k-d)
+        _guardar(_repo_solicitudes, sol)
+        if conductor_id:
+            registro_conductores().marcar_disponible(conductor_id, True)
+        print(f"✅ Solicitud #{solicitud_id} cancelada. Conductor guardado: {sol.get('conductor_id_cancelado')}")
+        return True
     return False
 
 
@@ -688,26 +882,22 @@ def obtener_ofertas_completas_pasajero(pasajero_id):
     - Al elegir, se rechazan las demás
     """
     try:
-        from servicios.usuarios_repo import buscar_usuario_por_id
+        from servicios.usuarios_repo import buscar_usuarios_por_ids
         
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        contraofertas_data = _leer_json(CONTRAOFERTAS_FILE)
-
-        mis_solicitudes_ids = {
-            s['id'] for s in solicitudes
-            if s.get('pasajero_id') == pasajero_id 
-            and s.get('estado') == 'pendiente'
-        }
+        solicitudes = _repo_solicitudes.buscar(pasajero_id=pasajero_id, estado='pendiente')
+        mis_solicitudes_ids = {s['id'] for s in solicitudes}
 
         if not mis_solicitudes_ids:
             return []
 
+        contraofertas_data = _repo_contraofertas.buscar(
+            solicitud_id=mis_solicitudes_ids, estado='pendiente'
+        )
+
+        conductores = buscar_usuarios_por_ids({c.get('conductor_id') for c in contraofertas_data}, 'conductor')
         resultado = []
 
         for sol in solicitudes:
-            if sol['id'] not in mis_solicitudes_ids:
-                continue
-
             ofertas = []
 
             ofertas_pendientes = [
@@ -716,7 +906,7 @@ def obtener_ofertas_completas_pasajero(pasajero_id):
             ]
 
             for oferta in ofertas_pendientes:
-                conductor = buscar_usuario_por_id(oferta['conductor_id'], 'conductor')
+                conductor = conductores.get(oferta['conductor_id'])
                 if conductor:
                     oferta['conductor_nombre'] = conductor.get('nombre', 'Conductor')
                     oferta['conductor_vehiculo'] = f"{conductor.get('modelo', 'N/D')} {conductor.get('color', '')} - {conductor.get('placa', '')}"
@@ -754,21 +944,19 @@ def obtener_viajes_conductor(conductor_id):
     - completado: Viaje finalizado
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        
-        viajes = [
-            s for s in solicitudes
-            if s.get('conductor_id') == conductor_id
-            and s.get('estado') in ['confirmado', 'en_curso', 'completado', 'cancelado_pasajero']
-        ]
+        viajes = _repo_solicitudes.buscar(
+            conductor_id=conductor_id,
+            estado=['confirmado', 'en_curso', 'completado', 'cancelado_pasajero']
+        )
         orden = {'cancelado_pasajero': 0, 'confirmado': 1, 'en_curso': 2, 'completado': 3}
         viajes.sort(key=lambda v: orden.get(v.get('estado'), 9))
 
         
         # Enriquecer con datos del pasajero
-        from servicios.usuarios_repo import buscar_usuario_por_id
+        from servicios.usuarios_repo import buscar_usuarios_por_ids
+        pasajeros = buscar_usuarios_por_ids({v['pasajero_id'] for v in viajes}, 'pasajero')
         for viaje in viajes:
-            pasajero = buscar_usuario_por_id(viaje['pasajero_id'], 'pasajero')
+            pasajero = pasajeros.get(viaje['pasajero_id'])
             if pasajero:
                 viaje['pasajero_nombre'] = pasajero.get('nombre', 'Pasajero')
                 viaje['pasajero_telefono'] = pasajero.get('telefono', 'N/A')
@@ -784,36 +972,27 @@ def obtener_viajes_conductor(conductor_id):
         return []
 
 
+@reintentar_si_conflicto()
 def iniciar_viaje_conductor(conductor_id, solicitud_id):
     """
     El conductor inicia un viaje confirmado
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        viaje_encontrado = False
-        
         print(f"🔍 Buscando solicitud #{solicitud_id} para conductor #{conductor_id}")
-        
-        for i, sol in enumerate(solicitudes):
-            print(f"  - Revisando solicitud #{sol.get('id')}: estado={sol.get('estado')}, conductor={sol.get('conductor_id')}")
+        sol = _repo_solicitudes.obtener(solicitud_id)
+
+        if (sol
+            and sol.get('conductor_id') == conductor_id
+            and sol.get('estado') == 'confirmado'):
             
-            if (sol.get('id') == solicitud_id 
-                and sol.get('conductor_id') == conductor_id
-                and sol.get('estado') == 'confirmado'):
-                
-                solicitudes[i]['estado'] = 'en_curso'
-                solicitudes[i]['fecha_inicio'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                viaje_encontrado = True
-                
-                print(f"✅ Viaje #{solicitud_id} iniciado. Nuevo estado: en_curso")
-                break
-        
-        if viaje_encontrado:
-            if _guardar_json(SOLICITUDES_FILE, solicitudes):
+            sol['estado'] = 'en_curso'
+            sol['fecha_inicio'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            print(f"✅ Viaje #{solicitud_id} iniciado. Nuevo estado: en_curso")
+
+            if _guardar(_repo_solicitudes, sol):
                 print(f"✅ Cambios guardados correctamente")
                 # Recargar para confirmar
-                solicitudes_verificar = _leer_json(SOLICITUDES_FILE)
-                viaje_actualizado = next((s for s in solicitudes_verificar if s.get('id') == solicitud_id), None)
+                viaje_actualizado = _repo_solicitudes.obtener(solicitud_id)
                 if viaje_actualizado:
                     print(f"✅ Verificación: Estado actual = {viaje_actualizado.get('estado')}")
                     return viaje_actualizado
@@ -824,6 +1003,8 @@ def iniciar_viaje_conductor(conductor_id, solicitud_id):
         
         return None
         
+    except ConflictoVersion:
+        raise
     except Exception as e:
         print(f"❌ Error iniciando viaje: {e}")
         import traceback
@@ -831,61 +1012,57 @@ def iniciar_viaje_conductor(conductor_id, solicitud_id):
         return None
 
 
+@reintentar_si_conflicto()
 def finalizar_viaje_conductor(conductor_id, solicitud_id):
     """
     El conductor finaliza un viaje en curso
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        viaje_encontrado = False
-        
         print(f"🔍 Buscando viaje en curso #{solicitud_id} para conductor #{conductor_id}")
+        sol = _repo_solicitudes.obtener(solicitud_id)
+
+        if not sol or sol.get('conductor_id') != conductor_id:
+            print(f"❌ Viaje no encontrado")
+            return None
+
+        estado_actual = sol.get('estado')
+        print(f"  - Solicitud encontrada. Estado actual: {estado_actual}")
+
+        if estado_actual != 'en_curso':
+            print(f"❌ Viaje no está en curso (estado actual: {estado_actual})")
+            return None
+
+        sol['estado'] = 'completado'
+        sol['fecha_fin'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        for i, sol in enumerate(solicitudes):
-            print(f"  - Revisando solicitud #{sol.get('id')}: estado={sol.get('estado')}, conductor={sol.get('conductor_id')}")
-            
-            if sol.get('id') == solicitud_id and sol.get('conductor_id') == conductor_id:
-                estado_actual = sol.get('estado')
-                print(f"  - Solicitud encontrada. Estado actual: {estado_actual}")
-                
-                if estado_actual == 'en_curso':
-                    solicitudes[i]['estado'] = 'completado'
-                    solicitudes[i]['fecha_fin'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    # Calcular duración del viaje
-                    if sol.get('fecha_inicio'):
-                        try:
-                            inicio = datetime.strptime(sol['fecha_inicio'], "%Y-%m-%d %H:%M:%S")
-                            fin = datetime.strptime(solicitudes[i]['fecha_fin'], "%Y-%m-%d %H:%M:%S")
-                            duracion_minutos = (fin - inicio).total_seconds() / 60
-                            solicitudes[i]['duracion_minutos'] = round(duracion_minutos, 1)
-                            print(f"  - Duración calculada: {duracion_minutos:.1f} min")
-                        except Exception as e:
-                            print(f"  - Error calculando duración: {e}")
-                    
-                    viaje_encontrado = True
-                    print(f"✅ Viaje #{solicitud_id} finalizado. Nuevo estado: completado")
-                    break
-                else:
-                    print(f"❌ Viaje no está en curso (estado actual: {estado_actual})")
-                    return None
+        # Calcular duración del viaje
+        if sol.get('fecha_inicio'):
+            try:
+                inicio = datetime.strptime(sol['fecha_inicio'], "%Y-%m-%d %H:%M:%S")
+                fin = datetime.strptime(sol['fecha_fin'], "%Y-%m-%d %H:%M:%S")
+                duracion_minutos = (fin - inicio).total_seconds() / 60
+                sol['duracion_minutos'] = round(duracion_minutos, 1)
+                print(f"  - Duración calculada: {duracion_minutos:.1f} min")
+            except Exception as e:
+                print(f"  - Error calculando duración: {e}")
         
-        if viaje_encontrado:
-            if _guardar_json(SOLICITUDES_FILE, solicitudes):
-                print(f"✅ Cambios guardados correctamente")
-                # Recargar para confirmar
-                solicitudes_verificar = _leer_json(SOLICITUDES_FILE)
-                viaje_actualizado = next((s for s in solicitudes_verificar if s.get('id') == solicitud_id), None)
-                if viaje_actualizado:
-                    print(f"✅ Verificación: Estado final = {viaje_actualizado.get('estado')}")
-                    return viaje_actualizado
-            else:
-                print("❌ Error al guardar cambios")
+        print(f"✅ Viaje #{solicitud_id} finalizado. Nuevo estado: completado")
+
+        if _guardar(_repo_solicitudes, sol):
+            print(f"✅ Cambios guardados correctamente")
+            registro_conductores().marcar_disponible(conductor_id, True)
+            # Recargar para confirmar
+            viaje_actualizado = _repo_solicitudes.obtener(solicitud_id)
+            if viaje_actualizado:
+                print(f"✅ Verificación: Estado final = {viaje_actualizado.get('estado')}")
+                return viaje_actualizado
         else:
-            print(f"❌ Viaje no encontrado")
+            print("❌ Error al guardar cambios")
         
         return None
         
+    except ConflictoVersion:
+        raise
     except Exception as e:
         print(f"❌ Error finalizando viaje: {e}")
         import traceback
@@ -894,32 +1071,35 @@ def finalizar_viaje_conductor(conductor_id, solicitud_id):
 
 
 
+@reintentar_si_conflicto()
 def cancelar_viaje_conductor(conductor_id, solicitud_id, motivo=""):
     """
     El conductor cancela un viaje confirmado o en curso
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
-        
-        for sol in solicitudes:
-            if (sol.get('id') == solicitud_id 
-                and sol.get('conductor_id') == conductor_id
-                and sol.get('estado') in ['confirmado', 'en_curso']):
-                
-                sol['estado'] = 'cancelado_conductor'
-                sol['fecha_cancelacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                sol['motivo_cancelacion'] = motivo
-                sol['conductor_id_cancelado'] = conductor_id  # ✅ GUARDAR antes de limpiar
-                sol['conductor_id'] = None
-                sol['precio_acordado'] = None
-                
-                _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
-                
-                print(f"❌ Viaje #{solicitud_id} cancelado por conductor #{conductor_id}")
-                return sol
+        sol = _repo_solicitudes.obtener(solicitud_id)
+
+        if (sol
+            and sol.get('conductor_id') == conductor_id
+            and sol.get('estado') in ['confirmado', 'en_curso']):
+            
+            sol['estado'] = 'cancelado_conductor'
+            sol['fecha_cancelacion'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            sol['motivo_cancelacion'] = motivo
+            sol['conductor_id_cancelado'] = conductor_id  # ✅ GUARDAR antes de limpiar
+            sol['conductor_id'] = None
+            sol['precio_acordado'] = None
+            
+            _guardar(_repo_solicitudes, sol)
+            registro_conductores().marcar_disponible(conductor_id, True)
+            
+            print(f"❌ Viaje #{solicitud_id} cancelado por conductor #{conductor_id}")
+            return sol
         
         return None
         
+    except ConflictoVersion:
+        raise
     except Exception as e:
         print(f"❌ Error cancelando viaje: {e}")
         return None
@@ -930,15 +1110,10 @@ def obtener_cancelaciones_pendientes_conductor(conductor_id: int):
     y que aún no han sido vistas por él.
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
         cid = int(conductor_id)
 
         pendientes = []
-        for s in solicitudes:
-            estado = (s.get("estado") or "").lower()
-            if estado != "cancelado_pasajero":
-                continue
-
+        for s in _repo_solicitudes.buscar(estado="cancelado_pasajero"):
             # Si ya fue vista por el conductor, no mostrarla
             if s.get("cancelacion_vista_por_conductor"):
                 continue
@@ -962,30 +1137,32 @@ def obtener_cancelaciones_pendientes_conductor(conductor_id: int):
         return []
 
 
+@reintentar_si_conflicto(valor_si_falla=False)
 def marcar_cancelacion_vista_conductor(conductor_id: int, solicitud_id: int):
     """
     Marca una cancelación como vista por el conductor para que no vuelva a aparecer.
     """
     try:
-        solicitudes = _leer_json(SOLICITUDES_FILE)
         cid = int(conductor_id)
         sid = int(solicitud_id)
 
-        for s in solicitudes:
-            if s.get("id") == sid:
-                c2 = s.get("conductor_id_cancelado")
-                try:
-                    c2 = int(c2) if c2 is not None else None
-                except:
-                    pass
-                
-                if c2 == cid:
-                    s["cancelacion_vista_por_conductor"] = True
-                    s["fecha_vista_conductor"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    _guardar_json_atomic(SOLICITUDES_FILE, solicitudes)
-                    print(f"✅ Cancelación #{sid} marcada como vista por conductor #{cid}")
-                    return True
+        s = _repo_solicitudes.obtener(sid)
+        if s:
+            c2 = s.get("conductor_id_cancelado")
+            try:
+                c2 = int(c2) if c2 is not None else None
+            except:
+                pass
+            
+            if c2 == cid:
+                s["cancelacion_vista_por_conductor"] = True
+                s["fecha_vista_conductor"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                _guardar(_repo_solicitudes, s)
+                print(f"✅ Cancelación #{sid} marcada como vista por conductor #{cid}")
+                return True
         return False
+    except ConflictoVersion:
+        raise
     except Exception as e:
         print(f"❌ Error marcando cancelación como vista: {e}")
         return False
@@ -993,15 +1170,12 @@ def marcar_cancelacion_vista_conductor(conductor_id: int, solicitud_id: int):
 
 def _leer_json(path):
     try:
-        if os.path.exists(path):
-            # Si el archivo está vacío, devolver []
-            if os.path.getsize(path) == 0:
-                return []
-            with open(path, 'r', encoding='utf-8') as f:
-                contenido = f.read().strip()
-                if not contenido:
-                    return []
-                return json.loads(contenido)
+        # ✅ JSON con caché compartida: solo se parsea si cambió (mtime, tamaño, inodo).
+        # Un archivo vacío se interpreta como []. Con SQLite se lee la tabla.
+        repo = _repositorio_de(path)
+        return repo.leer() if repo is not None else leer_coleccion(path)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         print(f"⚠️ Error leyendo {path}: {e}")
         # Intento de "auto-reparación": dejarlo como []
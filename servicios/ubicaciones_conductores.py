@@ -0,0 +1,220 @@
+# servicios/ubicaciones_conductores.py
+"""
+Registro en memoria de la última ubicación de cada conductor.
+
+Se alimenta de los sondeos de /api/conductor/solicitudes-cercanas (que ya
+traen lat/lng) y de POST /api/conductor/ubicacion. Cada entrada vence
+config.UBICACION_TTL_S segundos después del último reporte: un montículo
+ordenado por hora del reporte (estructuras/monticulo.py) permite descartar
+las vencidas en O(log n) cada una, sin recorrer el registro.
+
+Índice espacial: las mismas celdas de servicios/zonas.py (conductor -> celda,
+celda -> conductores). Moverse es O(1) y mas_cercanos() recorre anillos de
+celdas alrededor del punto hasta que ninguna celda sin mirar puede tener a
+alguien más cerca que el N-ésimo encontrado: con conductores repartidos por
+la ciudad son unas pocas celdas por consulta.
+
+Es por proceso: cada worker conoce a los conductores que sondearon contra él.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from estructuras.monticulo import Monticulo
+from servicios import config
+from servicios.geo import FACTOR_CORRECCION_CARRETERA, distancias_desde
+from servicios.zonas import KM_POR_GRADO, zona_de
+
+
+class UbicacionConductor:
+    __slots__ = ("conductor_id", "lat", "lng", "zona", "visto", "disponible")
+
+    def __init__(self, conductor_id, lat, lng, zona, visto, disponible):
+        self.conductor_id = conductor_id
+        self.lat = lat
+        self.lng = lng
+        self.zona = zona
+        self.visto = visto          # time.monotonic() del último reporte
+        self.disponible = disponible
+
+
+class RegistroUbicaciones:
+    """Última posición conocida de cada conductor, con vencimiento y búsqueda de los más cercanos"""
+
+    def __init__(self, ttl_s: Optional[float] = None, celda_km: Optional[float] = None):
+        self.ttl_s = ttl_s if ttl_s is not None else config.UBICACION_TTL_S
+        self.celda_km = celda_km or config.ZONA_CELDA_KM
+        self._ubicaciones: Dict[Any, UbicacionConductor] = {}
+        self._celdas: Dict[tuple, set] = {}       # zona -> {conductor_id}
+        self._vencimientos = Monticulo()          # visto -> conductor_id
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._purgar(time.monotonic())
+            return len(self._ubicaciones)
+
+    # ---------------- Cambios ----------------
+
+    def registrar(self, conductor_id, lat: float, lng: float, disponible: Optional[bool] = None) -> None:
+        """Guarda la posición actual (disponible=None conserva el estado anterior; nuevo = disponible)"""
+        lat, lng = float(lat), float(lng)
+        zona = zona_de(lat, lng, self.celda_km)
+        ahora = time.monotonic()
+        with self._lock:
+            self._purgar(ahora)
+            u = self._ubicaciones.get(conductor_id)
+            if u is None:
+                u = UbicacionConductor(conductor_id, lat, lng, zona, ahora,
+                                       True if disponible is None else bool(disponible))
+                self._ubicaciones[conductor_id] = u
+                self._celdas.setdefault(zona, set()).add(conductor_id)
+            else:
+                if zona != u.zona:
+                    self._sacar_de_celda(conductor_id, u.zona)
+                    self._celdas.setdefault(zona, set()).add(conductor_id)
+                u.lat, u.lng, u.zona, u.visto = lat, lng, zona, ahora
+                if disponible is not None:
+                    u.disponible = bool(disponible)
+            self._vencimientos.insertar(ahora, conductor_id)
+
+    def marcar_disponible(self, conductor_id, disponible: bool) -> bool:
+        """Cambia la disponibilidad sin tocar la posición (False si no está registrado)"""
+        with self._lock:
+            u = self._ubicaciones.get(conductor_id)
+            if u is None:
+                return False
+            u.disponible = bool(disponible)
+            return True
+
+    def quitar(self, conductor_id) -> bool:
+        with self._lock:
+            return self._quitar(conductor_id)
+
+    def _quitar(self, conductor_id) -> bool:
+        u = self._ubicaciones.pop(conductor_id, None)
+        if u is None:
+            return False
+        self._sacar_de_celda(conductor_id, u.zona)
+        self._vencimientos.remover(conductor_id)
+        return True
+
+    def _sacar_de_celda(self, conductor_id, zona):
+        celda = self._celdas.get(zona)
+        if celda is not None:
+            celda.discard(conductor_id)
+            if not celda:
+                del self._celdas[zona]
+
+    def _purgar(self, ahora: float) -> None:
+        """Descarta las posiciones que no se renovaron en ttl_s segundos"""
+        limite = ahora - self.ttl_s
+        while True:
+            minimo = self._vencimientos.ver_minimo()
+            if minimo is None or minimo[0] >= limite:
+                return
+            self._quitar(minimo[1])
+
+    # ---------------- Consultas ----------------
+
+    def _a_dict(self, u: UbicacionConductor, ahora: float) -> Dict[str, Any]:
+        return {
+            "conductor_id": u.conductor_id,
+            "lat": u.lat,
+            "lng": u.lng,
+            "disponible": u.disponible,
+            "hace_s": round(ahora - u.visto, 1),
+        }
+
+    def ubicacion(self, conductor_id) -> Optional[Dict[str, Any]]:
+        ahora = time.monotonic()
+        with self._lock:
+            self._purgar(ahora)
+            u = self._ubicaciones.get(conductor_id)
+            return self._a_dict(u, ahora) if u else None
+
+    def mas_cercanos(self, lat: float, lng: float, n: int = 5, radio_km: Optional[float] = None,
+                     solo_disponibles: bool = True) -> List[Dict[str, Any]]:
+        """
+        Los n conductores más cercanos al punto (km por carretera, como el resto
+        de la app), opcionalmente solo hasta radio_km, del más cercano al más lejano.
+        """
+        ahora = time.monotonic()
+        lado = self.celda_km / KM_POR_GRADO
+        fila0, columna0 = zona_de(lat, lng, self.celda_km)
+        candidatos = []  # (distancia_km, orden, UbicacionConductor)
+
+        with self._lock:
+            self._purgar(ahora)
+            celdas_por_ver = len(self._celdas)
+            anillo = 0
+            while celdas_por_ver > 0:
+                # Lo que falta está al menos a anillo - 1 celdas enteras; en longitud
+                # una celda mide menos lejos del ecuador (coseno de la latitud)
+                paso_km = self.celda_km * max(math.cos(math.radians(min(abs(lat) + anillo * lado, 89))), 0.01)
+                cota_km = max(anillo - 1, 0) * paso_km * FACTOR_CORRECCION_CARRETERA
+                if radio_km is not None and cota_km > radio_km:
+                    break
+                if len(candidatos) >= n and candidatos[n - 1][0] <= cota_km - 0.01:
+                    break
+                if anillo > 0 and 8 * anillo > celdas_por_ver:
+                    # Quedan menos celdas ocupadas que celdas en el anillo: se miran todas
+                    celdas = [z for z in self._celdas
+                              if max(abs(z[0] - fila0), abs(z[1] - columna0)) >= anillo]
+                else:
+                    celdas = self._anillo(fila0, columna0, anillo)
+                nuevos = []
+                for zona in celdas:
+                    celda = self._celdas.get(zona)
+                    if celda is None:
+                        continue
+                    celdas_por_ver -= 1
+                    for cid in celda:
+                        u = self._ubicaciones[cid]
+                        if u.disponible or not solo_disponibles:
+                            nuevos.append(u)
+                if nuevos:
+                    distancias = distancias_desde(lat, lng, [u.lat for u in nuevos], [u.lng for u in nuevos])
+                    candidatos.extend(
+                        (d, len(candidatos) + i, u) for i, (d, u) in enumerate(zip(distancias, nuevos))
+                        if radio_km is None or d <= radio_km
+                    )
+                    candidatos.sort(key=lambda c: (c[0], c[1]))
+                anillo += 1
+
+            return [dict(self._a_dict(u, ahora), distancia_km=d) for d, _, u in candidatos[:n]]
+
+    @staticmethod
+    def _anillo(fila0, columna0, r):
+        """Celdas a distancia (de Chebyshev) exactamente r de la celda central"""
+        if r == 0:
+            yield fila0, columna0
+            return
+        for c in range(columna0 - r, columna0 + r + 1):
+            yield fila0 - r, c
+            yield fila0 + r, c
+        for f in range(fila0 - r + 1, fila0 + r):
+            yield f, columna0 - r
+            yield f, columna0 + r
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purgar(time.monotonic())
+            return {
+                "conductores": len(self._ubicaciones),
+                "disponibles": sum(1 for u in self._ubicaciones.values() if u.disponible),
+                "celdas": len(self._celdas),
+                "ttl_s": self.ttl_s,
+            }
+
+
+_registro: Optional[RegistroUbicaciones] = None
+
+
+def registro_conductores() -> RegistroUbicaciones:
+    """Registro del proceso (se crea al usarlo)"""
+    global _registro
+    if _registro is None:
+        _registro = RegistroUbicaciones()
+    return _registro
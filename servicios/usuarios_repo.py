@@ -1,7 +1,14 @@
 import json, os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime # <--- ¡AÑADIMOS ESTO!
+from servicios.almacenamiento import (
+    leer_coleccion, escribir_coleccion, buscar_registros, obtener_registro, insertar_registro,
+    insertar_registros, actualizar_registros
+)
+from servicios.concurrencia import bloqueo_archivo, reintentar_si_conflicto
+from servicios.indice_usuarios import indice_para
+from servicios.contadores import leer_contadores
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
@@ -13,9 +20,8 @@ def crear_directorio_data(): DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 def _leer_json(p: Path) -> List[Dict[str, Any]]:
     try:
-        with p.open("r", encoding="utf-8") as f:
-            d = json.load(f)
-        return d if isinstance(d, list) else []
+        # ✅ JSON con caché compartida (no re-parsea si el archivo no cambió) o SQLite
+        return leer_coleccion(p)
     except FileNotFoundError:
         return []
     except json.JSONDecodeError:
@@ -24,10 +30,7 @@ def _leer_json(p: Path) -> List[Dict[str, Any]]:
 def _guardar_json_atomic(p: Path, data: List[Dict[str, Any]]) -> bool:
     try:
         crear_directorio_data()
-        tmp = p.with_suffix(p.suffix + ".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        tmp.replace(p)
+        escribir_coleccion(p, data)
         return True
     except Exception:
         return False
@@ -50,22 +53,34 @@ def get_usuarios(tipo: str) -> List[Dict[str, Any]]:
     return _leer_json(archivo_por_tipo(tipo))
 
 def set_usuarios(tipo: str, usuarios: List[Dict[str, Any]]) -> bool:
-    return _guardar_json_atomic(archivo_por_tipo(tipo), usuarios)
+    archivo = archivo_por_tipo(tipo)
+    indice = indice_para(archivo)
+    if indice is None:
+        return _guardar_json_atomic(archivo, usuarios)
+    with indice.escritura():
+        ok = _guardar_json_atomic(archivo, usuarios)
+        if ok:
+            indice.reemplazar(usuarios)
+    return ok
 
 def normalizar_correo(correo: str) -> str:
     return (correo or "").strip().lower()
 
-def generar_id(datos: List[Dict[str, Any]]) -> int:
-    # Asegurarnos que los IDs sean números
-    ids = [int(u.get("id", 0)) for u in datos if str(u.get("id", 0)).isdigit()]
-    return max(ids, default=0) + 1
-
 def buscar_usuario_por_correo(correo: str, tipo: str) -> Optional[Dict[str, Any]]:
     correo = normalizar_correo(correo)
-    for u in get_usuarios(tipo):
-        if normalizar_correo(u.get("correo", "")) == correo:
-            return u
-    return None
+    archivo = archivo_por_tipo(tipo)
+    indice = indice_para(archivo)
+    if indice is not None:
+        return indice.por_correo(correo)  # ✅ O(1) con el índice en memoria
+    encontrados = buscar_registros(archivo, correo=correo)
+    return encontrados[0] if encontrados else None
+
+def buscar_conductor_por_placa(placa: str) -> Optional[Dict[str, Any]]:
+    indice = indice_para(CONDUCTORES_FILE)
+    if indice is not None:
+        return indice.por_placa(placa)
+    encontrados = buscar_registros(CONDUCTORES_FILE, placa=placa)
+    return encontrados[0] if encontrados else None
 
 def buscar_usuario_por_id(user_id: int, tipo: str) -> Optional[Dict[str, Any]]:
     """Busca por id dentro del tipo indicado (pasajero|conductor|viajes)."""
@@ -76,21 +91,114 @@ def buscar_usuario_por_id(user_id: int, tipo: str) -> Optional[Dict[str, Any]]:
     
     # Manejo de error si el tipo no es válido
     try:
-        usuarios = get_usuarios(tipo)
+        archivo = archivo_por_tipo(tipo)
     except ValueError:
         return None
-        
-    for u in usuarios:
-        if u.get("id") == uid:
-            return u
-    return None
+
+    indice = indice_para(archivo) if tipo != "viajes" else None
+    if indice is not None:
+        return indice.por_id(uid)
+    return obtener_registro(archivo, uid)
+
+def buscar_usuarios_por_ids(ids: Iterable[Any], tipo: str) -> Dict[Any, Dict[str, Any]]:
+    """
+    Varios usuarios del tipo indicado en una sola pasada (en vez de una
+    búsqueda por fila al enriquecer listas). Devuelve {id pedido: usuario};
+    los ids inexistentes o inválidos no aparecen.
+    """
+    pedidos = {}
+    for valor in ids:
+        try:
+            pedidos[valor] = int(valor)
+        except (ValueError, TypeError):
+            continue
+    if not pedidos:
+        return {}
+    try:
+        archivo = archivo_por_tipo(tipo)
+    except ValueError:
+        return {}
+
+    indice = indice_para(archivo) if tipo != "viajes" else None
+    if indice is not None:
+        encontrados = indice.por_ids(set(pedidos.values()))
+    else:
+        encontrados = {u.get("id"): u for u in buscar_registros(archivo, id=set(pedidos.values()))}
+    return {valor: encontrados[uid] for valor, uid in pedidos.items() if uid in encontrados}
 
 def usuario_existe(correo: str, tipo: str) -> bool:
     return buscar_usuario_por_correo(correo, tipo) is not None
 
+def crear_usuario(tipo: str, usuario: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Registra un usuario nuevo con id asignado por la capa de almacenamiento.
+    El correo (y la placa, si es conductor) se vuelven a verificar con la
+    colección bloqueada, así dos registros simultáneos no pueden duplicarlos.
+    Devuelve (usuario, "") o (None, motivo).
+    """
+    archivo = archivo_por_tipo(tipo)
+    usuario = {**usuario, "id": None, "correo": normalizar_correo(usuario.get("correo"))}
+    indice = indice_para(archivo)
+    try:
+        crear_directorio_data()
+        with (indice.escritura() if indice is not None else bloqueo_archivo(archivo)):
+            if buscar_usuario_por_correo(usuario["correo"], tipo):
+                return None, f"Ya existe un {tipo} registrado con ese correo electrónico"
+            if tipo == "conductor" and usuario.get("placa") and buscar_conductor_por_placa(usuario["placa"]):
+                return None, "Esa placa ya está registrada."
+            nuevo = insertar_registro(archivo, usuario)
+            if indice is not None:
+                indice.aplicar(nuevo)
+            return nuevo, ""
+    except Exception as e:
+        print(f"❌ Error registrando {tipo}: {e}")
+        return None, "Error al guardar los datos. Inténtalo de nuevo."
+
+def crear_usuarios(tipo: str, usuarios: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+    """
+    Registro en lote (importaciones): igual que crear_usuario, pero con una
+    sola escritura de la colección para todo el lote. Correo y placa se
+    verifican con la colección bloqueada contra lo guardado y contra el resto
+    del lote (gana la primera aparición).
+    Devuelve (creados, [(usuario recibido, motivo), ...] rechazados).
+    """
+    archivo = archivo_por_tipo(tipo)
+    indice = indice_para(archivo)
+    crear_directorio_data()
+    with (indice.escritura() if indice is not None else bloqueo_archivo(archivo)):
+        nuevos, rechazados = [], []
+        correos, placas = set(), set()
+        for original in usuarios:
+            usuario = {**original, "id": None, "correo": normalizar_correo(original.get("correo"))}
+            placa = (usuario.get("placa") or "").strip().upper() if tipo == "conductor" else ""
+            if usuario["correo"] in correos or buscar_usuario_por_correo(usuario["correo"], tipo):
+                rechazados.append((original, f"Ya existe un {tipo} registrado con ese correo electrónico"))
+            elif placa and (placa in placas or buscar_conductor_por_placa(placa)):
+                rechazados.append((original, "Esa placa ya está registrada."))
+            else:
+                correos.add(usuario["correo"])
+                if placa:
+                    placas.add(placa)
+                nuevos.append(usuario)
+        creados = insertar_registros(archivo, nuevos)
+        if indice is not None and creados:
+            indice.aplicar(*creados)
+        return creados, rechazados
+
 def obtener_estadisticas():
-    p, c = get_usuarios("pasajero"), get_usuarios("conductor")
-    return {"total_pasajeros": len(p), "total_conductores": len(c), "total_usuarios": len(p)+len(c)}
+    """Totales para las plantillas desde los contadores incrementales (sin leer los usuarios)"""
+    from servicios.solicitudes_mejoradas import repositorio_solicitudes
+    from servicios.particiones import viajes_archivados_por_estado
+    c = leer_contadores(PASAJEROS_FILE)
+    p, d = c.get("pasajeros", 0), c.get("conductores", 0)
+    # Los viajes archivados siguen contando: el archivo caliente más las particiones
+    viajes = repositorio_solicitudes().conteo_por_estado()
+    for estado, cantidad in viajes_archivados_por_estado().items():
+        viajes[estado] = viajes.get(estado, 0) + cantidad
+    return {
+        "total_pasajeros": p, "total_conductores": d, "total_usuarios": p + d,
+        "viajes_por_estado": viajes,
+    }
 
 def listar_conductores_disponibles() -> List[Dict[str, Any]]:
     return get_usuarios("conductor")
@@ -102,20 +210,12 @@ def guardar_viaje(datos_viaje: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     Lee los viajes, genera un ID, añade la fecha, guarda y devuelve el viaje completo.
     """
     try:
-        v = _leer_json(VIAJES_FILE)
-        nuevo_id = generar_id(v)
-        
         viaje_completo = {
             **datos_viaje,
-            "id": nuevo_id,
+            "id": None,  # lo asigna la capa de almacenamiento
             "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        
-        v.append(viaje_completo)
-        
-        if _guardar_json_atomic(VIAJES_FILE, v):
-            return viaje_completo # Devuelve el viaje completo con ID y fecha
-        return None
+        return insertar_registro(VIAJES_FILE, viaje_completo) # Devuelve el viaje completo con ID y fecha
     except Exception as e:
         print(f"Error al guardar viaje: {e}")
         return None
@@ -123,14 +223,12 @@ def guardar_viaje(datos_viaje: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
 def get_viajes_por_pasajero(pasajero_id: int) -> List[Dict[str, Any]]:
     """Lee todos los viajes y devuelve solo los de un pasajero específico."""
-    viajes = _leer_json(VIAJES_FILE)
-    
     try:
         pid = int(pasajero_id)
     except (ValueError, TypeError):
         return []
         
-    viajes_pasajero = [v for v in viajes if v.get("pasajero_id") == pid]
+    viajes_pasajero = buscar_registros(VIAJES_FILE, pasajero_id=pid)
     return sorted(viajes_pasajero, key=lambda v: v.get("fecha", ""), reverse=True)
 
 
@@ -141,20 +239,36 @@ def actualizar_usuario(user_id: int, tipo: str, datos_actualizados: Dict[str, An
     except (ValueError, TypeError):
         return False
         
-    usuarios = get_usuarios(tipo)
-    usuario_encontrado = False
-    for i, u in enumerate(usuarios):
-        if u.get("id") == uid:
-            if "nombre" in datos_actualizados:
-                usuarios[i]["nombre"] = datos_actualizados["nombre"]
-            if "telefono" in datos_actualizados:
-                usuarios[i]["telefono"] = datos_actualizados["telefono"]
-            # Aquí podrías añadir más campos para actualizar si quisieras
-            usuario_encontrado = True
-            break
-
-    if usuario_encontrado:
-        return set_usuarios(tipo, usuarios)
-
-    return False
+    archivo = archivo_por_tipo(tipo)
+    indice = indice_para(archivo)
+    with (indice.escritura() if indice is not None else bloqueo_archivo(archivo)):
+        usuario = buscar_usuario_por_id(uid, tipo)
+        if not usuario:
+            return False
+
+        if "nombre" in datos_actualizados:
+            usuario["nombre"] = datos_actualizados["nombre"]
+        if "telefono" in datos_actualizados:
+            usuario["telefono"] = datos_actualizados["telefono"]
+        # Aquí podrías añadir más campos para actualizar si quisieras
+
+        ok = actualizar_registros(archivo, usuario)
+        if ok and indice is not None:
+            indice.aplicar(usuario)
+        return ok
+
 
+@reintentar_si_conflicto(valor_si_falla=False)
+def actualizar_password_hash(user_id: int, tipo: str, nuevo_hash: str) -> bool:
+    """Guarda un hash de contraseña recalculado (rehash por cambio de política)."""
+    archivo = archivo_por_tipo(tipo)
+    indice = indice_para(archivo)
+    with (indice.escritura() if indice is not None else bloqueo_archivo(archivo)):
+        usuario = buscar_usuario_por_id(user_id, tipo)
+        if not usuario:
+            return False
+        usuario["password_hash"] = nuevo_hash
+        ok = actualizar_registros(archivo, usuario)
+        if ok and indice is not None:
+            indice.aplicar(usuario)
+        return ok
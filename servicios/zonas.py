@@ -0,0 +1,97 @@
+# servicios/zonas.py
+"""
+Zonas de la ciudad para repartir la cola de solicitudes pendientes.
+
+Una zona es una celda de una grilla sobre latitud/longitud de
+config.ZONA_CELDA_KM de lado (medido en latitud): zona_de(lat, lng) es una
+cuenta, sin tablas de distritos ni consultas al grafo. zonas_en_radio() da
+las celdas que toca el rectángulo que encierra un círculo, así que ninguna
+solicitud dentro del radio queda afuera (puede sobrar alguna de las esquinas,
+que igual se filtra por distancia). De ese rectángulo se descartan las
+celdas de las esquinas que no llegan a tocar el círculo, y no se arma como
+lista: len() y `in` son O(1) aunque el radio abarque miles de celdas.
+"""
+import math
+from typing import Optional, Tuple
+
+from servicios import config
+
+KM_POR_GRADO = 111.32  # km por grado de latitud (y de longitud en el ecuador)
+
+Zona = Tuple[int, int]
+
+
+def _lado_grados(celda_km: Optional[float]) -> float:
+    return (celda_km or config.ZONA_CELDA_KM) / KM_POR_GRADO
+
+
+def zona_de(lat: float, lng: float, celda_km: Optional[float] = None) -> Zona:
+    """Celda (fila, columna) que contiene el punto"""
+    lado = _lado_grados(celda_km)
+    return math.floor(lat / lado), math.floor(lng / lado)
+
+
+class RectanguloZonas:
+    """Celdas de las filas x columnas dadas (rangos), sin materializarlas"""
+    __slots__ = ("filas", "columnas")
+
+    def __init__(self, filas: range, columnas: range):
+        self.filas = filas
+        self.columnas = columnas
+
+    def __len__(self): return len(self.filas) * len(self.columnas)
+    def __contains__(self, zona): return zona[0] in self.filas and zona[1] in self.columnas
+
+    def __iter__(self):
+        for f in self.filas:
+            for c in self.columnas:
+                yield f, c
+
+
+class CirculoZonas(RectanguloZonas):
+    """
+    Celdas del rectángulo que encierra el círculo que además lo tocan: se
+    mide (en plano, con el coseno menor para no quedarse corto) desde el
+    centro hasta el punto más cercano de cada celda. len() es el del rectángulo.
+    """
+    __slots__ = ("lat", "lng", "radio_km", "lado")
+
+    def __init__(self, lat, lng, radio_km, lado):
+        dlat = radio_km / KM_POR_GRADO
+        dlng = radio_km / (KM_POR_GRADO * max(math.cos(math.radians(lat)), 0.01))
+        super().__init__(
+            range(math.floor((lat - dlat) / lado), math.floor((lat + dlat) / lado) + 1),
+            range(math.floor((lng - dlng) / lado), math.floor((lng + dlng) / lado) + 1),
+        )
+        self.lat, self.lng, self.radio_km, self.lado = lat, lng, radio_km, lado
+
+    def _toca(self, fila, columna):
+        lat = min(max(self.lat, fila * self.lado), (fila + 1) * self.lado)
+        lng = min(max(self.lng, columna * self.lado), (columna + 1) * self.lado)
+        cos = min(math.cos(math.radians(self.lat)), math.cos(math.radians(lat)))
+        dy = (self.lat - lat) * KM_POR_GRADO
+        dx = (self.lng - lng) * KM_POR_GRADO * cos
+        return dx * dx + dy * dy <= (self.radio_km * 1.01) ** 2
+
+    def __contains__(self, zona):
+        return super().__contains__(zona) and self._toca(*zona)
+
+    def __iter__(self):
+        for f, c in super().__iter__():
+            if self._toca(f, c):
+                yield f, c
+
+
+def zonas_en_radio(lat: float, lng: float, radio_km: float,
+                   celda_km: Optional[float] = None) -> CirculoZonas:
+    """Celdas que se cruzan con el círculo de `radio_km` (distancia aérea) alrededor del punto"""
+    return CirculoZonas(lat, lng, radio_km, _lado_grados(celda_km))
+
+
+def zona_de_solicitud(solicitud: dict, celda_km: Optional[float] = None) -> Optional[Zona]:
+    """Zona del origen de la solicitud (None si no trae coordenadas)"""
+    origen = solicitud.get("origen") or {}
+    try:
+        return zona_de(float(origen["lat"]), float(origen["lng"]), celda_km)
+    except (KeyError, TypeError, ValueError):
+        return None